@@ -0,0 +1,282 @@
+"""
+Benchmark de las etapas de procesamiento con datos sintéticos (sin Earth Engine ni conexión).
+
+Para cada escala genera un GeoTIFF multibanda tipo MapBiomas y capas sintéticas de parques y
+resguardos (`datos_sinteticos.py`), y ejecuta en orden las etapas:
+
+    reclasificacion  analysis_functions.reclasificar_coberturas_mapbiomas
+    transiciones     analysis_functions.calcular_transiciones
+    estadisticas     analysis_functions.areas_por_clase_rasters (área por clase de cada transición)
+    zonas            analysis_functions.calcular_cubo_transiciones_por_area (último año: rasterizar
+                     las zonas y contar zona × clase)
+
+Se miden solo los cálculos: las funciones de visualization_tools que además grafican y guardan
+PNG quedan fuera, porque el tiempo de matplotlib ocultaría las regresiones del cálculo.
+
+Cada etapa corre en un proceso limpio para medir su tiempo (mejor de N repeticiones), su
+rendimiento en megapíxeles por segundo y su memoria máxima (RSS). Los resultados pueden guardarse
+como línea base y compararse con ella: el script termina con código 1 si alguna etapa es más
+lenta o usa más memoria que la línea base por encima de la tolerancia.
+
+Uso:
+    python benchmarks/bench_etapas.py [--escalas pequena mediana] [--repeticiones 3]
+                                      [--linea-base benchmarks/linea_base.json] [--guardar-linea-base]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+RUTA_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+RUTA_SRC = os.path.join(RUTA_BENCHMARKS, "..", "src")
+RUTA_LINEA_BASE = os.path.join(RUTA_BENCHMARKS, "linea_base.json")
+
+ANIO_INICIAL = 2000
+
+# Escalas disponibles (alto × ancho píxeles, bandas = años)
+ESCALAS = {
+    "pequena": {"alto": 1024, "ancho": 1024, "bandas": 5},
+    "mediana": {"alto": 4096, "ancho": 4096, "bandas": 5},
+    "grande": {"alto": 8192, "ancho": 8192, "bandas": 10},
+}
+
+ETAPAS = ["reclasificacion", "transiciones", "estadisticas", "zonas"]
+
+CODIGO_ETAPA = """
+import json, sys, time
+sys.path[:0] = [{ruta_src!r}, {ruta_benchmarks!r}]
+import bench_etapas
+calcular = bench_etapas.preparar_etapa({etapa!r}, {carpeta!r}, {escala!r}, {workers!r})
+inicio = time.perf_counter()
+calcular()
+duracion = time.perf_counter() - inicio
+print(json.dumps({{"segundos": duracion, "rss_max_mb": bench_etapas.memoria_maxima_mb()}}))
+"""
+
+
+def memoria_maxima_mb():
+    """
+    Memoria residente máxima (MB) del proceso actual y de sus procesos hijos.
+
+    En Linux se usa VmHWM de /proc, porque `ru_maxrss` conserva tras `exec` el máximo del proceso
+    que lanzó la medición.
+    """
+    import resource
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    unidad = 1024 ** 2 if sys.platform == "darwin" else 1024
+    hijos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unidad
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            propio = next(int(linea.split()[1]) for linea in f if linea.startswith("VmHWM:")) / 1024
+    except (OSError, StopIteration):
+        propio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unidad
+    return max(propio, hijos)
+
+
+def _rutas(carpeta, escala):
+    anio_final = ANIO_INICIAL + escala["bandas"] - 1
+    return {
+        "stack": os.path.join(carpeta, f"Mapbiomas_from_{ANIO_INICIAL}_to_{anio_final}.tif"),
+        "reclass": os.path.join(carpeta, "RECLASS"),
+        "transiciones": os.path.join(carpeta, "TRANSICIONES"),
+        "pnn": os.path.join(carpeta, "pnn.gpkg"),
+        "resguardos": os.path.join(carpeta, "resguardos.gpkg"),
+        "anio_final": anio_final,
+    }
+
+
+def preparar_datos(carpeta, escala):
+    """
+    Genera (o reutiliza, si ya existen con los mismos parámetros) el ráster y las capas sintéticas.
+    """
+    import rasterio
+    import datos_sinteticos
+
+    rutas = _rutas(carpeta, escala)
+    ruta_parametros = os.path.join(carpeta, "parametros.json")
+    if os.path.exists(ruta_parametros):
+        with open(ruta_parametros, encoding="utf-8") as f:
+            if json.load(f) == escala:
+                return rutas
+
+    os.makedirs(carpeta, exist_ok=True)
+    datos_sinteticos.generar_stack_mapbiomas(rutas["stack"], escala["alto"], escala["ancho"], escala["bandas"])
+    with rasterio.open(rutas["stack"]) as src:
+        limites = tuple(src.bounds)
+    datos_sinteticos.generar_areas_protegidas(limites, n=20, campo_nombre="ap_nombre", prefijo="Parque",
+                                              semilla=1).to_file(rutas["pnn"], driver="GPKG")
+    datos_sinteticos.generar_areas_protegidas(limites, n=60, prefijo="Resguardo", tamano_relativo=0.08,
+                                              semilla=2).to_file(rutas["resguardos"], driver="GPKG")
+
+    with open(ruta_parametros, "w", encoding="utf-8") as f:
+        json.dump(escala, f)
+    return rutas
+
+
+def megapixeles(etapa, escala):
+    """
+    Megapíxeles procesados por la etapa (píxeles × bandas leídas).
+    """
+    pixeles = escala["alto"] * escala["ancho"]
+    bandas = {"reclasificacion": escala["bandas"], "transiciones": escala["bandas"],
+              "estadisticas": escala["bandas"] - 1, "zonas": 1}[etapa]
+    return pixeles * bandas / 1e6
+
+
+def preparar_etapa(etapa, carpeta, escala, workers=1):
+    """
+    Prepara una etapa sobre los datos sintéticos de `carpeta` (se llama desde el proceso de medición)
+    y retorna una función sin argumentos con el cálculo que se mide. Las importaciones y la lectura
+    de las capas vectoriales quedan fuera de la medición.
+    """
+    import glob
+    import analysis_functions
+
+    rutas = _rutas(carpeta, escala)
+    ruta_reclass = os.path.join(rutas["reclass"],
+                                os.path.splitext(os.path.basename(rutas["stack"]))[0] + "_reclass.tif")
+
+    if etapa == "reclasificacion":
+        return lambda: analysis_functions.reclasificar_coberturas_mapbiomas(rutas["stack"], rutas["reclass"],
+                                                                            workers=workers)
+    if etapa == "transiciones":
+        return lambda: analysis_functions.calcular_transiciones(ruta_reclass, ANIO_INICIAL, rutas["transiciones"],
+                                                                workers=workers)
+    if etapa == "estadisticas":
+        rutas_transicion = sorted(glob.glob(os.path.join(rutas["transiciones"], "transicion_*_to_*.tif")))
+        return lambda: analysis_functions.areas_por_clase_rasters(rutas_transicion, workers=workers)
+    if etapa == "zonas":
+        import geopandas as gpd
+        gdf_pnn = gpd.read_file(rutas["pnn"])
+        gdf_resguardos = gpd.read_file(rutas["resguardos"])
+        return lambda: analysis_functions.calcular_cubo_transiciones_por_area(
+            rutas["transiciones"], rutas["anio_final"], rutas["anio_final"], gdf_pnn, gdf_resguardos)
+    raise ValueError(f"⚠️ Etapa desconocida: {etapa}")
+
+
+def medir_etapa(etapa, carpeta, escala, workers=1, repeticiones=3):
+    """
+    Ejecuta la etapa `repeticiones` veces en procesos limpios y retorna el mejor tiempo, el
+    rendimiento (MP/s) y la memoria máxima observada.
+    """
+    codigo = CODIGO_ETAPA.format(ruta_src=RUTA_SRC, ruta_benchmarks=RUTA_BENCHMARKS, etapa=etapa,
+                                 carpeta=carpeta, escala=escala, workers=workers)
+    tiempos, rss = [], []
+    for _ in range(repeticiones):
+        salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True)
+        resultado = json.loads(salida.stdout.strip().splitlines()[-1])
+        tiempos.append(resultado["segundos"])
+        rss.append(resultado["rss_max_mb"])
+
+    segundos = min(tiempos)
+    return {"segundos": segundos, "mpx_s": megapixeles(etapa, escala) / segundos, "rss_max_mb": max(rss)}
+
+
+def comparar_con_linea_base(resultados, linea_base, tolerancia=0.2):
+    """
+    Compara rendimiento y memoria con la línea base. Retorna la lista de regresiones (escala, etapa, motivo).
+    """
+    regresiones = []
+    for nombre_escala, etapas in resultados.items():
+        for etapa, actual in etapas.items():
+            base = linea_base.get(nombre_escala, {}).get(etapa)
+            if base is None:
+                continue
+            if actual["mpx_s"] < base["mpx_s"] * (1 - tolerancia):
+                regresiones.append((nombre_escala, etapa, f"{actual['mpx_s']:.1f} MP/s frente a {base['mpx_s']:.1f}"))
+            if actual["rss_max_mb"] > base["rss_max_mb"] * (1 + tolerancia):
+                regresiones.append((nombre_escala, etapa,
+                                    f"{actual['rss_max_mb']:.0f} MB frente a {base['rss_max_mb']:.0f} MB"))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las etapas de procesamiento con datos sintéticos")
+    parser.add_argument("--escalas", nargs="*", default=["pequena", "mediana"], choices=list(ESCALAS))
+    parser.add_argument("--etapas", nargs="*", default=ETAPAS, choices=ETAPAS)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--carpeta", help="Carpeta para los datos sintéticos (se reutilizan entre ejecuciones); "
+                                          "por defecto una carpeta temporal que se borra al terminar")
+    parser.add_argument("--linea-base", default=RUTA_LINEA_BASE)
+    parser.add_argument("--guardar-linea-base", action="store_true",
+                        help="Guarda los resultados como nueva línea base en lugar de compararlos")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="Diferencia relativa admitida frente a la línea base (por defecto 0.2)")
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    sys.path[:0] = [RUTA_SRC, RUTA_BENCHMARKS]
+    carpeta_base = args.carpeta or tempfile.mkdtemp(prefix="bench_etapas_")
+
+    resultados = {}
+    try:
+        for nombre_escala in args.escalas:
+            escala = ESCALAS[nombre_escala]
+            carpeta = os.path.join(carpeta_base, nombre_escala)
+            print(f"▶️ Escala {nombre_escala}: {escala['alto']}×{escala['ancho']} px, {escala['bandas']} bandas")
+            preparar_datos(carpeta, escala)
+
+            resultados[nombre_escala] = {}
+            for etapa in args.etapas:
+                try:
+                    medida = medir_etapa(etapa, carpeta, escala, args.workers, args.repeticiones)
+                except subprocess.CalledProcessError as ex:
+                    print(f"❌ {etapa}: falló\n{ex.stderr}")
+                    sys.exit(1)
+                resultados[nombre_escala][etapa] = medida
+                print(f"  {etapa:<16} {medida['segundos']:8.2f} s  {medida['mpx_s']:8.1f} MP/s  "
+                      f"{medida['rss_max_mb']:7.0f} MB")
+    finally:
+        if args.carpeta is None:
+            shutil.rmtree(carpeta_base, ignore_errors=True)
+
+    import numpy as np
+    import rasterio
+    informe = {
+        "sistema": {"python": platform.python_version(), "numpy": np.__version__,
+                    "rasterio": rasterio.__version__, "gdal": rasterio.__gdal_version__,
+                    "procesador": platform.processor() or platform.machine(), "cpus": os.cpu_count()},
+        "parametros": {"repeticiones": args.repeticiones, "workers": args.workers},
+        "resultados": resultados,
+    }
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2)
+
+    if args.guardar_linea_base:
+        linea_base = {}
+        if os.path.exists(args.linea_base):
+            with open(args.linea_base, encoding="utf-8") as f:
+                linea_base = json.load(f)
+        # Conservar las escalas que no se midieron en esta ejecución
+        linea_base.setdefault("resultados", {}).update(resultados)
+        linea_base["sistema"], linea_base["parametros"] = informe["sistema"], informe["parametros"]
+        with open(args.linea_base, "w", encoding="utf-8") as f:
+            json.dump(linea_base, f, indent=2)
+        print(f"✅ Línea base guardada en: {args.linea_base}")
+        return
+
+    if not os.path.exists(args.linea_base):
+        print("⚠️ No hay línea base para comparar; use --guardar-linea-base para crearla.")
+        return
+
+    with open(args.linea_base, encoding="utf-8") as f:
+        linea_base = json.load(f)
+    if linea_base.get("sistema") != informe["sistema"]:
+        print("⚠️ La línea base se midió en otro entorno; la comparación es orientativa.")
+
+    regresiones = comparar_con_linea_base(resultados, linea_base["resultados"], args.tolerancia)
+    for nombre_escala, etapa, motivo in regresiones:
+        print(f"❌ {nombre_escala}/{etapa}: {motivo}")
+    if not regresiones:
+        print("✅ Sin regresiones frente a la línea base.")
+    sys.exit(1 if regresiones else 0)
+
+
+if __name__ == "__main__":
+    main()
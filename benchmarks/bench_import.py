@@ -0,0 +1,86 @@
+"""
+Benchmark del tiempo de importación de los módulos de src/.
+
+Importa cada módulo en un proceso limpio, mide el tiempo de importación (mejor de N repeticiones)
+y verifica que no se carguen dependencias pesadas u opcionales (Earth Engine, geemap, matplotlib,
+contextily, ipywidgets...). Termina con código 1 si algún módulo supera el tiempo máximo o
+carga una dependencia prohibida, para poder usarlo como verificación en los trabajos por lotes.
+
+Uso:
+    python benchmarks/bench_import.py [--repeticiones 5] [--max-segundos 1.5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+RUTA_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# Dependencias que cada módulo NO debe cargar al importarse
+DEPENDENCIAS_OPCIONALES = ["ee", "geemap", "contextily", "ipywidgets", "matplotlib"]
+PROHIBIDOS = {
+    "analysis_functions": DEPENDENCIAS_OPCIONALES + ["geopandas", "pandas", "shapely"],
+    "visualization_tools": DEPENDENCIAS_OPCIONALES + ["geopandas", "pandas"],
+    "data_preprocessing": DEPENDENCIAS_OPCIONALES,
+    "parches": DEPENDENCIAS_OPCIONALES + ["scipy", "geopandas", "pandas", "shapely"],
+    "instrumentacion": DEPENDENCIAS_OPCIONALES + ["numpy", "rasterio"],
+}
+
+CODIGO_MEDICION = """
+import json, sys, time
+sys.path.insert(0, {ruta!r})
+inicio = time.perf_counter()
+import {modulo}
+duracion = time.perf_counter() - inicio
+cargados = sorted(m for m in {prohibidos!r} if m in sys.modules)
+print(json.dumps({{"segundos": duracion, "cargados": cargados}}))
+"""
+
+
+def medir_importacion(modulo, repeticiones=5):
+    """
+    Importa `modulo` en `repeticiones` procesos limpios y retorna el mejor tiempo y las
+    dependencias prohibidas que se cargaron.
+    """
+    codigo = CODIGO_MEDICION.format(ruta=RUTA_SRC, modulo=modulo, prohibidos=PROHIBIDOS[modulo])
+    tiempos, cargados = [], set()
+    for _ in range(repeticiones):
+        salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True)
+        resultado = json.loads(salida.stdout.strip().splitlines()[-1])
+        tiempos.append(resultado["segundos"])
+        cargados.update(resultado["cargados"])
+    return min(tiempos), sorted(cargados)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de importación de los módulos de src/")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--max-segundos", type=float, default=1.5,
+                        help="Tiempo máximo de importación del núcleo de cálculo (analysis_functions)")
+    parser.add_argument("--modulos", nargs="*", default=list(PROHIBIDOS))
+    args = parser.parse_args()
+
+    fallas = []
+    for modulo in args.modulos:
+        try:
+            segundos, cargados = medir_importacion(modulo, args.repeticiones)
+        except subprocess.CalledProcessError as ex:
+            print(f"❌ {modulo}: no se pudo importar\n{ex.stderr}")
+            fallas.append(modulo)
+            continue
+
+        estado = "✅"
+        if cargados:
+            estado = "❌"
+            fallas.append(modulo)
+        if modulo == "analysis_functions" and segundos > args.max_segundos:
+            estado = "❌"
+            fallas.append(modulo)
+        print(f"{estado} {modulo}: {segundos * 1000:.0f} ms" + (f" - cargó {cargados}" if cargados else ""))
+
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Generadores de datos sintéticos para los benchmarks, sin Earth Engine ni descargas.
+
+- `generar_stack_mapbiomas`: GeoTIFF multibanda (una banda por año) con códigos de clase de
+  MapBiomas, estructura espacial en parches y cambios anuales, en EPSG:4326 a 30 m como las
+  exportaciones reales.
+- `generar_areas_protegidas`: capa de polígonos irregulares (parques o resguardos) sobre la
+  extensión del ráster, con algunos polígonos traslapados y otros fuera del ráster.
+"""
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+
+# Resolución de MapBiomas Colombia en grados (≈ 30 m) y esquina noroeste por defecto (Amazonía)
+RESOLUCION_GRADOS = 0.000269494585235856
+ORIGEN_POR_DEFECTO = (-72.5, 1.5)
+
+# Proporción de cada código MapBiomas en un paisaje amazónico típico (0 = sin datos)
+DISTRIBUCION_AMAZONIA = {
+    3: 0.70, 6: 0.03,  # Bosque
+    11: 0.02, 12: 0.02, 33: 0.04,  # Cobertura natural
+    9: 0.02, 21: 0.12, 24: 0.01,  # Uso antrópico
+    0: 0.04,
+}
+
+
+def _muestrear_clases(rng, distribucion, forma):
+    codigos = np.array(list(distribucion), dtype=np.uint8)
+    probabilidades = np.array(list(distribucion.values()), dtype=float)
+    return rng.choice(codigos, size=forma, p=probabilidades / probabilidades.sum())
+
+
+def generar_stack_mapbiomas(ruta, alto=1024, ancho=1024, bandas=5, distribucion=None, tamano_parche=16,
+                            tasa_cambio=0.02, ruido=0.01, semilla=0, origen=ORIGEN_POR_DEFECTO,
+                            filas_por_escritura=1024):
+    """
+    Escribe un GeoTIFF uint8 multibanda con códigos de clase de MapBiomas.
+
+    Parámetros:
+    -----------
+    ruta : str
+        Archivo de salida, p. ej. `Mapbiomas_from_2000_to_2004.tif`.
+    alto, ancho, bandas : int, opcional
+        Dimensiones del ráster; una banda por año.
+    distribucion : dict, opcional
+        Proporción de cada código de clase (por defecto DISTRIBUCION_AMAZONIA).
+    tamano_parche : int, opcional
+        Lado en píxeles de las celdas de clase homogénea; da al ráster una estructura espacial
+        (y una compresión) parecida a la de los mapas reales.
+    tasa_cambio : float, opcional
+        Fracción de celdas que cambian de clase de un año al siguiente.
+    ruido : float, opcional
+        Fracción de píxeles sueltos con una clase aleatoria en cada año.
+    semilla : int, opcional
+        Semilla del generador aleatorio (los datos son reproducibles).
+    origen : tuple, opcional
+        Esquina noroeste (longitud, latitud).
+    filas_por_escritura : int, opcional
+        Filas que se generan y escriben a la vez (limita la memoria en rásteres grandes).
+
+    Retorna:
+    --------
+    ruta : str
+    """
+    distribucion = distribucion or DISTRIBUCION_AMAZONIA
+    rng = np.random.default_rng(semilla)
+    celdas = (-(-alto // tamano_parche), -(-ancho // tamano_parche))
+
+    perfil = {
+        "driver": "GTiff", "height": alto, "width": ancho, "count": bandas, "dtype": "uint8",
+        "crs": "EPSG:4326", "transform": from_origin(*origen, RESOLUCION_GRADOS, RESOLUCION_GRADOS),
+        "tiled": True, "blockxsize": 512, "blockysize": 512, "compress": "deflate",
+    }
+
+    with rasterio.open(ruta, "w", **perfil) as dst:
+        mapa = _muestrear_clases(rng, distribucion, celdas)
+        for banda in range(1, bandas + 1):
+            if banda > 1:
+                cambia = rng.random(celdas) < tasa_cambio
+                mapa = np.where(cambia, _muestrear_clases(rng, distribucion, celdas), mapa)
+
+            for fila in range(0, alto, filas_por_escritura):
+                filas = min(filas_por_escritura, alto - fila)
+                primera, ultima = fila // tamano_parche, -(-(fila + filas) // tamano_parche)
+                bloque = np.repeat(np.repeat(mapa[primera:ultima], tamano_parche, axis=0), tamano_parche, axis=1)
+                desfase = fila - primera * tamano_parche
+                bloque = bloque[desfase:desfase + filas, :ancho]
+
+                if ruido:
+                    sueltos = rng.random(bloque.shape) < ruido
+                    bloque[sueltos] = _muestrear_clases(rng, distribucion, int(sueltos.sum()))
+                dst.write(bloque, banda, window=Window(0, fila, ancho, filas))
+
+    return ruta
+
+
+def generar_areas_protegidas(limites, n=20, campo_nombre="NOMBRE", prefijo="Área", fraccion_fuera=0.1,
+                             tamano_relativo=0.15, semilla=0):
+    """
+    Genera polígonos irregulares (elipses rotadas con bordes ruidosos) dentro de `limites`.
+
+    Parámetros:
+    -----------
+    limites : tuple
+        (minx, miny, maxx, maxy) en EPSG:4326, normalmente `src.bounds` del ráster sintético.
+    n : int, opcional
+        Número de polígonos.
+    campo_nombre : str, opcional
+        Columna con el nombre de cada área ("NOMBRE" para resguardos, "ap_nombre" para parques RUNAP).
+    prefijo : str, opcional
+        Prefijo de los nombres generados.
+    fraccion_fuera : float, opcional
+        Fracción de polígonos que se ubican fuera del ráster (sin traslape).
+    tamano_relativo : float, opcional
+        Radio máximo de los polígonos como fracción del lado menor de `limites`.
+    semilla : int, opcional
+        Semilla del generador aleatorio.
+
+    Retorna:
+    --------
+    gdf : GeoDataFrame
+    """
+    import geopandas as gpd
+    from shapely.geometry import Polygon
+
+    rng = np.random.default_rng(semilla)
+    minx, miny, maxx, maxy = limites
+    radio_max = tamano_relativo * min(maxx - minx, maxy - miny)
+    angulos = np.linspace(0, 2 * np.pi, 48, endpoint=False)
+
+    geometrias = []
+    for i in range(n):
+        cx, cy = rng.uniform(minx, maxx), rng.uniform(miny, maxy)
+        if i < round(n * fraccion_fuera):
+            cx += (maxx - minx) + 2 * radio_max  # Desplazado al este, sin traslape con el ráster
+        ejes = rng.uniform(0.2, 1.0, 2) * radio_max
+        giro = rng.uniform(0, np.pi)
+        radios = 1 + 0.15 * rng.standard_normal(len(angulos)).cumsum() / np.sqrt(len(angulos))
+        x = ejes[0] * radios * np.cos(angulos)
+        y = ejes[1] * radios * np.sin(angulos)
+        geometrias.append(Polygon(np.column_stack([cx + x * np.cos(giro) - y * np.sin(giro),
+                                                   cy + x * np.sin(giro) + y * np.cos(giro)])).buffer(0))
+
+    return gpd.GeoDataFrame({campo_nombre: [f"{prefijo} {i + 1}" for i in range(n)]},
+                            geometry=geometrias, crs="EPSG:4326")
@@ -0,0 +1,381 @@
+"""
+Actualización incremental cuando MapBiomas publica un año nuevo de su colección.
+
+En lugar de volver a exportar, reclasificar y comparar todo el rango de años, se revisa qué
+existe ya en disco y solo se procesa lo que falta:
+
+- años reclasificados: nombres `..._from_<año>_to_<año>_reclass.tif` de la carpeta de reclasificados;
+- rásteres de transición: `transicion_<año-1>_to_<año>.tif`;
+- filas de `resumen_transiciones.csv` y años del cubo `cubo_transiciones_areas.npz`;
+- años del almacén indexado (`almacen_resultados`), si se indica `ruta_almacen`.
+
+Para agregar un año basta con exportar su banda (`data_preprocessing.exportar_bandas_mapbiomas`
+con `anio_inicio == anio_final`) y llamar a `actualizar_anio_nuevo`: se reclasifica esa banda,
+se calcula la única transición nueva (año anterior → año nuevo) y se agregan sus filas al resumen
+y a las tablas por área. Las tablas se reescriben en un archivo temporal que luego reemplaza al
+anterior (`os.replace`), y los rásteres nuevos reciben su nombre definitivo solo al terminar, de
+modo que una ejecución interrumpida no deja resultados a medias que se tomen por completos.
+"""
+# Librerías para manejo de datos raster
+import rasterio  #Leer y escribir archivos raster (GeoTIFF)
+import numpy as np  #Operaciones con matrices y arrays numéricos
+
+# Librerías para manejo de archivos y rutas
+import os  #Interactuar con el sistema de archivos (rutas)
+import re  #Obtener los años del nombre de los archivos
+import csv  #Leer y escribir las tablas de resultados
+import glob  #Buscar los rásteres existentes
+
+# Funciones del proyecto
+import almacen_resultados
+import analysis_functions
+import instrumentacion
+
+
+ARCHIVO_CUBO_AREAS = "cubo_transiciones_areas.npz"  # Nombre usado por pipeline.py
+PATRON_BANDAS = re.compile(r"_from_(\d{4})_to_(\d{4})(_reclass)?\.tif$")
+PATRON_TRANSICION = re.compile(r"^transicion_(\d{4})_to_(\d{4})\.tif$")
+
+
+# --- Inventario de lo que ya existe ---
+
+def inventario_bandas(rutas):
+    """
+    Año → (ruta, banda) para GeoTIFF multibanda nombrados `..._from_<año>_to_<año>[_reclass].tif`.
+
+    Si un año aparece en varios archivos se usa el último en orden alfabético.
+    """
+    inventario = {}
+    for ruta in sorted(rutas):
+        coincidencia = PATRON_BANDAS.search(os.path.basename(ruta))
+        if coincidencia is None:
+            raise ValueError(f"⚠️ No se pudo deducir el rango de años de '{ruta}'.")
+        anio_desde, anio_hasta = int(coincidencia.group(1)), int(coincidencia.group(2))
+
+        with rasterio.open(ruta) as src:
+            if src.count != anio_hasta - anio_desde + 1:
+                raise ValueError(f"⚠️ '{ruta}' tiene {src.count} bandas pero su nombre indica "
+                                 f"{anio_hasta - anio_desde + 1} años.")
+
+        for banda, anio in enumerate(range(anio_desde, anio_hasta + 1), start=1):
+            inventario[anio] = (ruta, banda)
+    return inventario
+
+
+def _rutas_mapbiomas(rutas_mapbiomas):
+    """
+    Lista de GeoTIFF originales (sin reclasificar) a partir de un archivo, una carpeta o una lista.
+    """
+    if isinstance(rutas_mapbiomas, str):
+        if not os.path.isdir(rutas_mapbiomas):
+            return [rutas_mapbiomas]
+        rutas_mapbiomas = glob.glob(os.path.join(rutas_mapbiomas, "*_from_*_to_*.tif"))
+    return [ruta for ruta in rutas_mapbiomas if not ruta.endswith("_reclass.tif")]
+
+
+def inventario_transiciones(carpeta_transiciones):
+    """
+    Año destino → ruta de los rásteres `transicion_<año-1>_to_<año>.tif` existentes.
+    """
+    inventario = {}
+    for ruta in glob.glob(os.path.join(carpeta_transiciones, "transicion_*_to_*.tif")):
+        coincidencia = PATRON_TRANSICION.match(os.path.basename(ruta))
+        if coincidencia is not None and int(coincidencia.group(2)) == int(coincidencia.group(1)) + 1:
+            inventario[int(coincidencia.group(2))] = ruta
+    return inventario
+
+
+def leer_resumen_transiciones(carpeta_estadisticas):
+    """
+    Lee `resumen_transiciones.csv` como {año: {clase: área}} (vacío si el archivo no existe).
+    """
+    ruta_csv = os.path.join(carpeta_estadisticas, "resumen_transiciones.csv")
+    if not os.path.exists(ruta_csv):
+        return {}
+
+    with open(ruta_csv, newline="", encoding="utf-8") as f:
+        return {int(fila["Año"]): {columna: float(fila[columna])
+                                   for columna in analysis_functions.NOMBRES_TRANSICIONES.values()}
+                for fila in csv.DictReader(f)}
+
+
+# --- Escritura de los años nuevos ---
+
+def _escribir_raster(ruta, perfil, escribir, formato_salida=None, compresion="deflate", nodata=None):
+    """
+    Escribe un ráster de una banda con `escribir(dst)` y solo al final le da su nombre definitivo.
+    """
+    ruta_temporal = ruta[:-len(".tif")] + ".tmp.tif"
+    with analysis_functions.abrir_salida_raster(ruta_temporal, perfil, formato_salida, compresion, nodata) as dst:
+        escribir(dst)
+    analysis_functions.finalizar_salida_raster(ruta_temporal, formato_salida, compresion)
+    os.replace(ruta_temporal, ruta)
+    return ruta
+
+
+def reclasificar_anio(ruta_mapbiomas, banda, anio, carpeta_salida, tabla_reclasificacion=None,
+                      memoria_max_mb=256, formato_salida=None, compresion="deflate"):
+    """
+    Reclasifica una sola banda de un GeoTIFF de MapBiomas en `Mapbiomas_from_<año>_to_<año>_reclass.tif`.
+    """
+    lut = analysis_functions.compilar_tabla_reclasificacion(tabla_reclasificacion)
+    ruta_salida = os.path.join(carpeta_salida, f"Mapbiomas_from_{anio}_to_{anio}_reclass.tif")
+    os.makedirs(carpeta_salida, exist_ok=True)
+
+    with instrumentacion.etapa("reclasificacion", anio=anio), rasterio.open(ruta_mapbiomas) as src:
+        instrumentacion.registrar(pixeles=src.width * src.height)
+        perfil = src.profile.copy()
+        perfil.update(count=1, dtype="uint8")
+
+        def escribir(dst):
+            for ventana in analysis_functions.generar_ventanas_por_memoria(src, memoria_max_mb, 2):
+                bloque = src.read(banda, window=ventana)
+                dst.write(analysis_functions.aplicar_tabla_reclasificacion(bloque, lut), 1, window=ventana)
+
+        _escribir_raster(ruta_salida, perfil, escribir, formato_salida, compresion,
+                         analysis_functions.NODATA_RECLASS)
+
+    print(f"✅ Año {anio} reclasificado: {os.path.basename(ruta_salida)}")
+    return ruta_salida
+
+
+def calcular_transicion_anio(origen_anterior, origen_actual, anio, carpeta_salida, memoria_max_mb=256,
+                             formato_salida=None, compresion="deflate"):
+    """
+    Calcula `transicion_<año-1>_to_<año>.tif` a partir de dos bandas reclasificadas.
+
+    Parámetros:
+    -----------
+    origen_anterior, origen_actual : tuple
+        (ruta, banda) de los años `anio - 1` y `anio`; pueden estar en archivos distintos
+        siempre que compartan la malla (dimensiones, transform y CRS).
+    """
+    clave = f"{anio - 1}_to_{anio}"
+    ruta_salida = os.path.join(carpeta_salida, f"transicion_{clave}.tif")
+    os.makedirs(carpeta_salida, exist_ok=True)
+
+    with instrumentacion.etapa("transicion", par=clave), \
+            rasterio.open(origen_anterior[0]) as src_anterior, rasterio.open(origen_actual[0]) as src_actual:
+        malla = (src_actual.width, src_actual.height, src_actual.transform, src_actual.crs)
+        if (src_anterior.width, src_anterior.height, src_anterior.transform, src_anterior.crs) != malla:
+            raise ValueError(f"⚠️ Los rásteres de {anio - 1} y {anio} no comparten la malla; "
+                             "exporte el año nuevo con la misma región y escala.")
+
+        instrumentacion.registrar(pixeles=src_actual.width * src_actual.height)
+        perfil = analysis_functions.perfil_transicion(src_actual)
+
+        def escribir(dst):
+            for ventana in analysis_functions.generar_ventanas_por_memoria(src_actual, memoria_max_mb):
+                t1 = src_anterior.read(origen_anterior[1], window=ventana)
+                t2 = src_actual.read(origen_actual[1], window=ventana)
+                dst.write(analysis_functions.codificar_transiciones(t1, t2), 1, window=ventana)
+
+        _escribir_raster(ruta_salida, perfil, escribir, formato_salida, compresion,
+                         analysis_functions.NODATA_TRANSICIONES)
+
+    print(f"✅ Transición calculada y exportada: transicion_{clave}.tif")
+    return ruta_salida
+
+
+def _escribir_csv(ruta, encabezado, filas):
+    """
+    Escribe un CSV completo en un archivo temporal y luego reemplaza al existente.
+    """
+    with open(ruta + ".parcial", "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(encabezado)
+        escritor.writerows(filas)
+    os.replace(ruta + ".parcial", ruta)
+    return ruta
+
+
+def actualizar_resumen_transiciones(transiciones, carpeta_estadisticas, pixel_area_ha=None, workers=4):
+    """
+    Agrega a `resumen_transiciones.csv` los años de `transiciones` ({año: ruta}) que aún no tiene.
+
+    Use el mismo `pixel_area_ha` con que se calcularon las filas existentes.
+
+    Retorna la lista de años agregados.
+    """
+    datos = leer_resumen_transiciones(carpeta_estadisticas)
+    faltantes = sorted(set(transiciones) - set(datos))
+    if not faltantes:
+        print("⏭️ El resumen de transiciones ya incluye todos los años.")
+        return []
+
+    rutas = [transiciones[anio] for anio in faltantes]
+    areas_clase = analysis_functions.areas_por_clase_rasters(rutas, workers=workers, pixel_area_ha=pixel_area_ha)
+    for anio, ruta in zip(faltantes, rutas):
+        datos[anio] = {nombre: areas_clase[ruta][clase]
+                       for clase, nombre in analysis_functions.NOMBRES_TRANSICIONES.items()}
+
+    ruta_csv = analysis_functions.exportar_resumen_transiciones(datos, carpeta_estadisticas)
+    print(f"✅ Años agregados a {ruta_csv}: {faltantes}")
+    return faltantes
+
+
+def _anios_con_datos(cubo):
+    """
+    Años del cubo con al menos un valor (los años sin ráster de transición quedan en NaN).
+    """
+    return {int(anio) for anio, areas in zip(cubo["anios"], cubo["areas_ha"]) if not np.isnan(areas).all()}
+
+
+def exportar_transiciones_por_area(cubo, anio, carpeta_destino):
+    """
+    Guarda el año `anio` del cubo como `transiciones_<año>.csv`, con las mismas columnas que
+    `visualization_tools.graficar_transiciones_por_area_protegida` (sin las áreas fuera del ráster).
+    """
+    posicion = list(cubo["anios"]).index(anio)
+    filas = [[anio, tipo, nombre, clase, cubo["areas_ha"][posicion, i, j]]
+             for i, (tipo, nombre) in enumerate(zip(cubo["tipos"], cubo["nombres"]))
+             if not np.isnan(cubo["areas_ha"][posicion, i]).all()
+             for j, clase in enumerate(cubo["clases"])]
+    return _escribir_csv(os.path.join(carpeta_destino, f"transiciones_{anio}.csv"),
+                         ["Año", "Tipo", "Nombre", "Clase", "Área_ha"], filas)
+
+
+def actualizar_cubo_por_area(carpeta_transiciones, anios, carpeta_estadisticas, gdf_pnn, gdf_resguardos,
+                             resolucion=None):
+    """
+    Agrega al cubo `cubo_transiciones_areas.npz` los años de `anios` que aún no tiene y escribe
+    `transiciones_<año>.csv` para cada uno.
+
+    Las áreas (parques y resguardos) deben ser las mismas con que se calculó el cubo existente.
+
+    Retorna la lista de años agregados.
+    """
+    ruta_cubo = os.path.join(carpeta_estadisticas, ARCHIVO_CUBO_AREAS)
+    cubo = analysis_functions.cargar_cubo_transiciones_por_area(ruta_cubo) if os.path.exists(ruta_cubo) else None
+    faltantes = sorted(set(anios) - (_anios_con_datos(cubo) if cubo is not None else set()))
+    if not faltantes:
+        print("⏭️ El cubo por área ya incluye todos los años.")
+        return []
+
+    nuevos = [analysis_functions.calcular_cubo_transiciones_por_area(
+        carpeta_transiciones, anio, anio, gdf_pnn, gdf_resguardos, resolucion=resolucion) for anio in faltantes]
+
+    if cubo is None:
+        cubo = dict(nuevos[0], areas_ha=nuevos[0]["areas_ha"][:0], anios=nuevos[0]["anios"][:0])
+    for nuevo in nuevos:
+        if not (np.array_equal(nuevo["tipos"], cubo["tipos"]) and np.array_equal(nuevo["nombres"], cubo["nombres"])):
+            raise ValueError("⚠️ Las áreas protegidas no coinciden con las del cubo existente; "
+                             "recalcule el cubo completo con `calcular_cubo_transiciones_por_area`.")
+
+    # Unir años existentes y nuevos (los nuevos reemplazan a los años sin datos)
+    areas_por_anio = {int(anio): areas for anio, areas in zip(cubo["anios"], cubo["areas_ha"])}
+    areas_por_anio.update({int(nuevo["anios"][0]): nuevo["areas_ha"][0] for nuevo in nuevos})
+    anios_cubo = sorted(areas_por_anio)
+    cubo = dict(cubo, anios=np.array(anios_cubo), areas_ha=np.stack([areas_por_anio[anio] for anio in anios_cubo]))
+
+    os.makedirs(carpeta_estadisticas, exist_ok=True)
+    with open(ruta_cubo + ".parcial", "wb") as f:
+        np.savez_compressed(f, **cubo)
+    os.replace(ruta_cubo + ".parcial", ruta_cubo)
+
+    for anio in faltantes:
+        exportar_transiciones_por_area(cubo, anio, carpeta_estadisticas)
+    print(f"✅ Años agregados a {ruta_cubo}: {faltantes}")
+    return faltantes
+
+
+def actualizar_almacen(ruta_almacen, carpeta_estadisticas):
+    """
+    Agrega al almacén los años de `resumen_transiciones.csv` y del cubo por área que aún no contiene.
+
+    Retorna la lista de años agregados.
+    """
+    guardados = set(almacen_resultados.anios_almacenados(ruta_almacen, almacen_resultados.TIPO_TOTAL))
+    resumen = leer_resumen_transiciones(carpeta_estadisticas)
+    filas = almacen_resultados.filas_resumen({anio: areas for anio, areas in resumen.items()
+                                              if anio not in guardados})
+
+    ruta_cubo = os.path.join(carpeta_estadisticas, ARCHIVO_CUBO_AREAS)
+    if os.path.exists(ruta_cubo):
+        guardados = set(almacen_resultados.anios_almacenados(ruta_almacen, ["PNN", "Resguardos"]))
+        cubo = analysis_functions.cargar_cubo_transiciones_por_area(ruta_cubo)
+        filas += [fila for fila in almacen_resultados.filas_cubo(cubo) if fila[0] not in guardados]
+
+    if not filas:
+        print("⏭️ El almacén de resultados ya incluye todos los años.")
+        return []
+    almacen_resultados.agregar_areas(ruta_almacen, filas)
+    return sorted({fila[0] for fila in filas})
+
+
+@instrumentacion.instrumentar
+def actualizar_anio_nuevo(rutas_mapbiomas, carpeta_reclass, carpeta_transiciones, carpeta_estadisticas,
+                          tabla_reclasificacion=None, gdf_pnn=None, gdf_resguardos=None, pixel_area_ha=None,
+                          resolucion=None, memoria_max_mb=256, formato_salida=None, compresion="deflate",
+                          workers=4, ruta_almacen=None):
+    """
+    Completa reclasificación, transiciones, resumen anual y tablas por área solo para los años que faltan.
+
+    Parámetros:
+    -----------
+    rutas_mapbiomas : str o list
+        GeoTIFF de MapBiomas sin reclasificar (archivo, lista o carpeta), con nombres
+        `Mapbiomas_from_<año>_to_<año>.tif`. Normalmente solo la banda del año nuevo.
+    carpeta_reclass : str
+        Carpeta con los GeoTIFF reclasificados existentes (`..._from_<año>_to_<año>_reclass.tif`);
+        aquí se guarda la banda nueva reclasificada.
+    carpeta_transiciones : str
+        Carpeta con los rásteres `transicion_<año-1>_to_<año>.tif`.
+    carpeta_estadisticas : str
+        Carpeta con `resumen_transiciones.csv` y, si se usan áreas protegidas, el cubo por área.
+    tabla_reclasificacion : dict o np.ndarray, opcional
+        Misma tabla con que se reclasificaron los años existentes.
+    gdf_pnn, gdf_resguardos : GeoDataFrame, opcional
+        Si se indican, se actualiza también `cubo_transiciones_areas.npz` y se escribe
+        `transiciones_<año>.csv` para cada año nuevo.
+    pixel_area_ha, resolucion : float, opcional
+        Área fija por píxel del resumen y resolución del cubo; por defecto (None) área geodésica por fila.
+    memoria_max_mb : float, opcional
+        Presupuesto de memoria (MB) por franja al reclasificar y comparar bandas.
+    formato_salida, compresion : opcional
+        Formato de los rásteres nuevos (ver `analysis_functions.calcular_transiciones`).
+    workers : int, opcional
+        Hilos para contar las áreas de varios años nuevos a la vez.
+    ruta_almacen : str, opcional
+        Almacén SQLite (`almacen_resultados`) al que se agregan los años del resumen y del cubo
+        que aún no contiene.
+
+    Retorna:
+    --------
+    resultado : dict
+        Años procesados en cada paso: "reclasificados", "transiciones", "resumen", "areas" y "almacen".
+    """
+    # Paso 1: reclasificar las bandas de los años que aún no tienen versión reclasificada
+    reclasificados = inventario_bandas(glob.glob(os.path.join(carpeta_reclass, "*_from_*_to_*_reclass.tif")))
+    originales = inventario_bandas(_rutas_mapbiomas(rutas_mapbiomas))
+    anios_reclass = sorted(set(originales) - set(reclasificados))
+    for anio in anios_reclass:
+        ruta, banda = originales[anio]
+        reclasificados[anio] = (reclasificar_anio(ruta, banda, anio, carpeta_reclass, tabla_reclasificacion,
+                                                  memoria_max_mb, formato_salida, compresion), 1)
+
+    # Paso 2: transiciones de cada par de años consecutivos reclasificados sin ráster de transición
+    transiciones = inventario_transiciones(carpeta_transiciones)
+    anios_transicion = sorted(anio for anio in reclasificados
+                              if anio - 1 in reclasificados and anio not in transiciones)
+    for anio in anios_transicion:
+        transiciones[anio] = calcular_transicion_anio(reclasificados[anio - 1], reclasificados[anio], anio,
+                                                      carpeta_transiciones, memoria_max_mb,
+                                                      formato_salida, compresion)
+
+    # Paso 3: filas nuevas del resumen anual y de las tablas por área
+    anios_resumen = actualizar_resumen_transiciones(transiciones, carpeta_estadisticas, pixel_area_ha, workers)
+    anios_areas = []
+    if gdf_pnn is not None and gdf_resguardos is not None:
+        anios_areas = actualizar_cubo_por_area(carpeta_transiciones, transiciones, carpeta_estadisticas,
+                                               gdf_pnn, gdf_resguardos, resolucion)
+
+    # Paso 4: años del resumen y del cubo que aún no están en el almacén indexado
+    anios_almacen = []
+    if ruta_almacen is not None:
+        anios_almacen = actualizar_almacen(ruta_almacen, carpeta_estadisticas)
+
+    if not (anios_reclass or anios_transicion or anios_resumen or anios_areas or anios_almacen):
+        print("⏭️ No hay años nuevos que procesar.")
+    return {"reclasificados": anios_reclass, "transiciones": anios_transicion,
+            "resumen": anios_resumen, "areas": anios_areas, "almacen": anios_almacen}
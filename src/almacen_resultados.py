@@ -0,0 +1,255 @@
+"""
+Almacén indexado de las estadísticas de área (SQLite local) con consultas por año, área y clase.
+
+Todas las estadísticas se guardan en una sola tabla con el esquema
+
+    areas(anio, tipo, id_zona, nombre, clase, area_ha)   clave primaria (anio, tipo, id_zona, clase)
+
+donde `tipo` es el tipo de zona ("Total" para el ráster completo, "PNN", "Resguardos",
+"Departamento", "Nacional"), `id_zona` la posición de la zona en su capa (0 para "Total" y
+"Nacional"), `nombre` el nombre de la zona y `clase` una transición ("Deforestación", ...) o una
+cobertura ("Bosque", ...). El nombre no forma parte de la clave porque las capas tienen nombres
+repetidos (p. ej. varios "La Esperanza" en los parques por departamento). La tabla es WITHOUT
+ROWID, de modo que las filas se guardan ordenadas por la clave primaria: las de cada año quedan
+contiguas (una partición por año) y los índices por zona y por clase evitan recorrer la tabla completa.
+
+Agregar filas es una sola transacción que primero borra las filas de cada (año, tipo) que se
+guarda, así que volver a guardar un año lo actualiza sin duplicarlo ni dejar zonas que ya no
+están en la capa. Los CSV de siempre (`resumen_transiciones.csv`,
+`transiciones_<año>.csv`) pueden generarse desde el almacén con `exportar_tablas_csv`.
+
+Uso:
+    agregar_areas("results/STATS/resultados.sqlite", filas_resumen(datos) + filas_cubo(cubo))
+    consultar_areas("results/STATS/resultados.sqlite", anios=range(2020, 2024), tipos=["PNN"],
+                    clases=["Deforestación"])
+"""
+# Librerías para manejo de archivos y bases de datos
+import os  #Interactuar con el sistema de archivos (rutas)
+import csv  #Exportar consultas a CSV
+import sqlite3  #Base de datos local del almacén
+from contextlib import closing  #Cerrar la conexión al terminar cada operación
+
+# Librerías para manejo de datos
+import numpy as np  #Leer los cubos año × área × clase
+
+# Funciones del proyecto
+import analysis_functions
+
+# pandas se importa en el primer uso (solo para devolver las consultas como DataFrame)
+from lazy_imports import importar_perezoso
+pd = importar_perezoso("pandas")  #Manejar datos tabulares de forma eficiente (dataframes).
+
+
+ARCHIVO_ALMACEN = "resultados.sqlite"
+TIPO_TOTAL = "Total"  # Zona que representa el ráster completo (resumen anual)
+COLUMNAS = ["Año", "Tipo", "Nombre", "Clase", "Área_ha"]  # Mismas columnas que transiciones_<año>.csv
+COLUMNAS_CONSULTA = ["Año", "Tipo", "Id_zona", "Nombre", "Clase", "Área_ha"]
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS areas (
+    anio INTEGER NOT NULL,
+    tipo TEXT NOT NULL,
+    id_zona INTEGER NOT NULL,
+    nombre TEXT NOT NULL,
+    clase TEXT NOT NULL,
+    area_ha REAL NOT NULL,
+    PRIMARY KEY (anio, tipo, id_zona, clase)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS areas_por_zona ON areas (tipo, nombre, anio);
+CREATE INDEX IF NOT EXISTS areas_por_clase ON areas (clase, anio);
+"""
+
+
+def abrir_almacen(ruta_almacen):
+    """
+    Abre (y si no existe crea) el almacén SQLite con su esquema.
+    """
+    os.makedirs(os.path.dirname(ruta_almacen) or ".", exist_ok=True)
+    conexion = sqlite3.connect(ruta_almacen)
+    conexion.execute("PRAGMA journal_mode=WAL")  # Lecturas simultáneas mientras se agregan filas
+    columnas = [fila[1] for fila in conexion.execute("PRAGMA table_info(areas)")]
+    if columnas and "id_zona" not in columnas:
+        conexion.close()
+        raise ValueError(f"⚠️ El almacén {ruta_almacen} tiene el esquema anterior (sin id_zona); "
+                         "bórrelo y vuelva a generarlo.")
+    conexion.executescript(ESQUEMA)
+    return conexion
+
+
+# --- Conversión de los resultados existentes a filas (año, tipo, id_zona, nombre, clase, área) ---
+
+def filas_resumen(datos, tipo=TIPO_TOTAL, nombre=TIPO_TOTAL, id_zona=0):
+    """
+    Filas de un diccionario {año: {clase: área}} como el de `exportar_resumen_transiciones`.
+    """
+    return [(int(anio), tipo, int(id_zona), nombre, clase, float(area))
+            for anio, areas in datos.items() for clase, area in areas.items()]
+
+
+def filas_cubo(cubo):
+    """
+    Filas de un cubo de `calcular_cubo_transiciones_por_area` (sin los años o áreas en NaN).
+
+    El id de cada zona es su posición dentro de las zonas de su tipo (la fila de su capa).
+    """
+    ids, contadores = [], {}
+    for tipo in cubo["tipos"]:
+        ids.append(contadores.get(str(tipo), 0))
+        contadores[str(tipo)] = ids[-1] + 1
+
+    filas = []
+    for posicion, anio in enumerate(cubo["anios"]):
+        for i, (tipo, nombre) in enumerate(zip(cubo["tipos"], cubo["nombres"])):
+            areas = cubo["areas_ha"][posicion, i]
+            if np.isnan(areas).all():
+                continue
+            filas.extend((int(anio), str(tipo), ids[i], str(nombre), str(clase), float(area))
+                         for clase, area in zip(cubo["clases"], areas))
+    return filas
+
+
+def filas_departamentos(resultado):
+    """
+    Filas del resultado de `procesar_mapbiomas_por_departamentos` (transiciones y coberturas).
+    """
+    zonas = [("Departamento", i, nombre, datos)
+             for i, (nombre, datos) in enumerate(resultado["departamentos"].items())]
+    zonas.append(("Nacional", 0, "Total nacional", resultado["nacional"]))
+
+    filas = []
+    for tipo, id_zona, nombre, datos in zonas:
+        filas.extend(filas_resumen(datos["transiciones"], tipo, nombre, id_zona))
+        filas.extend(filas_resumen(datos["coberturas"], tipo, nombre, id_zona))
+    return filas
+
+
+# --- Escritura y consultas ---
+
+def agregar_areas(ruta_almacen, filas):
+    """
+    Agrega filas (año, tipo, id_zona, nombre, clase, área) en una sola transacción.
+
+    Antes de insertar se borran las filas guardadas de cada (año, tipo) presente en `filas`:
+    volver a guardar un año de un tipo de zona reemplaza todas sus filas anteriores.
+
+    Retorna el número de filas escritas.
+    """
+    filas = list(filas)
+    particiones = sorted({(fila[0], fila[1]) for fila in filas})
+    with closing(abrir_almacen(ruta_almacen)) as conexion, conexion:
+        conexion.executemany("DELETE FROM areas WHERE anio = ? AND tipo = ?", particiones)
+        conexion.executemany("INSERT OR REPLACE INTO areas VALUES (?, ?, ?, ?, ?, ?)", filas)
+    print(f"✅ {len(filas)} filas guardadas en: {ruta_almacen}")
+    return len(filas)
+
+
+def _como_lista(valores):
+    """
+    Acepta un valor suelto o un iterable (p. ej. range) como filtro de una consulta.
+    """
+    if valores is None:
+        return None
+    if isinstance(valores, (str, int, np.integer)):
+        return [valores]
+    return list(valores)
+
+
+def _condiciones(anios=None, tipos=None, nombres=None, clases=None):
+    """
+    Cláusula WHERE y parámetros para los filtros indicados.
+    """
+    condiciones, parametros = [], []
+    for columna, valores in [("anio", anios), ("tipo", tipos), ("nombre", nombres), ("clase", clases)]:
+        valores = _como_lista(valores)
+        if valores is None:
+            continue
+        condiciones.append(f"{columna} IN ({', '.join('?' * len(valores))})")
+        parametros.extend(int(valor) if columna == "anio" else str(valor) for valor in valores)
+    return (" WHERE " + " AND ".join(condiciones) if condiciones else ""), parametros
+
+
+def consultar_areas(ruta_almacen, anios=None, tipos=None, nombres=None, clases=None, dataframe=True):
+    """
+    Consulta las áreas guardadas, filtrando por año, tipo de zona, nombre de zona y clase.
+
+    Parámetros:
+    -----------
+    ruta_almacen : str
+        Archivo SQLite del almacén.
+    anios, tipos, nombres, clases : valor o iterable, opcional
+        Valores aceptados de cada columna; None no filtra.
+    dataframe : bool, opcional
+        True (por defecto) devuelve un DataFrame con las columnas de `COLUMNAS_CONSULTA`;
+        False, una lista de tuplas (sin importar pandas).
+
+    Retorna:
+    --------
+    resultado : pd.DataFrame o list
+        Filas ordenadas por año, tipo, id de zona y clase.
+    """
+    if not os.path.exists(ruta_almacen):
+        raise FileNotFoundError(f"⚠️ No existe el almacén de resultados: {ruta_almacen}")
+
+    donde, parametros = _condiciones(anios, tipos, nombres, clases)
+    with closing(abrir_almacen(ruta_almacen)) as conexion:
+        filas = conexion.execute("SELECT anio, tipo, id_zona, nombre, clase, area_ha FROM areas" + donde +
+                                 " ORDER BY anio, tipo, id_zona, clase", parametros).fetchall()
+
+    return pd.DataFrame(filas, columns=COLUMNAS_CONSULTA) if dataframe else filas
+
+
+def anios_almacenados(ruta_almacen, tipos=None, nombres=None):
+    """
+    Años con al menos una fila para las zonas indicadas (lista vacía si el almacén no existe).
+    """
+    if not os.path.exists(ruta_almacen):
+        return []
+
+    donde, parametros = _condiciones(tipos=tipos, nombres=nombres)
+    with closing(abrir_almacen(ruta_almacen)) as conexion:
+        return [fila[0] for fila in conexion.execute(
+            "SELECT DISTINCT anio FROM areas" + donde + " ORDER BY anio", parametros)]
+
+
+# --- Exportación opcional a CSV ---
+
+def exportar_csv(ruta_almacen, ruta_csv, **filtros):
+    """
+    Exporta una consulta (filtros de `consultar_areas`) a un CSV con las columnas de `COLUMNAS`.
+
+    Las zonas con el mismo nombre quedan en filas separadas, como en transiciones_<año>.csv.
+    """
+    filas = consultar_areas(ruta_almacen, dataframe=False, **filtros)
+    os.makedirs(os.path.dirname(ruta_csv) or ".", exist_ok=True)
+    with open(ruta_csv + ".parcial", "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(COLUMNAS)
+        escritor.writerows(fila[:2] + fila[3:] for fila in filas)
+    os.replace(ruta_csv + ".parcial", ruta_csv)
+    return ruta_csv
+
+
+def exportar_tablas_csv(ruta_almacen, carpeta_destino, anios=None):
+    """
+    Regenera desde el almacén los CSV de siempre: `resumen_transiciones.csv` (zona "Total") y
+    `transiciones_<año>.csv` con las filas de parques y resguardos de cada año.
+
+    Retorna la lista de archivos escritos.
+    """
+    rutas = []
+    clases = list(analysis_functions.NOMBRES_TRANSICIONES.values())
+
+    datos = {}
+    for anio, _, _, _, clase, area in consultar_areas(ruta_almacen, anios, TIPO_TOTAL, TIPO_TOTAL, clases,
+                                                   dataframe=False):
+        datos.setdefault(anio, {nombre: 0 for nombre in clases})[clase] = area
+    if datos:
+        rutas.append(analysis_functions.exportar_resumen_transiciones(datos, carpeta_destino))
+
+    for anio in anios_almacenados(ruta_almacen, tipos=["PNN", "Resguardos"]):
+        if anios is None or anio in _como_lista(anios):
+            rutas.append(exportar_csv(ruta_almacen, os.path.join(carpeta_destino, f"transiciones_{anio}.csv"),
+                                      anios=anio, tipos=["PNN", "Resguardos"], clases=clases))
+
+    print(f"✅ {len(rutas)} CSV exportados desde el almacén a: {carpeta_destino}")
+    return rutas
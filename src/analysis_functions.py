@@ -1,19 +1,23 @@
-# Librerías para manipulación y análisis geoespacial
-import geopandas as gpd   #Manejo de datos geoespaciales
+# Librerías para manipulación y análisis de rásteres (núcleo de cálculo: solo numpy y rasterio)
 import rasterio           #Trabajar con imágenes ráster
-import ee                 #Usar Google Earth Engine
+import rasterio.shutil  #Convertir las salidas a Cloud-Optimized GeoTIFF (COG)
+from rasterio.windows import Window  #Leer y escribir ventanas (bloques) de un ráster
+from rasterio.enums import Resampling  #Remuestreo por vecino más cercano en lecturas diezmadas
+from rasterio import features  #Rasterizar geometrías vectoriales
 import numpy as np        #Operaciones con matrices y arrays numéricos
 
-# Librerías para visualización
-import matplotlib.pyplot as plt  #Crear gráficos y visualizar datos
-import matplotlib.patches as mpatches #Crear objetos gráficos
-from matplotlib.colors import ListedColormap #Definir y manejar con paletas de colores personalizadas
-
-# Librerías para manejo de tipos y listas
-from typing import List #Especificar listas de tipos específicos (cadenas de texto)
-
 # Librerías para manejo de archivos y rutas
 import os  #Interactuar con el sistema de archivos (rutas)
+import csv  #Escribir tablas de resultados en formato CSV
+import hashlib  #Calcular huellas de geometrías para la caché de zonas
+from collections import OrderedDict  #Caché de zonas con descarte de la entrada menos usada
+
+# Librerías para procesamiento en paralelo
+from concurrent.futures import ProcessPoolExecutor  #Repartir trabajo entre varios procesos
+from concurrent.futures import ThreadPoolExecutor  #Leer varios archivos a la vez (E/S concurrente)
+
+# Instrumentación de etapas (sin costo mientras está desactivada)
+import instrumentacion
 
 
 
@@ -29,9 +33,107 @@ def verificar_acceso_archivo(carpeta_imagenes):
         return False
 
 
-def reclasificar_coberturas_mapbiomas(carpeta_imagenes, carpeta_salida, tabla_reclasificacion=None):
+# Tabla de reclasificación por defecto: clase MapBiomas → clase temática
+TABLA_RECLASIFICACION_MAPBIOMAS = {
+    3: 1, 6: 1,  # Bosque
+    11: 2, 12: 2, 13: 2, 23: 2, 25: 2, 29: 2, 33: 2, 50: 2, 68: 2,  # Cobertura natural
+    9: 3, 21: 3, 24: 3, 30: 3, 31: 3, 35: 3,  # Uso antrópico
+}
+
+
+def compilar_tabla_reclasificacion(tabla_reclasificacion=None, valor_defecto=0):
+    """
+    Compila un diccionario de reclasificación en una tabla de búsqueda (LUT) uint8 de 256 posiciones.
+
+    La posición `k` de la tabla contiene la clase nueva asignada al código original `k`,
+    de modo que reclasificar un bloque se reduce a una sola indexación `lut[bloque]`.
+    La tabla resultante puede guardarse con `np.save` y reutilizarse entre ejecuciones.
+
+    Parámetros:
+    -----------
+    tabla_reclasificacion : dict o np.ndarray, opcional
+        Diccionario con mapeo clase original → clase nueva, o una tabla ya compilada.
+        Si no se especifica se usa TABLA_RECLASIFICACION_MAPBIOMAS.
+    valor_defecto : int, opcional
+        Valor asignado a los códigos que no aparecen en el diccionario (por defecto 0).
+
+    Retorna:
+    --------
+    lut : np.ndarray
+        Arreglo uint8 de 256 posiciones.
+    """
+    if tabla_reclasificacion is None:
+        tabla_reclasificacion = TABLA_RECLASIFICACION_MAPBIOMAS
+
+    # Tabla ya compilada: solo se valida su forma
+    if isinstance(tabla_reclasificacion, np.ndarray):
+        if tabla_reclasificacion.shape != (256,):
+            raise ValueError("⚠️ La tabla compilada debe tener exactamente 256 posiciones.")
+        return tabla_reclasificacion.astype(np.uint8, copy=False)
+
+    lut = np.full(256, valor_defecto, dtype=np.uint8)
+    for original, nuevo in tabla_reclasificacion.items():
+        if not (0 <= int(original) <= 255 and 0 <= int(nuevo) <= 255):
+            raise ValueError(f"⚠️ Mapeo fuera del rango uint8 (0-255): {original} → {nuevo}")
+        lut[int(original)] = int(nuevo)
+
+    return lut
+
+
+def aplicar_tabla_reclasificacion(bloque, lut):
+    """
+    Aplica una tabla de búsqueda compilada a un bloque (2D o 3D) con una sola indexación.
+
+    Los valores fuera del rango 0-255 (posibles en rásteres int16/int32) se asignan a 0.
+    """
+    if bloque.dtype == np.uint8:
+        return lut[bloque]
+
+    salida = np.zeros(bloque.shape, dtype=np.uint8)
+    validos = (bloque >= 0) & (bloque <= 255)
+    salida[validos] = lut[bloque[validos].astype(np.intp)]
+    return salida
+
+
+# Dataset abierto por cada proceso trabajador (se inicializa una vez por proceso)
+_SRC_TRABAJADOR = None
+_LUT_TRABAJADOR = None
+
+
+def _inicializar_trabajador_reclass(ruta_imagen, lut):
+    """
+    Abre el ráster de entrada en el proceso trabajador y guarda la tabla de reclasificación.
+    """
+    global _SRC_TRABAJADOR, _LUT_TRABAJADOR
+    _SRC_TRABAJADOR = rasterio.open(ruta_imagen)
+    _LUT_TRABAJADOR = lut
+
+
+def _reclasificar_ventana(ventana):
+    """
+    Lee todas las bandas de una ventana en el proceso trabajador y devuelve el bloque reclasificado.
+    """
+    bloque = _SRC_TRABAJADOR.read(window=ventana)
+    return aplicar_tabla_reclasificacion(bloque, _LUT_TRABAJADOR)
+
+
+def _tamano_lote(total_tareas, workers):
+    """
+    Número de tareas que se envían juntas a cada proceso para reducir el costo de comunicación.
+    """
+    return max(1, total_tareas // (workers * 4))
+
+
+@instrumentacion.instrumentar
+def reclasificar_coberturas_mapbiomas(carpeta_imagenes, carpeta_salida, tabla_reclasificacion=None, workers=1,
+                                      formato_salida=None, compresion="deflate"):
     """
     Reclasifica las clases de cobertura de un GeoTIFF multibanda (una banda por año), optimizando memoria.
+
+    La tabla de reclasificación se compila en una LUT de 256 posiciones y se aplica bloque a bloque
+    siguiendo las ventanas internas (block windows) del GeoTIFF, leyendo todas las bandas de cada
+    ventana a la vez. Con `workers > 1` las ventanas se reparten entre procesos; cada proceso abre
+    su propio dataset y el proceso principal escribe los bloques en el mismo orden que la versión serial.
     
     Parámetros:
     -----------
@@ -39,18 +141,21 @@ def reclasificar_coberturas_mapbiomas(carpeta_imagenes, carpeta_salida, tabla_re
         Ruta al archivo GeoTIFF multibanda.
     carpeta_salida : str
         Carpeta donde se guardará el nuevo archivo reclasificado.
-    tabla_reclasificacion : dict, opcional
-        Diccionario con mapeo clase original → clase nueva.
+    tabla_reclasificacion : dict o np.ndarray, opcional
+        Diccionario con mapeo clase original → clase nueva, o una tabla compilada
+        con `compilar_tabla_reclasificacion`.
+    workers : int, opcional
+        Número de procesos a utilizar (por defecto 1, ejecución serial).
+    formato_salida : str, opcional
+        None conserva el perfil del ráster de entrada; "cog" escribe un Cloud-Optimized GeoTIFF
+        comprimido, con overviews internos y nodata = 0 (ver `_perfil_salida`).
+    compresion : str, opcional
+        Compresión del COG: "deflate" (por defecto), "zstd" o "lzw".
     """
-    
-    if tabla_reclasificacion is None:
-        tabla_reclasificacion = {
-            3: 1, 6: 1,  # Bosque
-            11: 2, 12: 2, 13: 2, 23: 2, 25: 2, 29: 2, 33: 2, 50: 2, 68: 2,  # Cobertura natural
-            9: 3, 21: 3, 24: 3, 30: 3, 31: 3, 35: 3,  # Uso antrópico
-        }
+    lut = compilar_tabla_reclasificacion(tabla_reclasificacion)
 
     with rasterio.open(carpeta_imagenes) as src:
+        instrumentacion.registrar(pixeles=src.width * src.height * src.count)
         profile = src.profile.copy()
         profile.update(dtype='uint8')  # salida más ligera
 
@@ -62,17 +167,27 @@ def reclasificar_coberturas_mapbiomas(carpeta_imagenes, carpeta_salida, tabla_re
         # ✅ Crear carpeta si no existe
         os.makedirs(carpeta_salida, exist_ok=True)
 
-        # Guardar el raster reclasificado
-        with rasterio.open(ruta_salida, "w", **profile) as dst:
-            for i in range(1, src.count + 1):
-                banda = src.read(i)  # Leer solo una banda
-                banda_reclass = np.zeros_like(banda, dtype='uint8')
+        # Guardar el raster reclasificado recorriendo los bloques nativos del GeoTIFF
+        with abrir_salida_raster(ruta_salida, profile, formato_salida, compresion, NODATA_RECLASS) as dst:
+            ventanas = [ventana for _, ventana in src.block_windows(1)]
 
-                for original, nuevo in tabla_reclasificacion.items():
-                    banda_reclass[banda == original] = nuevo
-
-                dst.write(banda_reclass, i)
+            if workers > 1:
+                lote = _tamano_lote(len(ventanas), workers)
+                paso = lote * workers * 2  # Limita los bloques pendientes de escritura en memoria
+                with ProcessPoolExecutor(max_workers=workers,
+                                         initializer=_inicializar_trabajador_reclass,
+                                         initargs=(carpeta_imagenes, lut)) as ejecutor:
+                    for inicio in range(0, len(ventanas), paso):
+                        grupo = ventanas[inicio:inicio + paso]
+                        bloques = ejecutor.map(_reclasificar_ventana, grupo, chunksize=lote)
+                        for ventana, bloque_reclass in zip(grupo, bloques):
+                            dst.write(bloque_reclass, window=ventana)
+            else:
+                for ventana in ventanas:
+                    bloque = src.read(window=ventana)  # Todas las bandas de la ventana
+                    dst.write(aplicar_tabla_reclasificacion(bloque, lut), window=ventana)
 
+    finalizar_salida_raster(ruta_salida, formato_salida, compresion)
     print(f"✅ Imagen reclasificada guardada en: {ruta_salida}")
     return ruta_salida
 
@@ -80,7 +195,156 @@ def reclasificar_coberturas_mapbiomas(carpeta_imagenes, carpeta_salida, tabla_re
 
 
 
-def calcular_transiciones(carpeta_imagenes, anio_inicial, carpeta_salida):
+def _compilar_tabla_transiciones():
+    """
+    Construye la tabla 256x256 uint8 que asigna a cada par (t1, t2) su código de transición.
+    """
+    tabla = np.full((256, 256), 4, dtype=np.uint8)  # Clase por defecto: "Otro"
+    np.fill_diagonal(tabla, 0)  # Sin cambios
+    tabla[1, 3] = 1  # Deforestación
+    tabla[3, 1] = 2  # Regeneración
+    tabla[1, 2] = 3  # Degradación
+    return tabla
+
+
+TABLA_TRANSICIONES = _compilar_tabla_transiciones()
+
+
+def codificar_transiciones(t1, t2):
+    """
+    Asigna el código de transición (0-4) a cada píxel a partir de dos bandas (o ventanas) consecutivas.
+
+    Para rásteres uint8 se resuelve con una sola indexación en TABLA_TRANSICIONES;
+    para otros tipos de dato se aplican las reglas de transición directamente.
+    """
+    if t1.dtype == np.uint8 and t2.dtype == np.uint8:
+        return TABLA_TRANSICIONES[t1, t2]
+
+    transicion = np.full(t1.shape, 4, dtype=np.uint8)  # Clase por defecto: "Otro"
+    transicion[(t1 == t2)] = 0
+    transicion[(t1 == 1) & (t2 == 3)] = 1
+    transicion[(t1 == 3) & (t2 == 1)] = 2
+    transicion[(t1 == 1) & (t2 == 2)] = 3
+    return transicion
+
+
+def generar_ventanas_por_memoria(src, memoria_max_mb=256, arreglos_por_pixel=3):
+    """
+    Divide un ráster en franjas de filas completas cuyo tamaño respeta un presupuesto de memoria.
+
+    Parámetros:
+    -----------
+    src : rasterio.DatasetReader
+        Ráster abierto.
+    memoria_max_mb : float, opcional
+        Memoria máxima (MB) que pueden ocupar los arreglos de una ventana.
+    arreglos_por_pixel : int, opcional
+        Número de arreglos que se mantienen a la vez por ventana (p. ej. t1, t2 y la transición).
+
+    Retorna:
+    --------
+    Generador de objetos rasterio.windows.Window. La altura de cada franja es múltiplo
+    de la altura de bloque del GeoTIFF para no partir bloques internos.
+    """
+    bytes_por_fila = src.width * np.dtype(src.dtypes[0]).itemsize * arreglos_por_pixel
+    filas = max(1, int(memoria_max_mb * 1024 ** 2) // bytes_por_fila)
+
+    alto_bloque = src.block_shapes[0][0]
+    if filas >= alto_bloque:
+        filas -= filas % alto_bloque
+
+    for fila in range(0, src.height, filas):
+        yield Window(0, fila, src.width, min(filas, src.height - fila))
+
+
+def perfil_transicion(src):
+    """
+    Perfil de escritura de un GeoTIFF de transición (una banda uint8) a partir del ráster de entrada.
+    """
+    perfil_actual = src.profile.copy()
+    perfil_actual.update({
+        "count": 1,
+        "dtype": 'uint8',
+        "driver": "GTiff",
+        "transform": src.transform,
+        "crs": src.crs
+    })
+    return perfil_actual
+
+
+# Formatos de salida de los rásteres reclasificados y de transición
+COMPRESIONES_COG = ("deflate", "zstd", "lzw")
+NODATA_RECLASS = 0  # Códigos sin clase asignada (incluye el área fuera del departamento)
+NODATA_TRANSICIONES = 255  # Valor que TABLA_TRANSICIONES nunca produce
+
+
+def _perfil_salida(perfil, formato_salida=None, compresion="deflate", nodata=None):
+    """
+    Ajusta un perfil de escritura al formato de salida.
+
+    Con `formato_salida=None` el perfil no cambia. Con "cog" se escribe primero un GeoTIFF en
+    mosaico (512×512), comprimido con predictor horizontal y nodata explícito, que
+    `finalizar_salida_raster` convierte en Cloud-Optimized GeoTIFF con overviews internos.
+    """
+    if formato_salida is None:
+        return perfil
+    if formato_salida != "cog":
+        raise ValueError(f"⚠️ Formato de salida no reconocido: {formato_salida!r} (use None o 'cog').")
+    if compresion not in COMPRESIONES_COG:
+        raise ValueError(f"⚠️ Compresión no reconocida: {compresion!r} (opciones: {COMPRESIONES_COG}).")
+
+    perfil = perfil.copy()
+    perfil.update({
+        "driver": "GTiff",
+        "tiled": True,
+        "blockxsize": 512,
+        "blockysize": 512,
+        "compress": compresion,
+        "predictor": 2,
+        "interleave": "pixel",
+        "nodata": nodata,
+        "BIGTIFF": "IF_SAFER",
+    })
+    return perfil
+
+
+def _ruta_escritura(ruta, formato_salida=None):
+    """
+    Ruta donde se escribe una salida: la definitiva, o un archivo intermedio si luego se convierte a COG.
+    """
+    return ruta if formato_salida is None else ruta + ".parcial"
+
+
+def abrir_salida_raster(ruta, perfil, formato_salida=None, compresion="deflate", nodata=None):
+    """
+    Abre para escritura una salida ráster en el formato pedido.
+
+    El perfil se ajusta con `_perfil_salida`; con "cog" se escribe en un archivo intermedio, así que
+    después de cerrar el dataset hay que llamar a `finalizar_salida_raster` con la misma ruta.
+    """
+    perfil = _perfil_salida(perfil, formato_salida, compresion, nodata)
+    return rasterio.open(_ruta_escritura(ruta, formato_salida), "w", **perfil)
+
+
+def finalizar_salida_raster(ruta, formato_salida=None, compresion="deflate"):
+    """
+    Convierte el GeoTIFF intermedio en Cloud-Optimized GeoTIFF (si `formato_salida` es "cog").
+
+    Los overviews se calculan con vecino más cercano para no mezclar clases.
+    """
+    if formato_salida is None:
+        return ruta
+
+    intermedio = _ruta_escritura(ruta, formato_salida)
+    rasterio.shutil.copy(intermedio, ruta, driver="COG", compress=compresion, predictor="YES",
+                         blocksize=512, overview_resampling="nearest", bigtiff="IF_SAFER")
+    os.remove(intermedio)
+    return ruta
+
+
+@instrumentacion.instrumentar
+def calcular_transiciones(carpeta_imagenes, anio_inicial, carpeta_salida, streaming=False, memoria_max_mb=256,
+                          workers=1, formato_salida=None, compresion="deflate"):
     """
     Calcula y exporta las transiciones de cobertura entre bandas consecutivas de una imagen multibanda
     reclasificada en tres clases: 1 (bosque), 2 (natural no forestal), 3 (antrópico).
@@ -94,56 +358,1345 @@ def calcular_transiciones(carpeta_imagenes, anio_inicial, carpeta_salida):
     anio_inicial : int
         Año correspondiente a la primera banda del raster.
 
-    carpeta_transiciones : str, opcional
+    carpeta_salida : str
         Ruta a la carpeta donde se guardarán los GeoTIFF de transiciones.
-        Si no se especifica, se guarda en la misma carpeta del archivo de entrada.
+
+    streaming : bool, opcional
+        Si es True, procesa el ráster por franjas (ventanas) sin cargar bandas completas,
+        escribe cada GeoTIFF de transición de forma incremental y no conserva los arreglos.
+
+    memoria_max_mb : float, opcional
+        Presupuesto de memoria (MB) por ventana en modo streaming; define la altura de las franjas.
+
+    workers : int, opcional
+        Número de procesos. Con `workers > 1` cada par de años se calcula en un proceso distinto,
+        que abre su propio dataset; los archivos generados son idénticos a los de la ejecución serial.
+
+    formato_salida : str, opcional
+        None conserva el perfil del ráster de entrada; "cog" escribe Cloud-Optimized GeoTIFF
+        comprimidos, con overviews internos y nodata = 255.
+
+    compresion : str, opcional
+        Compresión de los COG: "deflate" (por defecto), "zstd" o "lzw".
 
     Retorna:
     --------
     transiciones_dict : dict
         Diccionario con arrays numpy de transiciones por año (banda i vs i+1).
+        En modo streaming o en paralelo, cada valor es un diccionario de metadatos con la ruta del
+        GeoTIFF exportado, los años comparados y sus dimensiones.
     """
+    if workers > 1:
+        return _calcular_transiciones_paralelo(carpeta_imagenes, anio_inicial, carpeta_salida,
+                                               memoria_max_mb if streaming else None, workers,
+                                               formato_salida, compresion)
+    if streaming:
+        return _calcular_transiciones_streaming(carpeta_imagenes, anio_inicial, carpeta_salida, memoria_max_mb,
+                                                formato_salida, compresion)
+
     transiciones_dict = {}
+    os.makedirs(carpeta_salida, exist_ok=True)
 
     with rasterio.open(carpeta_imagenes) as src:
         total_bandas = src.count
-        perfil = src.profile.copy()
-        transform = src.transform
-        crs = src.crs
+        perfil_actual = perfil_transicion(src)
 
         for i in range(1, total_bandas):
-            t1 = src.read(i)
-            t2 = src.read(i + 1)
-            transicion = np.full_like(t1, 4, dtype=np.uint8)  # Clase por defecto: "Otro"
-
-            # Reglas de transición
-            transicion[(t1 == t2)] = 0
-            transicion[(t1 == 1) & (t2 == 3)] = 1
-            transicion[(t1 == 3) & (t2 == 1)] = 2
-            transicion[(t1 == 1) & (t2 == 2)] = 3
-
             anio1 = anio_inicial + (i - 1)
             anio2 = anio_inicial + i
             clave = f"{anio1}_to_{anio2}"
-            transiciones_dict[clave] = transicion
 
-            # --- Exportar resultado ---
-            perfil_actual = perfil.copy()
-            perfil_actual.update({
-                "count": 1,
-                "dtype": 'uint8',
-                "driver": "GTiff",
-                "transform": transform,
-                "crs": crs
-            })
+            with instrumentacion.etapa("transicion", par=clave):
+                t1 = src.read(i)
+                t2 = src.read(i + 1)
+                transicion = codificar_transiciones(t1, t2)
+                transiciones_dict[clave] = transicion
 
-            nombre_archivo = f"transicion_{clave}.tif"
-            ruta_exportacion = os.path.join(carpeta_salida, nombre_archivo)
+                # --- Exportar resultado ---
+                nombre_archivo = f"transicion_{clave}.tif"
+                ruta_exportacion = os.path.join(carpeta_salida, nombre_archivo)
 
-            with rasterio.open(ruta_exportacion, 'w', **perfil_actual) as dst:
-                dst.write(transicion, 1)
+                with abrir_salida_raster(ruta_exportacion, perfil_actual, formato_salida, compresion,
+                                         NODATA_TRANSICIONES) as dst:
+                    dst.write(transicion, 1)
+                finalizar_salida_raster(ruta_exportacion, formato_salida, compresion)
+                instrumentacion.registrar(pixeles=transicion.size)
 
             print(f"✅ Transición calculada y exportada: {nombre_archivo}")
 
     return transiciones_dict
 
+
+def _calcular_transiciones_streaming(carpeta_imagenes, anio_inicial, carpeta_salida, memoria_max_mb=256,
+                                     formato_salida=None, compresion="deflate"):
+    """
+    Variante por ventanas de `calcular_transiciones`.
+
+    Recorre el ráster franja a franja; en cada franja lee cada banda una sola vez y la compara
+    con la banda anterior, de modo que solo se mantiene una ventana por banda en memoria.
+    Todos los GeoTIFF de salida permanecen abiertos y se escriben de forma incremental.
+    """
+    os.makedirs(carpeta_salida, exist_ok=True)
+    transiciones_dict = {}
+
+    with rasterio.open(carpeta_imagenes) as src:
+        instrumentacion.registrar(pixeles=src.width * src.height * (src.count - 1))
+        perfil_actual = perfil_transicion(src)
+
+        # Abrir un GeoTIFF de salida por cada par de años
+        salidas = []
+        try:
+            for i in range(1, src.count):
+                anio1 = anio_inicial + (i - 1)
+                anio2 = anio_inicial + i
+                clave = f"{anio1}_to_{anio2}"
+                ruta_exportacion = os.path.join(carpeta_salida, f"transicion_{clave}.tif")
+                salidas.append(abrir_salida_raster(ruta_exportacion, perfil_actual, formato_salida, compresion,
+                                                   NODATA_TRANSICIONES))
+                transiciones_dict[clave] = {
+                    "ruta": ruta_exportacion,
+                    "anio_inicial": anio1,
+                    "anio_final": anio2,
+                    "ancho": src.width,
+                    "alto": src.height,
+                }
+
+            # Recorrer franjas: cada banda se lee una vez por ventana
+            for ventana in generar_ventanas_por_memoria(src, memoria_max_mb):
+                anterior = src.read(1, window=ventana)
+                for i in range(1, src.count):
+                    actual = src.read(i + 1, window=ventana)
+                    salidas[i - 1].write(codificar_transiciones(anterior, actual), 1, window=ventana)
+                    anterior = actual
+        finally:
+            for dst in salidas:
+                dst.close()
+
+    for clave, metadatos in transiciones_dict.items():
+        finalizar_salida_raster(metadatos["ruta"], formato_salida, compresion)
+        print(f"✅ Transición calculada y exportada: transicion_{clave}.tif")
+
+    return transiciones_dict
+
+
+def _exportar_par_transicion(carpeta_imagenes, banda, ruta_exportacion, memoria_max_mb=None,
+                             formato_salida=None, compresion="deflate"):
+    """
+    Calcula y exporta la transición entre las bandas `banda` y `banda + 1` en un proceso trabajador.
+
+    Si `memoria_max_mb` es None se leen las bandas completas (como en el modo normal);
+    de lo contrario se procesa por franjas (como en el modo streaming).
+    """
+    clave = os.path.splitext(os.path.basename(ruta_exportacion))[0].replace("transicion_", "")
+    with instrumentacion.etapa("transicion", par=clave):
+        with rasterio.open(carpeta_imagenes) as src:
+            instrumentacion.registrar(pixeles=src.width * src.height)
+            with abrir_salida_raster(ruta_exportacion, perfil_transicion(src), formato_salida, compresion,
+                                     NODATA_TRANSICIONES) as dst:
+                if memoria_max_mb is None:
+                    dst.write(codificar_transiciones(src.read(banda), src.read(banda + 1)), 1)
+                else:
+                    for ventana in generar_ventanas_por_memoria(src, memoria_max_mb):
+                        t1 = src.read(banda, window=ventana)
+                        t2 = src.read(banda + 1, window=ventana)
+                        dst.write(codificar_transiciones(t1, t2), 1, window=ventana)
+        return finalizar_salida_raster(ruta_exportacion, formato_salida, compresion)
+
+
+def _calcular_transiciones_paralelo(carpeta_imagenes, anio_inicial, carpeta_salida, memoria_max_mb, workers,
+                                   formato_salida=None, compresion="deflate"):
+    """
+    Variante de `calcular_transiciones` que reparte los pares de años entre procesos.
+    """
+    os.makedirs(carpeta_salida, exist_ok=True)
+    transiciones_dict = {}
+
+    with rasterio.open(carpeta_imagenes) as src:
+        total_bandas, ancho, alto = src.count, src.width, src.height
+    # Los pares se miden en los procesos trabajadores; aquí se registra el total
+    instrumentacion.registrar(pixeles=ancho * alto * (total_bandas - 1))
+
+    with ProcessPoolExecutor(max_workers=workers) as ejecutor:
+        futuros = {}
+        for i in range(1, total_bandas):
+            anio1 = anio_inicial + (i - 1)
+            anio2 = anio_inicial + i
+            clave = f"{anio1}_to_{anio2}"
+            ruta_exportacion = os.path.join(carpeta_salida, f"transicion_{clave}.tif")
+            futuros[clave] = ejecutor.submit(_exportar_par_transicion, carpeta_imagenes, i,
+                                             ruta_exportacion, memoria_max_mb, formato_salida, compresion)
+            transiciones_dict[clave] = {
+                "ruta": ruta_exportacion,
+                "anio_inicial": anio1,
+                "anio_final": anio2,
+                "ancho": ancho,
+                "alto": alto,
+            }
+
+        for clave, futuro in futuros.items():
+            futuro.result()  # Propaga cualquier error del proceso trabajador
+            print(f"✅ Transición calculada y exportada: transicion_{clave}.tif")
+
+    return transiciones_dict
+
+
+# Rásteres de trayectoria: nombre → (dtype, nodata)
+METRICAS_TRAYECTORIA = {
+    "primera_perdida_bosque": ("uint16", 0),  # Año de la primera deforestación o degradación
+    "ultimo_cambio": ("uint16", 0),  # Año del último cambio de clase
+    "numero_cambios": ("uint8", None),  # Número de cambios de clase en toda la serie
+    "anios_desde_regeneracion": ("uint8", 255),  # Años entre la última regeneración y el año final
+}
+
+
+@instrumentacion.instrumentar
+def calcular_trayectorias(carpeta_imagenes, anio_inicial, carpeta_salida, memoria_max_mb=256,
+                          formato_salida=None, compresion="deflate"):
+    """
+    Calcula métricas de trayectoria por píxel en una sola pasada sobre el ráster reclasificado.
+
+    El ráster se recorre por franjas y, en cada franja, las bandas se leen en orden comparando cada
+    año con el anterior (como `calcular_transiciones` en modo streaming). Por píxel solo se guarda
+    un estado compacto (uint8/uint16), por lo que la memoria no depende del número de años.
+
+    Un cambio es cualquier paso entre dos clases distintas de 1 a 3 (los píxeles con clase 0 no
+    cuentan); la pérdida de bosque corresponde a las transiciones de deforestación (1 → 3) y
+    degradación (1 → 2), y la regeneración a 3 → 1, según TABLA_TRANSICIONES. Cada evento se
+    fecha con el año de destino.
+
+    Parámetros:
+    -----------
+    carpeta_imagenes : str
+        Ruta al TIFF multibanda reclasificado (una banda por año).
+
+    anio_inicial : int
+        Año correspondiente a la primera banda del raster.
+
+    carpeta_salida : str
+        Carpeta donde se guardan los GeoTIFF `trayectoria_<métrica>.tif`.
+
+    memoria_max_mb : float, opcional
+        Presupuesto de memoria (MB) por franja.
+
+    formato_salida, compresion : str, opcional
+        Formato de los rásteres escritos, como en `calcular_transiciones`.
+
+    Retorna:
+    --------
+    rutas : dict
+        Ruta del GeoTIFF de cada métrica de METRICAS_TRAYECTORIA:
+        - primera_perdida_bosque: año de la primera pérdida de bosque (0 si nunca ocurrió)
+        - ultimo_cambio: año del último cambio de clase (0 si nunca cambió)
+        - numero_cambios: número de cambios de clase
+        - anios_desde_regeneracion: años desde la última regeneración (255 si nunca ocurrió)
+    """
+    os.makedirs(carpeta_salida, exist_ok=True)
+    rutas = {nombre: os.path.join(carpeta_salida, f"trayectoria_{nombre}.tif") for nombre in METRICAS_TRAYECTORIA}
+    salidas = {}
+
+    with rasterio.open(carpeta_imagenes) as src:
+        anio_final = anio_inicial + src.count - 1
+        instrumentacion.registrar(pixeles=src.width * src.height * src.count)
+
+        try:
+            for nombre, (dtype, nodata) in METRICAS_TRAYECTORIA.items():
+                perfil_actual = perfil_transicion(src)
+                perfil_actual.update(dtype=dtype, nodata=nodata)
+                salidas[nombre] = abrir_salida_raster(rutas[nombre], perfil_actual, formato_salida, compresion, nodata)
+
+            # Estado por píxel (~7 bytes) más dos bandas y los temporales de la comparación
+            for ventana in generar_ventanas_por_memoria(src, memoria_max_mb, arreglos_por_pixel=14):
+                forma = (ventana.height, ventana.width)
+                primera_perdida = np.zeros(forma, dtype=np.uint16)
+                ultimo_cambio = np.zeros(forma, dtype=np.uint16)
+                numero_cambios = np.zeros(forma, dtype=np.uint8)
+                ultima_regeneracion = np.zeros(forma, dtype=np.uint16)
+
+                anterior = src.read(1, window=ventana)
+                for i in range(1, src.count):
+                    anio = anio_inicial + i
+                    actual = src.read(i + 1, window=ventana)
+                    codigo = codificar_transiciones(anterior, actual)
+
+                    cambio = (anterior != actual) & (anterior > 0) & (actual > 0)
+                    numero_cambios += cambio
+                    ultimo_cambio[cambio] = anio
+
+                    perdida = ((codigo == 1) | (codigo == 3)) & (primera_perdida == 0)
+                    primera_perdida[perdida] = anio
+                    ultima_regeneracion[codigo == 2] = anio
+
+                    anterior = actual
+
+                anios_desde_regeneracion = np.full(forma, 255, dtype=np.uint8)
+                regenerados = ultima_regeneracion > 0
+                anios_desde_regeneracion[regenerados] = anio_final - ultima_regeneracion[regenerados]
+
+                salidas["primera_perdida_bosque"].write(primera_perdida, 1, window=ventana)
+                salidas["ultimo_cambio"].write(ultimo_cambio, 1, window=ventana)
+                salidas["numero_cambios"].write(numero_cambios, 1, window=ventana)
+                salidas["anios_desde_regeneracion"].write(anios_desde_regeneracion, 1, window=ventana)
+        finally:
+            for dst in salidas.values():
+                dst.close()
+
+    for ruta in rutas.values():
+        finalizar_salida_raster(ruta, formato_salida, compresion)
+        print(f"✅ Trayectoria exportada: {os.path.basename(ruta)}")
+
+    return rutas
+
+
+# Nombres de las clases de transición que se reportan en las estadísticas
+NOMBRES_TRANSICIONES = {1: "Deforestación", 2: "Regeneración", 3: "Degradación"}
+
+
+def exportar_resumen_transiciones(datos, carpeta_destino):
+    """
+    Guarda el diccionario {año: {clase: área}} como `resumen_transiciones.csv`
+    con el mismo formato que `visualization_tools.analizar_transiciones_y_exportar`.
+
+    El archivo se escribe primero con otro nombre y luego reemplaza al anterior (`os.replace`),
+    de modo que una interrupción nunca deja un resumen a medio escribir.
+    """
+    os.makedirs(carpeta_destino, exist_ok=True)
+    path_csv = os.path.join(carpeta_destino, "resumen_transiciones.csv")
+    columnas = list(NOMBRES_TRANSICIONES.values())
+
+    with open(path_csv + ".parcial", "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["Año"] + columnas)
+        for anio in sorted(datos):
+            escritor.writerow([anio] + [datos[anio][columna] for columna in columnas])
+    os.replace(path_csv + ".parcial", path_csv)
+
+    return path_csv
+
+
+@instrumentacion.instrumentar
+def procesar_mapbiomas_en_una_pasada(carpeta_imagenes, anio_inicial, tabla_reclasificacion=None,
+                                     carpeta_reclass=None, carpeta_transiciones=None,
+                                     carpeta_estadisticas=None, pixel_area_ha=None, memoria_max_mb=256,
+                                     formato_salida=None, compresion="deflate"):
+    """
+    Ejecuta reclasificación, transiciones y conteo de áreas en una sola lectura del GeoTIFF de MapBiomas.
+
+    Cada franja del ráster original se lee una vez (todas las bandas), se reclasifica con la tabla
+    de búsqueda, se comparan los años consecutivos y se acumulan las áreas por clase de transición.
+    Escribir los rásteres intermedios es opcional.
+
+    Parámetros:
+    -----------
+    carpeta_imagenes : str
+        Ruta al GeoTIFF multibanda exportado de MapBiomas (una banda por año).
+    anio_inicial : int
+        Año correspondiente a la primera banda del raster.
+    tabla_reclasificacion : dict o np.ndarray, opcional
+        Mapeo clase original → clase nueva, o tabla compilada con `compilar_tabla_reclasificacion`.
+    carpeta_reclass : str, opcional
+        Si se indica, guarda allí el `_reclass.tif` (igual que `reclasificar_coberturas_mapbiomas`).
+    carpeta_transiciones : str, opcional
+        Si se indica, guarda allí un `transicion_{año1}_to_{año2}.tif` por par de años.
+    carpeta_estadisticas : str, opcional
+        Si se indica, guarda allí `resumen_transiciones.csv`.
+    pixel_area_ha : float, opcional
+        Área en hectáreas por píxel. Por defecto (None) se usa el área geodésica de cada fila
+        (`areas_pixel_por_fila_ha`).
+    memoria_max_mb : float, opcional
+        Presupuesto de memoria (MB) por franja.
+    formato_salida, compresion : str, opcional
+        Formato de los rásteres escritos, como en `reclasificar_coberturas_mapbiomas` y `calcular_transiciones`.
+
+    Retorna:
+    --------
+    datos : dict
+        Diccionario {año destino: {"Deforestación": ha, "Regeneración": ha, "Degradación": ha}}.
+    """
+    lut = compilar_tabla_reclasificacion(tabla_reclasificacion)
+    salidas = []
+    rutas_salida = []
+
+    with rasterio.open(carpeta_imagenes) as src:
+        total_bandas = src.count
+        instrumentacion.registrar(pixeles=src.width * src.height * total_bandas)
+        conteos = np.zeros((total_bandas - 1, 5), dtype=np.int64 if pixel_area_ha is not None else np.float64)
+        areas_fila = areas_pixel_por_fila_ha(src) if pixel_area_ha is None else None
+
+        try:
+            # Abrir las salidas opcionales
+            dst_reclass = None
+            if carpeta_reclass is not None:
+                os.makedirs(carpeta_reclass, exist_ok=True)
+                nombre_salida = os.path.splitext(os.path.basename(carpeta_imagenes))[0] + "_reclass.tif"
+                profile = src.profile.copy()
+                profile.update(dtype='uint8')
+                ruta_reclass = os.path.join(carpeta_reclass, nombre_salida)
+                dst_reclass = abrir_salida_raster(ruta_reclass, profile, formato_salida, compresion, NODATA_RECLASS)
+                salidas.append(dst_reclass)
+                rutas_salida.append(ruta_reclass)
+
+            dst_transiciones = []
+            if carpeta_transiciones is not None:
+                os.makedirs(carpeta_transiciones, exist_ok=True)
+                perfil_actual = perfil_transicion(src)
+                for i in range(1, total_bandas):
+                    clave = f"{anio_inicial + i - 1}_to_{anio_inicial + i}"
+                    ruta_exportacion = os.path.join(carpeta_transiciones, f"transicion_{clave}.tif")
+                    dst_transiciones.append(abrir_salida_raster(ruta_exportacion, perfil_actual, formato_salida,
+                                                                compresion, NODATA_TRANSICIONES))
+                    rutas_salida.append(ruta_exportacion)
+                salidas.extend(dst_transiciones)
+
+            # Una sola lectura de cada franja: reclasificar, comparar y contar
+            # (el conteo ponderado por fila usa además un índice de 8 bytes por píxel)
+            arreglos_por_pixel = 2 * total_bandas + (1 if areas_fila is None else 9)
+            for ventana in generar_ventanas_por_memoria(src, memoria_max_mb, arreglos_por_pixel=arreglos_por_pixel):
+                bloque = aplicar_tabla_reclasificacion(src.read(window=ventana), lut)
+                if dst_reclass is not None:
+                    dst_reclass.write(bloque, window=ventana)
+
+                for i in range(total_bandas - 1):
+                    transicion = codificar_transiciones(bloque[i], bloque[i + 1])
+                    if areas_fila is None:
+                        conteos[i] += _bincount_uint8(transicion.ravel())[:5]
+                    else:
+                        conteos[i] += _area_por_valor(
+                            transicion, areas_fila[ventana.row_off:ventana.row_off + ventana.height], 5)
+                    if dst_transiciones:
+                        dst_transiciones[i].write(transicion, 1, window=ventana)
+        finally:
+            for dst in salidas:
+                dst.close()
+
+    for ruta in rutas_salida:
+        finalizar_salida_raster(ruta, formato_salida, compresion)
+
+    # Convertir conteos de píxeles a hectáreas por año destino (con áreas por fila ya están en ha)
+    factor_area = pixel_area_ha if pixel_area_ha is not None else 1.0
+    datos = {}
+    for i in range(total_bandas - 1):
+        anio_destino = anio_inicial + i + 1
+        datos[anio_destino] = {nombre: conteos[i, clase] * factor_area
+                               for clase, nombre in NOMBRES_TRANSICIONES.items()}
+
+    print(f"✅ Procesamiento en una pasada finalizado: {total_bandas - 1} pares de años")
+    if carpeta_estadisticas is not None:
+        path_csv = exportar_resumen_transiciones(datos, carpeta_estadisticas)
+        print(f"✅ CSV guardado en: {path_csv}")
+
+    return datos
+
+
+# Clases temáticas de los rásteres reclasificados (TABLA_RECLASIFICACION_MAPBIOMAS)
+NOMBRES_COBERTURAS = {1: "Bosque", 2: "Cobertura natural", 3: "Uso antrópico"}
+
+# Clase reclasificada → posición en el conteo por zona (los valores fuera de 1-3 cuentan como 0)
+_TABLA_COBERTURAS = np.zeros(256, dtype=np.uint8)
+_TABLA_COBERTURAS[list(NOMBRES_COBERTURAS)] = list(NOMBRES_COBERTURAS)
+
+
+def _rasterizar_zonas_franja(geometrias, limites, ventana, transform, dtype):
+    """
+    Malla densa de identificadores de zona (posición + 1; 0 fuera de las zonas) de una franja.
+
+    Solo se rasterizan los polígonos cuya extensión toca la franja.
+    """
+    alto, ancho = int(ventana.height), int(ventana.width)
+    izquierda, abajo, derecha, arriba = rasterio.windows.bounds(ventana, transform)
+    toca = ((limites[:, 0] < derecha) & (limites[:, 2] > izquierda) &
+            (limites[:, 1] < arriba) & (limites[:, 3] > abajo))
+    formas = [(geometrias[idx], int(idx) + 1) for idx in np.flatnonzero(toca)]
+    if not formas:
+        return np.zeros((alto, ancho), dtype=dtype)
+    return features.rasterize(formas, out_shape=(alto, ancho), transform=rasterio.windows.transform(ventana, transform),
+                              fill=0, dtype=dtype)
+
+
+def _abrir_malla_zonas(ruta_zonas, src, huella, dtype):
+    """
+    Abre la malla de zonas guardada en `ruta_zonas` si corresponde a la misma malla y geometrías
+    (lectura), o crea un GeoTIFF intermedio para guardarla (escritura). Retorna (lector, escritor).
+    """
+    if ruta_zonas is None:
+        return None, None
+
+    if os.path.exists(ruta_zonas):
+        zonas = rasterio.open(ruta_zonas)
+        if (zonas.tags().get("HUELLA_ZONAS") == huella and zonas.crs == src.crs
+                and zonas.transform == src.transform and (zonas.width, zonas.height) == (src.width, src.height)):
+            return zonas, None
+        zonas.close()
+        print(f"⚠️ La malla de zonas '{ruta_zonas}' no corresponde a este ráster o a estas geometrías; se regenera.")
+
+    carpeta = os.path.dirname(ruta_zonas)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    perfil = {
+        "driver": "GTiff", "width": src.width, "height": src.height, "count": 1, "dtype": dtype,
+        "crs": src.crs, "transform": src.transform, "nodata": 0, "compress": "deflate",
+        "blockysize": src.block_shapes[0][0], "BIGTIFF": "IF_SAFER",
+    }
+    escritor = rasterio.open(ruta_zonas + ".parcial", "w", **perfil)
+    escritor.update_tags(HUELLA_ZONAS=huella)
+    return None, escritor
+
+
+@instrumentacion.instrumentar
+def procesar_mapbiomas_por_departamentos(carpeta_imagenes, anio_inicial, gdf_departamentos, campo_nombre="DeNombre",
+                                         tabla_reclasificacion=None, carpeta_estadisticas=None, ruta_zonas=None,
+                                         pixel_area_ha=None, memoria_max_mb=256):
+    """
+    Calcula las áreas de transición y de cobertura de todos los departamentos en una sola lectura
+    de un GeoTIFF nacional de MapBiomas.
+
+    Cada franja del ráster se lee una vez (todas las bandas) y se reclasifica con la tabla de
+    búsqueda; los límites departamentales se rasterizan en la misma franja como una malla de
+    identificadores de zona, y cada par de años se cuenta zona × clase con un único `np.bincount`
+    (ponderado por el área de cada fila, como en `procesar_mapbiomas_en_una_pasada`). Así, los 32
+    departamentos cuestan una lectura nacional en lugar de 32 exportaciones y ejecuciones.
+
+    Parámetros:
+    -----------
+    carpeta_imagenes : str
+        GeoTIFF multibanda nacional de MapBiomas (una banda por año, códigos originales).
+    anio_inicial : int
+        Año correspondiente a la primera banda del raster.
+    gdf_departamentos : GeoDataFrame
+        Límites departamentales (p. ej. `Departamento.shp`, en cualquier CRS: se reproyectan al del ráster).
+    campo_nombre : str, opcional
+        Columna con el nombre del departamento (por defecto "DeNombre").
+    tabla_reclasificacion : dict o np.ndarray, opcional
+        Mapeo clase original → clase nueva, o tabla compilada con `compilar_tabla_reclasificacion`.
+    carpeta_estadisticas : str, opcional
+        Si se indica, guarda las tablas con `exportar_estadisticas_departamentos`.
+    ruta_zonas : str, opcional
+        GeoTIFF donde guardar la malla de departamentos rasterizada. Si ya existe para la misma malla
+        y las mismas geometrías, se lee en lugar de volver a rasterizar.
+    pixel_area_ha : float, opcional
+        Área en hectáreas por píxel. Por defecto (None) se usa el área geodésica de cada fila
+        (`areas_pixel_por_fila_ha`).
+    memoria_max_mb : float, opcional
+        Presupuesto de memoria (MB) por franja.
+
+    Retorna:
+    --------
+    resultado : dict
+        {"departamentos": {nombre: {"transiciones": {año destino: {clase: ha}},
+                                    "coberturas": {año: {clase: ha}}}},
+         "nacional": {...}}. "nacional" incluye también los píxeles fuera de los departamentos.
+    """
+    lut = compilar_tabla_reclasificacion(tabla_reclasificacion)
+    nombres = [str(nombre) for nombre in gdf_departamentos[campo_nombre]]
+    n_zonas = len(nombres)
+    dtype_zonas = "uint8" if n_zonas < np.iinfo(np.uint8).max else "uint16"
+    bins_transiciones, bins_coberturas = (n_zonas + 1) * 5, (n_zonas + 1) * 4
+
+    with rasterio.open(carpeta_imagenes) as src:
+        total_bandas = src.count
+        instrumentacion.registrar(pixeles=src.width * src.height * total_bandas)
+
+        geometrias = list(gdf_departamentos.to_crs(src.crs).geometry)
+        vacias = [geom is None or geom.is_empty for geom in geometrias]
+        limites = np.array([(np.inf, np.inf, -np.inf, -np.inf) if vacia else geom.bounds
+                            for geom, vacia in zip(geometrias, vacias)]).reshape(-1, 4)
+        huella = hashlib.sha1(b"".join(b"" if vacia else geom.wkb for geom, vacia in zip(geometrias, vacias))).hexdigest()
+
+        areas_fila = areas_pixel_por_fila_ha(src) if pixel_area_ha is None else None
+        tipo = np.int64 if areas_fila is None else np.float64
+        conteos_transiciones = np.zeros((total_bandas - 1, bins_transiciones), dtype=tipo)
+        conteos_coberturas = np.zeros((total_bandas, bins_coberturas), dtype=tipo)
+
+        def contar(codigo, n_bins, areas_franja):
+            if areas_franja is None:
+                return np.bincount(codigo.ravel(), minlength=n_bins)
+            return _area_por_valor(codigo, areas_franja, n_bins)
+
+        lector_zonas, escritor_zonas = _abrir_malla_zonas(ruta_zonas, src, huella, dtype_zonas)
+        try:
+            # Bandas leídas y reclasificadas, malla de zonas y códigos/índices de 8 bytes
+            arreglos_por_pixel = 2 * total_bandas + 2 + 16
+            for ventana in generar_ventanas_por_memoria(src, memoria_max_mb, arreglos_por_pixel=arreglos_por_pixel):
+                if lector_zonas is not None:
+                    zona = lector_zonas.read(1, window=ventana)
+                else:
+                    zona = _rasterizar_zonas_franja(geometrias, limites, ventana, src.transform, dtype_zonas)
+                    if escritor_zonas is not None:
+                        escritor_zonas.write(zona, 1, window=ventana)
+
+                areas_franja = None
+                if areas_fila is not None:
+                    areas_franja = areas_fila[ventana.row_off:ventana.row_off + ventana.height]
+
+                bloque = aplicar_tabla_reclasificacion(src.read(window=ventana), lut)
+                base = zona.astype(np.intp)
+                base_transiciones, base_coberturas = base * 5, base * 4
+                for i in range(total_bandas):
+                    conteos_coberturas[i] += contar(base_coberturas + _TABLA_COBERTURAS[bloque[i]],
+                                                    bins_coberturas, areas_franja)
+                    if i:
+                        transicion = codificar_transiciones(bloque[i - 1], bloque[i])
+                        conteos_transiciones[i - 1] += contar(base_transiciones + transicion,
+                                                              bins_transiciones, areas_franja)
+        finally:
+            if lector_zonas is not None:
+                lector_zonas.close()
+            if escritor_zonas is not None:
+                escritor_zonas.close()
+
+    if escritor_zonas is not None:
+        os.replace(ruta_zonas + ".parcial", ruta_zonas)
+
+    # Conteos (o áreas) zona × clase → hectáreas por departamento y año
+    factor_area = pixel_area_ha if pixel_area_ha is not None else 1.0
+    transiciones = conteos_transiciones.reshape(total_bandas - 1, n_zonas + 1, 5) * factor_area
+    coberturas = conteos_coberturas.reshape(total_bandas, n_zonas + 1, 4) * factor_area
+
+    def tablas(areas_transiciones, areas_coberturas):
+        return {
+            "transiciones": {anio_inicial + i + 1: {nombre: float(areas_transiciones[i, clase])
+                                                    for clase, nombre in NOMBRES_TRANSICIONES.items()}
+                             for i in range(total_bandas - 1)},
+            "coberturas": {anio_inicial + i: {nombre: float(areas_coberturas[i, clase])
+                                              for clase, nombre in NOMBRES_COBERTURAS.items()}
+                           for i in range(total_bandas)},
+        }
+
+    resultado = {
+        "departamentos": {nombre: tablas(transiciones[:, zona + 1], coberturas[:, zona + 1])
+                          for zona, nombre in enumerate(nombres)},
+        "nacional": tablas(transiciones.sum(axis=1), coberturas.sum(axis=1)),
+    }
+
+    print(f"✅ Estadísticas nacionales calculadas en una lectura: {n_zonas} departamentos, "
+          f"{total_bandas - 1} pares de años")
+    if carpeta_estadisticas is not None:
+        exportar_estadisticas_departamentos(resultado, carpeta_estadisticas)
+
+    return resultado
+
+
+def exportar_estadisticas_departamentos(resultado, carpeta_destino):
+    """
+    Guarda el resultado de `procesar_mapbiomas_por_departamentos`:
+
+    - `transiciones_por_departamento.csv` y `coberturas_por_departamento.csv`: una fila por
+      departamento y año (más las filas "Total nacional").
+    - `<departamento>/resumen_transiciones.csv`: el mismo resumen que produce el flujo de un solo
+      departamento (`exportar_resumen_transiciones`).
+
+    Retorna la lista de archivos escritos.
+    """
+    os.makedirs(carpeta_destino, exist_ok=True)
+    filas = list(resultado["departamentos"].items()) + [("Total nacional", resultado["nacional"])]
+    rutas = []
+
+    for tabla, nombres_clases in [("transiciones", NOMBRES_TRANSICIONES), ("coberturas", NOMBRES_COBERTURAS)]:
+        columnas = list(nombres_clases.values())
+        ruta_csv = os.path.join(carpeta_destino, f"{tabla}_por_departamento.csv")
+        # Se escribe en un archivo temporal para no dejar una tabla a medias si el proceso se interrumpe
+        with open(ruta_csv + ".parcial", "w", newline="", encoding="utf-8") as f:
+            escritor = csv.writer(f)
+            escritor.writerow(["Departamento", "Año"] + columnas)
+            for nombre, datos in filas:
+                for anio in sorted(datos[tabla]):
+                    escritor.writerow([nombre, anio] + [datos[tabla][anio][columna] for columna in columnas])
+        os.replace(ruta_csv + ".parcial", ruta_csv)
+        rutas.append(ruta_csv)
+
+    for nombre, datos in resultado["departamentos"].items():
+        rutas.append(exportar_resumen_transiciones(datos["transiciones"], os.path.join(carpeta_destino, nombre)))
+
+    print(f"✅ Estadísticas por departamento guardadas en: {carpeta_destino}")
+    return rutas
+
+
+# Zonas rasterizadas en memoria, reutilizables entre años (clave: geometrías + malla del ráster).
+# Se conservan solo las últimas MAX_CACHE_ZONAS, para que un ciclo sobre muchos departamentos o
+# una sesión larga no acumulen mallas indefinidamente.
+_CACHE_ZONAS = OrderedDict()
+MAX_CACHE_ZONAS = 4
+
+
+def _agrupar_zonas_sin_traslape(gdf):
+    """
+    Reparte los polígonos en grupos sin traslape entre sí (coloreado voraz del grafo de traslapes),
+    para poder rasterizar cada grupo en una sola malla de identificadores.
+    """
+    geometrias = gdf.geometry.reset_index(drop=True)
+    izq, der = geometrias.sindex.query(geometrias, predicate="intersects")
+    pares = izq < der
+    izq, der = izq[pares], der[pares]
+
+    # Los polígonos que solo comparten borde no se consideran traslapados
+    if len(izq):
+        se_tocan = np.asarray(geometrias.iloc[izq].reset_index(drop=True).touches(
+            geometrias.iloc[der].reset_index(drop=True), align=False))
+        izq, der = izq[~se_tocan], der[~se_tocan]
+
+    vecinos = [[] for _ in range(len(geometrias))]
+    for a, b in zip(izq, der):
+        vecinos[a].append(b)
+        vecinos[b].append(a)
+
+    grupo_de = np.full(len(geometrias), -1, dtype=np.int64)
+    for idx in range(len(geometrias)):
+        ocupados = {grupo_de[v] for v in vecinos[idx]}
+        grupo = 0
+        while grupo in ocupados:
+            grupo += 1
+        grupo_de[idx] = grupo
+
+    return [np.flatnonzero(grupo_de == g) for g in range(grupo_de.max() + 1)] if len(geometrias) else []
+
+
+def _limites_totales(geometrias):
+    """
+    Extensión (minx, miny, maxx, maxy) que cubre una lista de geometrías.
+    """
+    limites = np.array([geom.bounds for geom in geometrias])
+    return limites[:, 0].min(), limites[:, 1].min(), limites[:, 2].max(), limites[:, 3].max()
+
+
+def _ventana_de_limites(src, limites):
+    """
+    Ventana entera del ráster que cubre la extensión (minx, miny, maxx, maxy), recortada a sus bordes.
+    """
+    minx, miny, maxx, maxy = limites
+    inversa = ~src.transform
+    cols, filas = zip(inversa * (minx, maxy), inversa * (maxx, miny))
+    col_ini = int(np.clip(np.floor(min(cols)), 0, src.width))
+    col_fin = int(np.clip(np.ceil(max(cols)), 0, src.width))
+    fila_ini = int(np.clip(np.floor(min(filas)), 0, src.height))
+    fila_fin = int(np.clip(np.ceil(max(filas)), 0, src.height))
+    return Window(col_ini, fila_ini, col_fin - col_ini, fila_fin - fila_ini)
+
+
+def rasterizar_zonas(gdf, src, memoria_max_mb=256):
+    """
+    Rasteriza todos los polígonos de un GeoDataFrame en una malla de identificadores de zona
+    alineada con el ráster `src`, para calcular estadísticas zonales sin recortar polígono a polígono.
+
+    Cada polígono recibe el identificador `posición + 1`. Los polígonos que se traslapan se
+    rasterizan en pasadas distintas, de modo que cada uno conserva todos sus píxeles (mismo
+    criterio de centro de píxel que `rasterio.mask.mask`). La malla se guarda de forma dispersa
+    (posición del píxel dentro de la ventana que cubre las zonas + identificador) y en una caché
+    de las últimas `MAX_CACHE_ZONAS` mallas, para reutilizarla entre años.
+
+    Parámetros:
+    -----------
+    gdf : GeoDataFrame
+        Zonas (parques, resguardos, departamentos...) en el mismo CRS que el ráster.
+    src : rasterio.DatasetReader
+        Ráster de referencia (define la malla: transform, ancho y alto).
+    memoria_max_mb : float, opcional
+        Presupuesto de memoria (MB) de cada franja rasterizada.
+
+    Retorna:
+    --------
+    zonas : dict
+        Diccionario con la ventana que cubre las zonas ("ventana"), las posiciones ordenadas de
+        los píxeles ("posiciones") y sus identificadores ("ids"), el número de zonas ("n_zonas")
+        y la máscara de zonas fuera del ráster ("fuera").
+    """
+    geometrias = gdf.geometry.reset_index(drop=True)
+    clave = (
+        hashlib.sha1(b"".join(geometrias.to_wkb())).hexdigest(),
+        str(src.crs), tuple(src.transform)[:6], src.width, src.height,
+    )
+    if clave in _CACHE_ZONAS:
+        _CACHE_ZONAS.move_to_end(clave)
+        return _CACHE_ZONAS[clave]
+
+    # Ventana del ráster que cubre todas las zonas
+    ventana = _ventana_de_limites(src, geometrias.total_bounds if len(geometrias) else (0, 0, 0, 0))
+    ancho, alto_total = int(ventana.width), int(ventana.height)
+
+    # Zonas que no se traslapan con la extensión del ráster
+    izquierda, abajo, derecha, arriba = src.bounds
+    limites = geometrias.bounds
+    fuera = ((limites["minx"] >= derecha) | (limites["maxx"] <= izquierda) |
+             (limites["miny"] >= arriba) | (limites["maxy"] <= abajo)).to_numpy()
+
+    dtype = 'uint16' if len(geometrias) < np.iinfo(np.uint16).max else 'int32'
+    posiciones, ids = [], []
+    if ancho > 0 and alto_total > 0:
+        for grupo in _agrupar_zonas_sin_traslape(geometrias):
+            formas = [(geometrias.iloc[idx], int(idx) + 1) for idx in grupo
+                      if not fuera[idx] and geometrias.iloc[idx] is not None and not geometrias.iloc[idx].is_empty]
+            if not formas:
+                continue
+
+            # Rasterizar el grupo por franjas dentro de su propia extensión
+            sub = _ventana_de_limites(src, _limites_totales([forma for forma, _ in formas]))
+            ancho_sub = int(sub.width)
+            dc = int(sub.col_off - ventana.col_off)
+            df = int(sub.row_off - ventana.row_off)
+            filas_franja = max(1, int(memoria_max_mb * 1024 ** 2) // max(1, ancho_sub * np.dtype(dtype).itemsize))
+
+            for fila in range(0, int(sub.height) if ancho_sub else 0, filas_franja):
+                alto = min(filas_franja, int(sub.height) - fila)
+                franja = Window(sub.col_off, sub.row_off + fila, ancho_sub, alto)
+                malla = features.rasterize(formas, out_shape=(alto, ancho_sub),
+                                           transform=rasterio.windows.transform(franja, src.transform),
+                                           fill=0, dtype=dtype).ravel()
+                dentro = np.flatnonzero(malla)
+                fila_local, col_local = np.divmod(dentro, ancho_sub)
+                posiciones.append((fila_local + df + fila) * ancho + col_local + dc)
+                ids.append(malla[dentro])
+
+    posiciones = np.concatenate(posiciones) if posiciones else np.zeros(0, dtype=np.int64)
+    ids = np.concatenate(ids) if ids else np.zeros(0, dtype=dtype)
+    orden = np.argsort(posiciones, kind="stable")
+
+    zonas = {
+        "ventana": ventana,
+        "posiciones": posiciones[orden].astype(np.int64),
+        "ids": ids[orden],
+        "n_zonas": len(geometrias),
+        "fuera": fuera,
+    }
+    _CACHE_ZONAS[clave] = zonas
+    while len(_CACHE_ZONAS) > MAX_CACHE_ZONAS:
+        _CACHE_ZONAS.popitem(last=False)  # Descartar la malla usada hace más tiempo
+    return zonas
+
+
+def contar_clases_por_zona(src, zonas, banda=1, memoria_max_mb=256, areas_fila=None):
+    """
+    Cuenta los píxeles de cada valor (0-255) dentro de cada zona con un único `np.bincount` por franja.
+
+    Si se indica `areas_fila` (p. ej. `areas_pixel_por_fila_ha(src)`), cada píxel suma el área de su
+    fila en lugar de 1, y el resultado es el área por zona y valor.
+
+    Solo se leen los valores en las posiciones de la malla de zonas, por lo que el costo es
+    proporcional a la superficie de las zonas y no a la del ráster completo.
+
+    Parámetros:
+    -----------
+    src : rasterio.DatasetReader
+        Ráster de clases (p. ej. un GeoTIFF de transición) en la misma malla usada por `rasterizar_zonas`.
+    zonas : dict
+        Resultado de `rasterizar_zonas`.
+    banda : int, opcional
+        Banda a leer (por defecto 1).
+    memoria_max_mb : float, opcional
+        Presupuesto de memoria (MB) por franja.
+    areas_fila : np.ndarray, opcional
+        Área de un píxel en cada fila del ráster completo.
+
+    Retorna:
+    --------
+    conteos : np.ndarray
+        Matriz (n_zonas, 256) con el número de píxeles (o el área, con `areas_fila`) por zona y valor.
+    """
+    n_bins = (zonas["n_zonas"] + 1) * 256
+    conteos = np.zeros(n_bins, dtype=np.int64 if areas_fila is None else np.float64)
+    ventana = zonas["ventana"]
+    posiciones, ids = zonas["posiciones"], zonas["ids"]
+    ancho = int(ventana.width)
+
+    if len(posiciones):
+        bytes_por_fila = ancho * np.dtype(src.dtypes[banda - 1]).itemsize
+        filas = max(1, int(memoria_max_mb * 1024 ** 2) // max(1, bytes_por_fila))
+
+        for fila in range(0, int(ventana.height), filas):
+            alto = min(filas, int(ventana.height) - fila)
+            inicio, fin = np.searchsorted(posiciones, [fila * ancho, (fila + alto) * ancho])
+            if inicio == fin:
+                continue
+
+            franja = Window(ventana.col_off, ventana.row_off + fila, ventana.width, alto)
+            clases = src.read(banda, window=franja).ravel()[posiciones[inicio:fin] - fila * ancho]
+            id_zona = ids[inicio:fin].astype(np.int64)
+            pesos = None
+            if areas_fila is not None:
+                pesos = areas_fila[int(ventana.row_off) + posiciones[inicio:fin] // ancho]
+
+            if clases.dtype != np.uint8:
+                validos = (clases >= 0) & (clases <= 255)
+                clases, id_zona = clases[validos], id_zona[validos]
+                if pesos is not None:
+                    pesos = pesos[validos]
+
+            conteos += np.bincount(id_zona * 256 + clases.astype(np.int64), weights=pesos, minlength=n_bins)
+
+    # Descartar la fila del fondo (identificador 0)
+    return conteos.reshape(zonas["n_zonas"] + 1, 256)[1:]
+
+
+def nombres_de_zonas(gdf):
+    """
+    Nombres de las áreas protegidas o resguardos (campo "NOMBRE" o "ap_nombre").
+    """
+    columna = "NOMBRE" if "NOMBRE" in gdf.columns else "ap_nombre"
+    return [str(nombre) for nombre in gdf[columna]]
+
+
+@instrumentacion.instrumentar
+def calcular_cubo_transiciones_por_area(carpeta_tifs, anio_desde, anio_hasta, gdf_pnn, gdf_resguardos,
+                                        resolucion=None, ruta_salida=None):
+    """
+    Calcula el área de cada transición por área protegida y año para un rango de años completo.
+
+    Las zonas se reproyectan y rasterizan una sola vez, y luego se recorren todos los rásteres
+    `transicion_{anio-1}_to_{anio}.tif` del rango, contando zona × clase con `contar_clases_por_zona`.
+
+    Parámetros:
+    -----------
+    carpeta_tifs : str
+        Carpeta con los GeoTIFF de transición.
+    anio_desde, anio_hasta : int
+        Primer y último año destino del rango (inclusive).
+    gdf_pnn, gdf_resguardos : GeoDataFrame
+        Parques Nacionales Naturales y resguardos indígenas.
+    resolucion : float, opcional
+        Resolución del píxel en metros. Por defecto (None) el área de cada píxel se toma de su fila
+        (`areas_pixel_por_fila_ha`), lo que es exacto en rásteres EPSG:4326 sin reproyectarlos.
+    ruta_salida : str, opcional
+        Si se indica, guarda el cubo en un archivo .npz comprimido.
+
+    Retorna:
+    --------
+    cubo : dict
+        Diccionario con "areas_ha" (arreglo año × área × clase), "anios", "tipos",
+        "nombres" y "clases". Los años sin ráster de transición quedan en NaN.
+    """
+    if anio_desde > anio_hasta:
+        raise ValueError("⚠️ El año final debe ser mayor o igual que el año inicial.")
+
+    pixel_area_ha = (resolucion ** 2) / 10000 if resolucion is not None else None  # conversión m² a ha
+    anios = list(range(anio_desde, anio_hasta + 1))
+    clases = list(NOMBRES_TRANSICIONES)
+    capas = [("PNN", gdf_pnn), ("Resguardos", gdf_resguardos)]
+
+    tipos, nombres = [], []
+    for tipo_area, gdf in capas:
+        nombres_capa = nombres_de_zonas(gdf)
+        tipos.extend([tipo_area] * len(nombres_capa))
+        nombres.extend(nombres_capa)
+
+    areas_ha = np.full((len(anios), len(nombres), len(clases)), np.nan)
+    capas_reproyectadas = None
+
+    for posicion_anio, anio in enumerate(anios):
+        ruta_tif = os.path.join(carpeta_tifs, f"transicion_{anio - 1}_to_{anio}.tif")
+        if not os.path.exists(ruta_tif):
+            print(f"⚠️ No se encontró ningún archivo para el año {anio}.")
+            continue
+
+        with instrumentacion.etapa("estadisticas_por_area", anio=anio), rasterio.open(ruta_tif) as src:
+            instrumentacion.registrar(pixeles=src.width * src.height)
+            # Reproyectar una sola vez (todas las transiciones comparten CRS)
+            if capas_reproyectadas is None or capas_reproyectadas[0] != src.crs:
+                capas_reproyectadas = (src.crs, [gdf.to_crs(src.crs) for _, gdf in capas])
+
+            areas_fila = areas_pixel_por_fila_ha(src) if pixel_area_ha is None else None
+
+            inicio = 0
+            for gdf in capas_reproyectadas[1]:
+                zonas = rasterizar_zonas(gdf, src)  # En caché mientras la malla no cambie
+                areas = contar_clases_por_zona(src, zonas, areas_fila=areas_fila)[:, clases]
+                if pixel_area_ha is not None:
+                    areas = areas * pixel_area_ha
+                fin = inicio + len(gdf)
+                areas_ha[posicion_anio, inicio:fin] = areas
+                areas_ha[posicion_anio, inicio:fin][zonas["fuera"]] = np.nan
+                inicio = fin
+
+        print(f"✅ Estadísticas por área calculadas para el año {anio}")
+
+    cubo = {
+        "areas_ha": areas_ha,
+        "anios": np.array(anios),
+        "tipos": np.array(tipos),
+        "nombres": np.array(nombres),
+        "clases": np.array([NOMBRES_TRANSICIONES[clase] for clase in clases]),
+    }
+
+    if ruta_salida is not None:
+        os.makedirs(os.path.dirname(ruta_salida) or ".", exist_ok=True)
+        np.savez_compressed(ruta_salida, **cubo)
+        print(f"✅ Cubo de transiciones guardado en: {ruta_salida}")
+
+    return cubo
+
+
+def cargar_cubo_transiciones_por_area(ruta_cubo):
+    """
+    Carga un cubo guardado por `calcular_cubo_transiciones_por_area`.
+    """
+    with np.load(ruta_cubo) as datos:
+        return {clave: datos[clave] for clave in datos.files}
+
+
+# Elipsoide WGS84 (semieje mayor en metros y achatamiento)
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+
+
+def _area_desde_ecuador_m2(latitudes_rad, ancho_lon_rad):
+    """
+    Área (m²) sobre el elipsoide WGS84 entre el ecuador y cada latitud, para un sector de `ancho_lon_rad`.
+    """
+    e2 = WGS84_F * (2 - WGS84_F)
+    e = np.sqrt(e2)
+    b = WGS84_A * (1 - WGS84_F)
+    seno = np.sin(latitudes_rad)
+    return 0.5 * ancho_lon_rad * b ** 2 * (seno / (1 - e2 * seno ** 2)
+                                           + np.log((1 + e * seno) / (1 - e * seno)) / (2 * e))
+
+
+def areas_pixel_por_fila_ha(src):
+    """
+    Área geodésica (ha) de un píxel en cada fila del ráster, a partir de su transform y su CRS.
+
+    En un CRS geográfico (p. ej. EPSG:4326) el área de una celda depende solo de la latitud, por lo
+    que basta un valor por fila, calculado de forma exacta sobre el elipsoide WGS84; las áreas por
+    clase se obtienen multiplicando los conteos de cada fila por su peso, sin reproyectar ni remuestrear.
+    En un CRS proyectado todas las filas tienen el área nominal del píxel.
+
+    Retorna:
+    --------
+    areas : np.ndarray
+        Arreglo float64 de `src.height` posiciones.
+    """
+    transform = src.transform
+    if transform.b != 0 or transform.d != 0:
+        raise ValueError("⚠️ El ráster está rotado; el área por fila requiere una malla norte-arriba.")
+
+    if src.crs is not None and src.crs.is_geographic:
+        bordes = np.clip(transform.f + transform.e * np.arange(src.height + 1), -90, 90)
+        areas_m2 = np.abs(np.diff(_area_desde_ecuador_m2(np.radians(bordes), np.radians(abs(transform.a)))))
+        return areas_m2 / 10000
+
+    factor = src.crs.linear_units_factor[1] if src.crs is not None else 1.0
+    return np.full(src.height, abs(transform.a * transform.e) * factor ** 2 / 10000)
+
+
+def _area_por_valor(valores, areas_fila, n_valores=256):
+    """
+    Suma el área de los píxeles de cada valor en una franja 2D, ponderando cada fila por su área.
+
+    Los valores se desplazan por fila (`valor + fila * n_valores`) para contar fila × valor con un solo
+    `np.bincount`; el área es el producto de ese conteo por el vector de áreas de las filas.
+    """
+    alto = valores.shape[0]
+    indice = valores.astype(np.intp) + (np.arange(alto, dtype=np.intp) * n_valores)[:, None]
+    conteo = np.bincount(indice.ravel(), minlength=alto * n_valores).reshape(alto, n_valores)
+    return areas_fila @ conteo
+
+
+def _bincount_uint8(valores):
+    """
+    Histograma de 256 posiciones de un arreglo uint8 contiguo, contando dos píxeles por elemento
+    (vista uint16): la mitad de elementos para `np.bincount`, con el mismo resultado exacto.
+    """
+    pares = valores.size // 2
+    conteo = np.bincount(valores[:pares * 2].view(np.uint16), minlength=65536).reshape(256, 256)
+    histograma = conteo.sum(axis=0) + conteo.sum(axis=1)
+    if valores.size % 2:
+        histograma[valores[-1]] += 1
+    return histograma
+
+
+@instrumentacion.instrumentar
+def histograma_raster(ruta_raster, banda=1, memoria_max_mb=64):
+    """
+    Cuenta los píxeles de cada valor (0-255) de una banda, leyendo el ráster por franjas.
+
+    Los píxeles nodata se descartan restando su posición del histograma, sin crear copias
+    filtradas del arreglo. Funciona aunque el ráster no tenga valor nodata definido.
+
+    Parámetros:
+    -----------
+    ruta_raster : str
+        Ruta al GeoTIFF (p. ej. un ráster de transición).
+    banda : int, opcional
+        Banda a leer (por defecto 1).
+    memoria_max_mb : float, opcional
+        Presupuesto de memoria (MB) por franja.
+
+    Retorna:
+    --------
+    histograma : np.ndarray
+        Arreglo int64 de 256 posiciones con el conteo de píxeles por valor.
+    """
+    histograma = np.zeros(256, dtype=np.int64)
+
+    with rasterio.open(ruta_raster) as src:
+        instrumentacion.anotar(archivo=os.path.basename(ruta_raster))
+        instrumentacion.registrar(pixeles=src.width * src.height)
+        nodata = src.nodata
+        es_uint8 = np.dtype(src.dtypes[banda - 1]) == np.uint8
+
+        # El bincount convierte cada franja a enteros de 8 bytes
+        for ventana in generar_ventanas_por_memoria(src, memoria_max_mb, arreglos_por_pixel=9):
+            bloque = src.read(banda, window=ventana).ravel()
+            if es_uint8:
+                histograma += _bincount_uint8(bloque)
+            else:
+                validos = (bloque >= 0) & (bloque <= 255)
+                if nodata is not None:
+                    validos &= bloque != nodata
+                histograma += np.bincount(bloque[validos].astype(np.int64), minlength=256)[:256]
+
+    if es_uint8 and nodata is not None and float(nodata).is_integer() and 0 <= nodata <= 255:
+        histograma[int(nodata)] = 0
+
+    return histograma
+
+
+def histogramas_rasters(rutas, banda=1, workers=4, memoria_max_mb=64):
+    """
+    Calcula `histograma_raster` para varios archivos a la vez con un grupo de hilos.
+
+    Retorna:
+    --------
+    histogramas : dict
+        Diccionario ruta → histograma (np.ndarray de 256 posiciones).
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ejecutor:
+        resultados = ejecutor.map(instrumentacion.en_etapa_actual(
+            lambda ruta: histograma_raster(ruta, banda, memoria_max_mb)), rutas)
+        return dict(zip(rutas, resultados))
+
+
+@instrumentacion.instrumentar
+def area_por_clase_raster(ruta_raster, banda=1, pixel_area_ha=None, memoria_max_mb=64):
+    """
+    Área (ha) de cada valor (0-255) de una banda.
+
+    Con `pixel_area_ha=None` cada fila se pondera con su área geodésica (`areas_pixel_por_fila_ha`);
+    con un valor fijo equivale a `histograma_raster(...) * pixel_area_ha`. Los píxeles nodata no se cuentan.
+
+    Retorna:
+    --------
+    areas : np.ndarray
+        Arreglo float64 de 256 posiciones con el área por valor.
+    """
+    if pixel_area_ha is not None:
+        return histograma_raster(ruta_raster, banda, memoria_max_mb) * pixel_area_ha
+
+    areas = np.zeros(256)
+    with rasterio.open(ruta_raster) as src:
+        instrumentacion.anotar(archivo=os.path.basename(ruta_raster))
+        instrumentacion.registrar(pixeles=src.width * src.height)
+        areas_fila = areas_pixel_por_fila_ha(src)
+        nodata = src.nodata
+
+        # Índice fila × valor de 8 bytes más la tabla de conteos por fila
+        for ventana in generar_ventanas_por_memoria(src, memoria_max_mb, arreglos_por_pixel=17):
+            bloque = src.read(banda, window=ventana)
+            areas_franja = areas_fila[ventana.row_off:ventana.row_off + ventana.height]
+            if bloque.dtype == np.uint8:
+                areas += _area_por_valor(bloque, areas_franja)
+            else:
+                validos = (bloque >= 0) & (bloque <= 255)
+                if nodata is not None:
+                    validos &= bloque != nodata
+                pesos = np.broadcast_to(areas_franja[:, None], bloque.shape)[validos]
+                areas += np.bincount(bloque[validos].astype(np.intp), weights=pesos, minlength=256)[:256]
+
+    if nodata is not None and float(nodata).is_integer() and 0 <= nodata <= 255:
+        areas[int(nodata)] = 0
+
+    return areas
+
+
+def areas_por_clase_rasters(rutas, banda=1, workers=4, pixel_area_ha=None, memoria_max_mb=64):
+    """
+    Calcula `area_por_clase_raster` para varios archivos a la vez con un grupo de hilos.
+
+    Retorna un diccionario ruta → áreas (np.ndarray de 256 posiciones, en ha).
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ejecutor:
+        resultados = ejecutor.map(instrumentacion.en_etapa_actual(
+            lambda ruta: area_por_clase_raster(ruta, banda, pixel_area_ha, memoria_max_mb)), rutas)
+        return dict(zip(rutas, resultados))
+
+
+def leer_banda_para_pantalla(src, banda=1, ancho_px=1000, alto_px=1000, limites=None, masked=False):
+    """
+    Lee una banda con la resolución justa para dibujarla en un área de `ancho_px` × `alto_px` píxeles.
+
+    La lectura usa `out_shape` con remuestreo por vecino más cercano, de modo que GDAL aprovecha los
+    overviews internos (p. ej. de los COG) o lee de forma diezmada, sin cargar la banda completa.
+    Si se indican `limites` (minx, miny, maxx, maxy en el CRS del ráster) solo se lee esa zona,
+    a resolución completa cuando cabe en el área de dibujo.
+
+    Retorna:
+    --------
+    arreglo : np.ndarray (o arreglo enmascarado si `masked=True`)
+        Banda leída, como máximo de alto_px × ancho_px.
+    extension : tuple
+        (izquierda, derecha, abajo, arriba) de la zona leída, para `imshow(..., extent=extension)`.
+    """
+    ventana = Window(0, 0, src.width, src.height)
+    if limites is not None:
+        ventana = rasterio.windows.from_bounds(*limites, transform=src.transform)
+        ventana = ventana.round_offsets().round_lengths().intersection(Window(0, 0, src.width, src.height))
+
+    escala = max(ventana.width / ancho_px, ventana.height / alto_px, 1)
+    forma = (max(1, int(np.ceil(ventana.height / escala))), max(1, int(np.ceil(ventana.width / escala))))
+
+    arreglo = src.read(banda, window=ventana, out_shape=forma, masked=masked,
+                       resampling=Resampling.nearest)
+
+    izquierda, abajo, derecha, arriba = rasterio.windows.bounds(ventana, src.transform)
+    return arreglo, (izquierda, derecha, abajo, arriba)
+
+
+def clases_presentes(arreglo=None, histograma=None, nodata=None):
+    """
+    Valores (0-255) presentes en un arreglo uint8 o en un histograma ya calculado
+    (p. ej. con `histograma_raster`), sin construir conjuntos de Python píxel a píxel.
+    """
+    if histograma is None:
+        valores = np.asarray(arreglo.compressed() if np.ma.isMaskedArray(arreglo) else arreglo).ravel()
+        if valores.dtype != np.uint8:
+            return np.unique(valores[valores != nodata] if nodata is not None else valores)
+        histograma = _bincount_uint8(valores)
+    clases = np.flatnonzero(histograma)
+    if nodata is not None:
+        clases = clases[clases != nodata]
+    return clases
+
+
+def _clases_observadas(src, memoria_max_mb=256):
+    """
+    Códigos (0-255) presentes en alguna banda del ráster y si hay valores fuera de ese rango,
+    con una lectura por franjas de todas las bandas.
+    """
+    presentes = np.zeros(256, dtype=bool)
+    fuera_de_rango = False
+    for ventana in generar_ventanas_por_memoria(src, memoria_max_mb, arreglos_por_pixel=9):
+        for banda in range(1, src.count + 1):
+            bloque = src.read(banda, window=ventana).ravel()
+            if bloque.dtype == np.uint8:
+                presentes |= _bincount_uint8(bloque) > 0
+                continue
+            validos = (bloque >= 0) & (bloque <= 255)
+            fuera_de_rango |= not validos.all()
+            presentes |= np.bincount(bloque[validos].astype(np.intp), minlength=256)[:256] > 0
+    return np.flatnonzero(presentes).tolist(), fuera_de_rango
+
+
+@instrumentacion.instrumentar
+def calcular_matriz_transiciones(carpeta_imagenes, anio_inicial, clases=None, gdf_zonas=None,
+                                 pixel_area_ha=None, memoria_max_mb=256):
+    """
+    Calcula la matriz completa de transiciones clase origen × clase destino entre bandas consecutivas.
+
+    Cada par de píxeles se codifica como `t1 * K + t2` y todas las combinaciones se cuentan con un
+    único `np.bincount` por franja. Funciona tanto con los rásteres reclasificados (3 clases)
+    como con los códigos originales de MapBiomas.
+
+    Parámetros:
+    -----------
+    carpeta_imagenes : str
+        Ruta al GeoTIFF multibanda (reclasificado u original de MapBiomas).
+    anio_inicial : int
+        Año correspondiente a la primera banda del raster.
+    clases : list, opcional
+        Códigos de clase (distintos, entre 0 y 255) que forman las filas/columnas de la matriz. Los
+        códigos no listados (y los valores fuera de 0-255) se agrupan en una última categoría "otros". Si no se indica, una
+        primera lectura por franjas determina los códigos presentes en el ráster y la matriz usa
+        solo esos (más "otros" si hay valores fuera de 0-255), de modo que K y la memoria de las
+        matrices por zona dependen de las clases observadas y no de los 256 códigos posibles.
+    gdf_zonas : GeoDataFrame, opcional
+        Si se indica, calcula además una matriz por zona (en el CRS del ráster).
+    pixel_area_ha : float, opcional
+        Área fija en hectáreas por píxel. Por defecto (None) cada fila se pondera con su área
+        geodésica (`areas_pixel_por_fila_ha`), como en el resumen anual y las tablas por área.
+    memoria_max_mb : float, opcional
+        Presupuesto de memoria (MB) por franja.
+
+    Retorna:
+    --------
+    resultado : dict
+        "clases": etiquetas de filas/columnas; "matrices": {clave: matriz K×K en ha};
+        "por_zona": {clave: arreglo n_zonas×K×K en ha} (o None si no se indican zonas).
+    """
+    with rasterio.open(carpeta_imagenes) as src:
+        # Tabla código → posición en la matriz; los códigos sin posición propia van a "otros"
+        if clases is None:
+            clases, fuera_de_rango = _clases_observadas(src, memoria_max_mb)
+            etiquetas = clases + (["otros"] if fuera_de_rango else [])
+        else:
+            clases = [int(clase) for clase in clases]
+            if any(clase < 0 or clase > 255 for clase in clases) or len(set(clases)) != len(clases):
+                raise ValueError("⚠️ Las clases de la matriz deben ser códigos distintos entre 0 y 255.")
+            etiquetas = clases + ["otros"]
+        otros = len(clases)
+        indices = np.full(256, otros, dtype=np.uint16)
+        for posicion, clase in enumerate(clases):
+            indices[int(clase)] = posicion
+        k = max(len(etiquetas), 1)
+
+        def a_indices(bloque):
+            if bloque.dtype == np.uint8:
+                return indices[bloque]
+            validos = (bloque >= 0) & (bloque <= 255)
+            return np.where(validos, indices[np.where(validos, bloque, 0).astype(np.intp)], otros).astype(np.uint16)
+
+        pares = src.count - 1
+        instrumentacion.registrar(pixeles=src.width * src.height * src.count)
+        claves = [f"{anio_inicial + i}_to_{anio_inicial + i + 1}" for i in range(pares)]
+        areas_fila = areas_pixel_por_fila_ha(src) if pixel_area_ha is None else None
+        conteos = np.zeros((pares, k * k), dtype=np.int64 if areas_fila is None else np.float64)
+
+        zonas = None
+        if gdf_zonas is not None:
+            zonas = rasterizar_zonas(gdf_zonas, src, memoria_max_mb)
+            n_zonas = zonas["n_zonas"]
+            conteos_zona = np.zeros((pares, (n_zonas + 1) * k * k), dtype=conteos.dtype)
+            ventana_z = zonas["ventana"]
+            ancho_z = int(ventana_z.width)
+            # Fila y columna (en el ráster) de cada píxel de zona, calculadas una sola vez
+            fila_z, col_z = np.divmod(zonas["posiciones"], max(ancho_z, 1))
+            fila_z += int(ventana_z.row_off)
+            col_z += int(ventana_z.col_off)
+
+        # Índices de 2 bytes y códigos de 8 bytes, más los pesos por píxel si el área es geodésica
+        for ventana in generar_ventanas_por_memoria(src, memoria_max_mb,
+                                                    arreglos_por_pixel=2 * 2 + 8 + (8 if areas_fila is not None else 0)):
+            pesos = None
+            if areas_fila is not None:
+                areas_franja = areas_fila[ventana.row_off:ventana.row_off + ventana.height]
+                pesos = np.broadcast_to(areas_franja[:, None], (int(ventana.height), int(ventana.width))).ravel()
+
+            # Posiciones de las zonas que caen en esta franja (en coordenadas de la franja)
+            if zonas is not None and len(zonas["posiciones"]):
+                inicio, fin = np.searchsorted(fila_z, [ventana.row_off, ventana.row_off + ventana.height])
+                filas_local = fila_z[inicio:fin] - int(ventana.row_off)
+                cols_local = col_z[inicio:fin]
+                id_zona = zonas["ids"][inicio:fin].astype(np.int64)
+                pesos_zona = areas_franja[filas_local] if areas_fila is not None else None
+            else:
+                filas_local = None
+
+            anterior = a_indices(src.read(1, window=ventana))
+            for i in range(pares):
+                actual = a_indices(src.read(i + 2, window=ventana))
+                codigo = anterior.astype(np.int64) * k + actual
+                conteos[i] += np.bincount(codigo.ravel(), weights=pesos, minlength=k * k)
+
+                if filas_local is not None and len(filas_local):
+                    codigo_zona = id_zona * (k * k) + codigo[filas_local, cols_local]
+                    conteos_zona[i] += np.bincount(codigo_zona, weights=pesos_zona, minlength=(n_zonas + 1) * k * k)
+                anterior = actual
+
+    factor_area = pixel_area_ha if pixel_area_ha is not None else 1.0  # Con pesos por fila ya está en ha
+    resultado = {
+        "clases": etiquetas,
+        "matrices": {clave: conteos[i].reshape(k, k) * factor_area for i, clave in enumerate(claves)},
+        "por_zona": None,
+    }
+    if zonas is not None:
+        resultado["por_zona"] = {
+            clave: conteos_zona[i].reshape(n_zonas + 1, k, k)[1:] * factor_area
+            for i, clave in enumerate(claves)
+        }
+
+    print(f"✅ Matrices de transición calculadas: {pares} pares de años, {k} clases")
+    return resultado
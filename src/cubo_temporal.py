@@ -0,0 +1,222 @@
+"""
+Cubo de series temporales por píxel a partir de los GeoTIFF multibanda de MapBiomas.
+
+Los GeoTIFF exportados (`exportar_bandas_mapbiomas`) y reclasificados (`reclasificar_coberturas_mapbiomas`)
+guardan una banda por año, lo que favorece leer un año completo pero obliga a leer todas las bandas
+para conocer la historia de un píxel. El cubo reorganiza los datos en teselas espaciales que
+contienen todos los años, guardadas como archivos .npy con forma (filas, columnas, años): la serie
+de cada píxel queda contigua en disco y las teselas se abren como memmap, sin copias.
+
+Estructura en disco:
+
+    <ruta_cubo>/
+        metadatos.json          # años, dimensiones, tamaño de tesela, transform, CRS, dtype, nodata
+        tesela_<fila>_<col>.npy # arreglo (alto, ancho, años) de la tesela
+"""
+# Librerías para manejo de datos raster
+import rasterio  #Leer los GeoTIFF multibanda
+from rasterio.windows import Window  #Leer y ubicar las teselas
+from affine import Affine  #Reconstruir la georreferencia del cubo
+import numpy as np  #Arreglos y memmaps de las teselas
+
+# Librerías para manejo de archivos y rutas
+import os  #Interactuar con el sistema de archivos (rutas)
+import re  #Obtener los años del nombre del archivo exportado
+import json  #Guardar y leer los metadatos del cubo
+from collections import OrderedDict  #Memmaps abiertos con descarte del menos usado
+
+# Funciones del proyecto
+import instrumentacion  #Métricas de la construcción del cubo
+
+
+ARCHIVO_METADATOS = "metadatos.json"
+MAX_MEMMAPS_ABIERTOS = 64  # Teselas abiertas a la vez por cubo (cada memmap ocupa un mapeo del proceso)
+
+
+def _anio_inicial_de_nombre(ruta_tif):
+    """
+    Año inicial a partir de nombres como `Mapbiomas_from_2019_to_2023[_reclass].tif`.
+    """
+    coincidencia = re.search(r"_from_(\d{4})_to_(\d{4})", os.path.basename(ruta_tif))
+    if coincidencia is None:
+        raise ValueError(f"⚠️ No se pudo deducir el año inicial de '{ruta_tif}'; indique `anio_inicial`.")
+    return int(coincidencia.group(1))
+
+
+def _ruta_tesela(ruta_cubo, fila, col):
+    return os.path.join(ruta_cubo, f"tesela_{fila}_{col}.npy")
+
+
+@instrumentacion.instrumentar
+def construir_cubo(ruta_tif, ruta_cubo, anio_inicial=None, tamano_tesela=256, memoria_max_mb=256):
+    """
+    Convierte un GeoTIFF multibanda (una banda por año) en un cubo de teselas .npy (filas, columnas, años).
+
+    Parámetros:
+    -----------
+    ruta_tif : str
+        GeoTIFF multibanda exportado de MapBiomas o reclasificado.
+
+    ruta_cubo : str
+        Carpeta de salida del cubo.
+
+    anio_inicial : int, opcional
+        Año de la primera banda. Si no se indica se deduce del nombre (`..._from_<año>_to_<año>...`).
+
+    tamano_tesela : int, opcional
+        Lado de cada tesela en píxeles (por defecto 256: 39 años × 256² píxeles ≈ 2.5 MB en uint8).
+
+    memoria_max_mb : float, opcional
+        Memoria máxima (MB) por lectura; se leen varias teselas contiguas de una franja a la vez.
+
+    Retorna:
+    --------
+    cubo : dict
+        El cubo abierto con `abrir_cubo`.
+    """
+    if anio_inicial is None:
+        anio_inicial = _anio_inicial_de_nombre(ruta_tif)
+
+    os.makedirs(ruta_cubo, exist_ok=True)
+    ruta_metadatos = os.path.join(ruta_cubo, ARCHIVO_METADATOS)
+    if os.path.exists(ruta_metadatos):
+        os.remove(ruta_metadatos)  # Un cubo sin metadatos se considera incompleto
+    for nombre in os.listdir(ruta_cubo):
+        if nombre.startswith("tesela_") and nombre.endswith(".npy"):
+            os.remove(os.path.join(ruta_cubo, nombre))  # Teselas de un cubo anterior
+
+    with rasterio.open(ruta_tif) as src:
+        total_bandas = src.count
+        dtype = np.dtype(src.dtypes[0])
+        instrumentacion.registrar(pixeles=src.width * src.height * total_bandas)
+
+        # Columnas por lectura: múltiplo del tamaño de tesela que respeta el presupuesto de memoria
+        bytes_por_columna = total_bandas * tamano_tesela * dtype.itemsize * 2  # bloque leído + tesela reordenada
+        teselas_por_lectura = max(1, int(memoria_max_mb * 1024 ** 2) // (bytes_por_columna * tamano_tesela))
+        ancho_lectura = teselas_por_lectura * tamano_tesela
+
+        for fila in range(0, src.height, tamano_tesela):
+            alto = min(tamano_tesela, src.height - fila)
+            for col_lectura in range(0, src.width, ancho_lectura):
+                ventana = Window(col_lectura, fila, min(ancho_lectura, src.width - col_lectura), alto)
+                bloque = src.read(window=ventana)  # (años, filas, columnas)
+
+                for inicio in range(0, bloque.shape[2], tamano_tesela):
+                    tesela = np.ascontiguousarray(np.moveaxis(bloque[:, :, inicio:inicio + tamano_tesela], 0, -1))
+                    np.save(_ruta_tesela(ruta_cubo, fila // tamano_tesela, (col_lectura + inicio) // tamano_tesela),
+                            tesela)
+
+        metadatos = {
+            "anios": list(range(anio_inicial, anio_inicial + total_bandas)),
+            "alto": src.height,
+            "ancho": src.width,
+            "tamano_tesela": tamano_tesela,
+            "dtype": dtype.str,
+            "nodata": src.nodata,
+            "transform": list(src.transform)[:6],
+            "crs": src.crs.to_wkt() if src.crs else None,
+            "origen": os.path.abspath(ruta_tif),
+        }
+
+    # Los metadatos se escriben al final: su presencia indica que el cubo está completo
+    with open(ruta_metadatos + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(metadatos, f, indent=2)
+    os.replace(ruta_metadatos + ".tmp", ruta_metadatos)
+
+    print(f"✅ Cubo temporal guardado en: {ruta_cubo} ({len(metadatos['anios'])} años)")
+    return abrir_cubo(ruta_cubo)
+
+
+def abrir_cubo(ruta_cubo):
+    """
+    Abre un cubo creado con `construir_cubo`.
+
+    Retorna un diccionario con los metadatos (anios, alto, ancho, tamano_tesela, dtype, nodata,
+    transform como Affine, crs en WKT), la `ruta` y el número de teselas por eje (`filas_teselas`, `cols_teselas`).
+    """
+    ruta_metadatos = os.path.join(ruta_cubo, ARCHIVO_METADATOS)
+    if not os.path.exists(ruta_metadatos):
+        raise FileNotFoundError(f"❌ No se encontró un cubo completo en '{ruta_cubo}'.")
+
+    with open(ruta_metadatos, encoding="utf-8") as f:
+        cubo = json.load(f)
+
+    cubo["ruta"] = ruta_cubo
+    cubo["transform"] = Affine(*cubo["transform"])
+    cubo["filas_teselas"] = -(-cubo["alto"] // cubo["tamano_tesela"])
+    cubo["cols_teselas"] = -(-cubo["ancho"] // cubo["tamano_tesela"])
+    return cubo
+
+
+def leer_tesela(cubo, fila_tesela, col_tesela):
+    """
+    Tesela (filas, columnas, años) como memmap de solo lectura: no se copia a memoria.
+
+    Los últimos `MAX_MEMMAPS_ABIERTOS` memmaps abiertos se guardan en el propio cubo para no releer
+    la cabecera .npy en cada consulta; al superar ese número se cierra el usado hace más tiempo, de modo
+    que las consultas aleatorias sobre un cubo nacional no agotan el límite de mapeos del proceso.
+    """
+    memmaps = cubo.setdefault("memmaps", OrderedDict())
+    clave = (fila_tesela, col_tesela)
+    if clave in memmaps:
+        memmaps.move_to_end(clave)
+        return memmaps[clave]
+
+    memmaps[clave] = np.load(_ruta_tesela(cubo["ruta"], fila_tesela, col_tesela), mmap_mode="r")
+    while len(memmaps) > MAX_MEMMAPS_ABIERTOS:
+        memmaps.popitem(last=False)  # Descartar la tesela usada hace más tiempo
+    return memmaps[clave]
+
+
+def iterar_teselas(cubo):
+    """
+    Recorre el cubo tesela a tesela en orden de archivo (lectura secuencial).
+
+    Genera tuplas (ventana, tesela): la Window de la tesela en el ráster original y su memmap
+    (filas, columnas, años).
+    """
+    lado = cubo["tamano_tesela"]
+    for fila_tesela in range(cubo["filas_teselas"]):
+        for col_tesela in range(cubo["cols_teselas"]):
+            # Sin guardar el memmap en el cubo: cada tesela se libera al pasar a la siguiente
+            tesela = np.load(_ruta_tesela(cubo["ruta"], fila_tesela, col_tesela), mmap_mode="r")
+            yield Window(col_tesela * lado, fila_tesela * lado, tesela.shape[1], tesela.shape[0]), tesela
+
+
+def serie_pixel(cubo, fila, col):
+    """
+    Serie temporal (un valor por año) del píxel (fila, col) del ráster original.
+    """
+    if not (0 <= fila < cubo["alto"] and 0 <= col < cubo["ancho"]):
+        raise IndexError(f"⚠️ El píxel ({fila}, {col}) está fuera del cubo.")
+    lado = cubo["tamano_tesela"]
+    return leer_tesela(cubo, fila // lado, col // lado)[fila % lado, col % lado]
+
+
+def serie_en_coordenada(cubo, x, y):
+    """
+    Serie temporal del píxel que contiene el punto (x, y) en el CRS del cubo.
+    """
+    col, fila = ~cubo["transform"] * (x, y)
+    return serie_pixel(cubo, int(np.floor(fila)), int(np.floor(col)))
+
+
+def leer_ventana(cubo, ventana):
+    """
+    Lee una ventana del cubo como arreglo (filas, columnas, años), uniendo las teselas que abarca.
+    """
+    ventana = Window(*map(int, (ventana.col_off, ventana.row_off, ventana.width, ventana.height)))
+    lado = cubo["tamano_tesela"]
+    salida = np.empty((ventana.height, ventana.width, len(cubo["anios"])), dtype=np.dtype(cubo["dtype"]))
+
+    for fila_tesela in range(ventana.row_off // lado, -(-(ventana.row_off + ventana.height) // lado)):
+        for col_tesela in range(ventana.col_off // lado, -(-(ventana.col_off + ventana.width) // lado)):
+            tesela = leer_tesela(cubo, fila_tesela, col_tesela)
+            f0 = max(ventana.row_off, fila_tesela * lado)
+            f1 = min(ventana.row_off + ventana.height, fila_tesela * lado + tesela.shape[0])
+            c0 = max(ventana.col_off, col_tesela * lado)
+            c1 = min(ventana.col_off + ventana.width, col_tesela * lado + tesela.shape[1])
+            salida[f0 - ventana.row_off:f1 - ventana.row_off, c0 - ventana.col_off:c1 - ventana.col_off] = \
+                tesela[f0 - fila_tesela * lado:f1 - fila_tesela * lado, c0 - col_tesela * lado:c1 - col_tesela * lado]
+
+    return salida
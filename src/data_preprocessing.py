@@ -1,19 +1,24 @@
 # Librerías para manipulación y análisis geoespacial
 import geopandas as gpd   #Manejo de datos geoespaciales
-import rasterio           #Trabajar con imágenes ráster
-import ee                 #Usar Google Earth Engine
 import numpy as np        #Operaciones con matrices y arrays numéricos
-
-# Librerías para visualización
-import matplotlib.pyplot as plt  #Crear gráficos y visualizar datos
-import matplotlib.patches as mpatches #Crear objetos gráficos: 
-from matplotlib.colors import ListedColormap #Definir y manejar con paletas de colores personalizadas
-
-# Librerías para manejo de tipos y listas
-from typing import List #Especificar listas de tipos específicos (cadenas de texto)
+import pandas as pd       #Manejar datos tabulares (agrupar áreas por departamento)
 
 # Librerías para manejo de archivos y rutas
 import os  #Interactuar con el sistema de archivos (rutas)
+import hashlib  #Calcular huellas de archivos para la caché de capas
+import tempfile  #Archivos temporales únicos al escribir la caché
+
+# Librerías para geometrías y procesamiento en paralelo
+from shapely.geometry import MultiPolygon  #Reunir las partes poligonales de una intersección
+from concurrent.futures import ProcessPoolExecutor  #Repartir departamentos entre varios procesos
+
+# Earth Engine se importa en el primer uso (no es necesario para el preprocesamiento vectorial)
+from lazy_imports import importar_perezoso
+ee = importar_perezoso("ee")  #Usar Google Earth Engine
+
+# Funciones del proyecto
+import exportacion_teselas  #Exportación por teselas de imágenes de Earth Engine
+import instrumentacion  #Métricas de las etapas (sin costo mientras está desactivada)
 
 
 # Autenticación en Google Earth Engine
@@ -38,15 +43,35 @@ def load_mapbiomas_asset():
     imagen = ee.Image("projects/mapbiomas-public/assets/colombia/collection2/mapbiomas_colombia_collection2_integration_v1")
     return imagen
 
+# Rutas relativas de las capas geoespaciales dentro de la carpeta DATOS
+CAPAS_GEOESPACIALES = {
+    "dept": "dept/Departamento.shp",
+    "reg": "region/RAISG.shp",
+    "resg": "Resg/Resguardo_Indigena_Formalizado.shp",
+    "runap": "runap/runap.shp",
+}
+
+# Archivos que acompañan a un shapefile y cuyo cambio invalida la caché
+EXTENSIONES_SHAPEFILE = [".shp", ".shx", ".dbf", ".prj", ".cpg", ".CPG"]
+
+
 # Cargar y preparar las capas geoespaciales (shapefiles)
-def load_geospatial_layers(root_folder):
+def load_geospatial_layers(root_folder, carpeta_cache=None):
     """
     Carga las capas geoespaciales desde archivos .shp.
+
+    Si se indica `carpeta_cache`, cada capa se lee desde la caché GeoParquet (ver `cargar_capa_geoespacial`).
     """
-    dept_path = os.path.join(root_folder, "dept/Departamento.shp")
-    reg_path = os.path.join(root_folder, "region/RAISG.shp")
-    resg_path = os.path.join(root_folder, "Resg/Resguardo_Indigena_Formalizado.shp")
-    runap_path = os.path.join(root_folder, "runap/runap.shp")
+    if carpeta_cache is not None:
+        dept, reg, resg, runap = (cargar_capa_geoespacial(root_folder, nombre, carpeta_cache)
+                                  for nombre in ("dept", "reg", "resg", "runap"))
+        print ("✅Finalizó la función load_geospatial_layers")
+        return dept, reg, resg, runap
+
+    dept_path = os.path.join(root_folder, CAPAS_GEOESPACIALES["dept"])
+    reg_path = os.path.join(root_folder, CAPAS_GEOESPACIALES["reg"])
+    resg_path = os.path.join(root_folder, CAPAS_GEOESPACIALES["resg"])
+    runap_path = os.path.join(root_folder, CAPAS_GEOESPACIALES["runap"])
 
     # Cargar los shapefiles usando geopandas
     dept = gpd.read_file(dept_path)
@@ -57,6 +82,114 @@ def load_geospatial_layers(root_folder):
     print ("✅Finalizó la función load_geospatial_layers")
     
     return dept, reg, resg, runap
+
+
+# Huella de un shapefile (y sus archivos asociados) para la caché
+def firma_shapefile(ruta_shp, modo="mtime"):
+    """
+    Calcula la huella de un shapefile a partir de sus archivos asociados (.shp, .shx, .dbf, .prj, .cpg).
+
+    Parámetros:
+    - ruta_shp: ruta al archivo .shp
+    - modo: "mtime" (tamaño y fecha de modificación, rápido) o "hash" (contenido completo, SHA-1)
+    """
+    if modo not in ("mtime", "hash"):
+        raise ValueError("⚠️ El modo de firma debe ser 'mtime' o 'hash'.")
+
+    huella = hashlib.sha1()
+    base = os.path.splitext(ruta_shp)[0]
+    for extension in EXTENSIONES_SHAPEFILE:
+        ruta = base + extension
+        if not os.path.exists(ruta):
+            continue
+        huella.update(extension.encode())
+        if modo == "mtime":
+            estado = os.stat(ruta)
+            huella.update(f"{estado.st_size}:{estado.st_mtime_ns}".encode())
+        else:
+            with open(ruta, "rb") as f:
+                for bloque in iter(lambda: f.read(1024 * 1024), b""):
+                    huella.update(bloque)
+
+    return huella.hexdigest()[:16]
+
+
+# Cargar una capa desde la caché GeoParquet (o crearla si está desactualizada)
+def cargar_capa_geoespacial(root_folder, nombre, carpeta_cache, crs=None, modo_firma="mtime"):
+    """
+    Carga una sola capa (dept, reg, resg o runap), opcionalmente reproyectada, usando una caché GeoParquet.
+
+    La entrada de la caché se identifica por el nombre de la capa, el CRS de destino y la huella de los
+    archivos fuente; si el shapefile cambia, la huella cambia y la capa se vuelve a leer y reproyectar.
+    Las entradas antiguas de la misma capa y CRS se eliminan. Solo se lee la capa solicitada.
+
+    Parámetros:
+    - root_folder: carpeta DATOS con los shapefiles
+    - nombre: clave de la capa en CAPAS_GEOESPACIALES
+    - carpeta_cache: carpeta donde se guardan los archivos .parquet
+    - crs: CRS de destino (ej. "EPSG:9377"); si no se indica se conserva el original
+    - modo_firma: "mtime" o "hash" (ver `firma_shapefile`)
+    """
+    if nombre not in CAPAS_GEOESPACIALES:
+        raise ValueError(f"La capa '{nombre}' no existe. Opciones: {list(CAPAS_GEOESPACIALES)}")
+
+    ruta_shp = os.path.join(root_folder, CAPAS_GEOESPACIALES[nombre])
+    etiqueta_crs = crs.replace(":", "") if crs else "original"
+    prefijo = f"{nombre}_{etiqueta_crs}_"
+    ruta_cache = os.path.join(carpeta_cache, f"{prefijo}{firma_shapefile(ruta_shp, modo_firma)}.parquet")
+
+    if os.path.exists(ruta_cache):
+        return gpd.read_parquet(ruta_cache)
+
+    capa = gpd.read_file(ruta_shp)
+    if crs is not None:
+        capa = capa.to_crs(crs)
+
+    try:
+        os.makedirs(carpeta_cache, exist_ok=True)
+        # Escribir en un archivo temporal de nombre único y renombrar, para no dejar entradas
+        # incompletas ni pisar el temporal de otro proceso que llene la misma caché
+        with tempfile.NamedTemporaryFile(dir=carpeta_cache, prefix=prefijo, suffix=".tmp", delete=False) as f:
+            ruta_temporal = f.name
+        try:
+            capa.to_parquet(ruta_temporal)
+            os.replace(ruta_temporal, ruta_cache)
+        finally:
+            if os.path.exists(ruta_temporal):
+                os.remove(ruta_temporal)
+
+        # Eliminar entradas antiguas de la misma capa y CRS (otro proceso puede haberlas borrado ya)
+        for archivo in os.listdir(carpeta_cache):
+            ruta = os.path.join(carpeta_cache, archivo)
+            if archivo.startswith(prefijo) and archivo.endswith(".parquet") and ruta != ruta_cache:
+                try:
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+    except ImportError as ex:
+        # GeoParquet requiere pyarrow; sin él se trabaja sin caché
+        print(f"⚠️ No se pudo guardar la capa '{nombre}' en la caché (instale pyarrow):", ex)
+
+    return capa
+
+
+# Cargar las capas ya reproyectadas a EPSG:9377 desde la caché
+@instrumentacion.instrumentar
+def load_reprojected_layers(root_folder, carpeta_cache, crs="EPSG:9377", modo_firma="mtime"):
+    """
+    Equivale a `load_geospatial_layers` + `reproject_layers_pl`, pero usando la caché GeoParquet:
+    en un arranque con la caché vigente no se leen shapefiles ni se reproyecta.
+
+    Retorna las capas en el mismo orden que `reproject_layers_pl`: dept, resg, runap, reg.
+    """
+    dept_9377, resg_9377, runap_9377, reg_9377 = (
+        cargar_capa_geoespacial(root_folder, nombre, carpeta_cache, crs, modo_firma)
+        for nombre in ("dept", "resg", "runap", "reg")
+    )
+
+    print ("✅Finalizó la función load_reprojected_layers")
+
+    return dept_9377, resg_9377, runap_9377, reg_9377
     
 # Reproyectar las capas a EPSG:9377
 def reproject_layers_pl(dept, resg, runap, reg):
@@ -75,6 +208,57 @@ def reproject_layers_pl(dept, resg, runap, reg):
     return dept_9377, resg_9377, runap_9377, reg_9377
 
 
+# Sumar áreas de intersección por departamento sin construir capas de overlay
+def area_interseccion_por_departamento(capa, departamentos, nombre_columna, campo='DeNombre'):
+    """
+    Suma, por departamento, el área de intersección entre una capa de polígonos y los departamentos.
+
+    Usa el índice espacial (STRtree) de los departamentos para encontrar los pares candidatos y
+    calcula solo las áreas de intersección de esos pares de forma vectorizada, sin materializar
+    un GeoDataFrame de overlay con todas las columnas. El resultado equivale a
+    `gpd.overlay(capa, departamentos, how='intersection')` agrupado por `campo`.
+
+    Parámetros:
+    capa: GeoDataFrame de polígonos (región, parques, resguardos) en el mismo CRS que los departamentos
+    departamentos: GeoDataFrame de departamentos (con campo 'DeNombre')
+    nombre_columna: nombre de la columna de área en el resultado
+    campo: campo con el nombre del departamento (por defecto 'DeNombre')
+
+    Retorna:
+    - DataFrame con columnas [campo, nombre_columna], solo para departamentos con intersección.
+    """
+    geom_capa = _geometrias_validas(capa.geometry)
+    geom_dept = _geometrias_validas(departamentos.geometry)
+
+    # Pares candidatos (polígono de la capa, departamento) según el índice espacial
+    idx_capa, idx_dept = geom_dept.sindex.query(geom_capa, predicate='intersects')
+
+    # Área de intersección de cada par, calculada en bloque
+    areas = geom_capa.iloc[idx_capa].reset_index(drop=True).intersection(
+        geom_dept.iloc[idx_dept].reset_index(drop=True), align=False).area.to_numpy()
+
+    # Los pares que solo se tocan no aportan área (overlay tampoco los conserva)
+    con_area = areas > 0
+    resultado = pd.DataFrame({
+        campo: departamentos[campo].to_numpy()[idx_dept[con_area]],
+        nombre_columna: areas[con_area],
+    })
+
+    return resultado.groupby(campo)[nombre_columna].sum().reset_index()
+
+
+def _geometrias_validas(geometrias):
+    """
+    Corrige las geometrías inválidas (como hace gpd.overlay) y reinicia el índice.
+    """
+    geometrias = geometrias.reset_index(drop=True)
+    invalidas = ~geometrias.is_valid
+    if invalidas.any():
+        geometrias = geometrias.copy()
+        geometrias[invalidas] = geometrias[invalidas].make_valid()
+    return geometrias
+
+
 #Seleccionar departamento
 def dep_con_menor_area_protegida(dept_9377, resg_9377, runap_9377):
     """
@@ -85,16 +269,36 @@ def dep_con_menor_area_protegida(dept_9377, resg_9377, runap_9377):
     resg_9377: GeoDataFrame de resguardos indígenas en EPSG:9377
     runap_9377: GeoDataFrame de áreas protegidas (RUNAP) en EPSG:9377
     """
+    resumen, dptos_area, resguardos_area, parques_area, dptos_amazonicos = resumen_area_libre_departamentos(
+        dept_9377, resg_9377, runap_9377)
+
+    # Mostrar resultado
+    dpto_objetivo = resumen.iloc[0]
+    print("\n✅ Departamento con mayor área libre dentro de la región (sin parques ni resguardos):")
+    print(f"- Nombre: {dpto_objetivo['DeNombre']}")
+    print(f"- Área total en región (m²): {dpto_objetivo['area_total']:.2f}")
+    print(f"- Área protegida (m²): {(dpto_objetivo['area_total'] - dpto_objetivo['area_libre']):.2f}")
+    print(f"- Área libre (m²): {dpto_objetivo['area_libre']:.2f}")
+    print(f"- Proporción libre: {dpto_objetivo['proporcion_libre']:.2%}")
+
+    return dptos_area, resguardos_area, parques_area, dptos_amazonicos
+
+
+@instrumentacion.instrumentar
+def resumen_area_libre_departamentos(dept_9377, resg_9377, runap_9377):
+    """
+    Calcula, para los departamentos de la región amazónica, el área libre de parques y resguardos.
+
+    Retorna:
+    - resumen: DataFrame ordenado de mayor a menor área libre (la primera fila es el departamento objetivo).
+    - dptos_area, resguardos_area, parques_area, dptos_amazonicos: igual que `dep_con_menor_area_protegida`.
+    """
 
     # Cálculo de área total de cada departamento
     dept_9377['area_total'] = dept_9377.geometry.area
     
-    # Intersecar departamentos con la región (resguardo aquí es la región amazónica)
-    interseccion = gpd.overlay(dept_9377, resg_9377, how='intersection')
-    interseccion['area_intersectada'] = interseccion.geometry.area
-    
-    # Sumar áreas intersectadas por departamento
-    interseccion_grouped = interseccion.groupby('DeNombre')['area_intersectada'].sum().reset_index()
+    # Sumar áreas intersectadas por departamento (resguardo aquí es la región amazónica)
+    interseccion_grouped = area_interseccion_por_departamento(resg_9377, dept_9377, 'area_intersectada')
     
     # Unir con área total original
     dptos_area = dept_9377[['DeNombre', 'area_total']].merge(interseccion_grouped, on='DeNombre')
@@ -104,17 +308,9 @@ def dep_con_menor_area_protegida(dept_9377, resg_9377, runap_9377):
     dptos_amazonicos = dept_9377[dept_9377['DeNombre'].isin(
         dptos_area[dptos_area['proporcion'] >= 0.3]['DeNombre']
     )]    
-    # Intersecar parques y resguardos con esos departamentos
-    parques_inter = gpd.overlay(runap_9377, dptos_amazonicos, how='intersection')
-    resguardos_inter = gpd.overlay(resg_9377, dptos_amazonicos, how='intersection')
-    
-    # Calcular áreas protegidas por departamento
-    parques_inter['area'] = parques_inter.geometry.area
-    resguardos_inter['area'] = resguardos_inter.geometry.area
-    
-    # Sumar área de parques y resguardos por departamento
-    parques_area = parques_inter.groupby('DeNombre')['area'].sum().reset_index(name='area_parques')
-    resguardos_area = resguardos_inter.groupby('DeNombre')['area'].sum().reset_index(name='area_resguardos')
+    # Sumar área de parques y resguardos por departamento (índice espacial, sin overlay)
+    parques_area = area_interseccion_por_departamento(runap_9377, dptos_amazonicos, 'area_parques')
+    resguardos_area = area_interseccion_por_departamento(resg_9377, dptos_amazonicos, 'area_resguardos')
     
     # Unir con los departamentos recortados
     resumen = dptos_area[['DeNombre', 'area_total']].drop_duplicates().copy()
@@ -130,17 +326,8 @@ def dep_con_menor_area_protegida(dept_9377, resg_9377, runap_9377):
     
     # Ordenar por mayor área libre
     resumen = resumen.sort_values(by='area_libre', ascending=False)
-   
-    # Mostrar resultado
-    dpto_objetivo = resumen.iloc[0]
-    print("\n✅ Departamento con mayor área libre dentro de la región (sin parques ni resguardos):")
-    print(f"- Nombre: {dpto_objetivo['DeNombre']}")
-    print(f"- Área total en región (m²): {dpto_objetivo['area_total']:.2f}")
-    print(f"- Área protegida (m²): {(dpto_objetivo['area_total'] - dpto_objetivo['area_libre']):.2f}")
-    print(f"- Área libre (m²): {dpto_objetivo['area_libre']:.2f}")
-    print(f"- Proporción libre: {dpto_objetivo['proporcion_libre']:.2%}")
 
-    return dptos_area, resguardos_area, parques_area, dptos_amazonicos
+    return resumen, dptos_area, resguardos_area, parques_area, dptos_amazonicos
 
 
 # Recortar las capas a la región amazónica
@@ -185,6 +372,139 @@ def recortar_capas_por_departamento(dept_9377, resg_9377, runap_9377, depto):
 
 
 
+# Recortar las capas para varios departamentos en una sola pasada
+@instrumentacion.instrumentar
+def recortar_capas_por_departamentos(dept_9377, resg_9377, runap_9377, deptos=None, carpeta=None, workers=1):
+    """
+    Recorta las capas de resguardos y parques naturales a varios departamentos en una sola pasada indexada.
+
+    Los pares (polígono, departamento) candidatos se obtienen una sola vez con el índice espacial
+    de los departamentos; luego se calculan únicamente las intersecciones de esos pares. El resultado
+    de cada departamento equivale al de `recortar_capas_por_departamento`.
+
+    Parámetros:
+    - dept_9377: GeoDataFrame de departamentos (con campo 'DeNombre').
+    - resg_9377: GeoDataFrame de resguardos indígenas.
+    - runap_9377: GeoDataFrame de áreas protegidas (RUNAP).
+    - deptos: lista de nombres de departamento; si no se indica, se usan todos los de la capa.
+    - carpeta: si se indica, reproyecta a EPSG:4326 y guarda las capas de cada departamento
+      con `save_layers` en una subcarpeta con su nombre.
+    - workers: número de procesos para calcular las intersecciones de varios departamentos a la vez.
+
+    Retorna:
+    - Diccionario {departamento: (Departamento, resguardos_dpto, parques_dpto)}.
+    """
+    if deptos is None:
+        deptos = list(dict.fromkeys(dept_9377['DeNombre']))
+
+    faltantes = [depto for depto in deptos if depto not in dept_9377['DeNombre'].values]
+    if faltantes:
+        raise ValueError(f"Los departamentos {faltantes} no se encuentran en la capa de entrada.")
+
+    departamentos = {depto: dept_9377[dept_9377['DeNombre'] == depto].copy() for depto in deptos}
+    seleccion = dept_9377[dept_9377['DeNombre'].isin(deptos)]
+
+    # Pares candidatos de cada capa con los departamentos seleccionados (una sola consulta por capa)
+    candidatos = {}
+    for nombre_capa, capa in [("parques", runap_9377), ("resguardos", resg_9377)]:
+        idx_capa, idx_dept = seleccion.sindex.query(capa.geometry, predicate='intersects')
+        nombres_dept = seleccion['DeNombre'].to_numpy()[idx_dept]
+        candidatos[nombre_capa] = (capa, idx_capa, nombres_dept)
+
+    # Subconjuntos por departamento: solo los polígonos candidatos viajan a cada tarea
+    tareas = {}
+    for depto in deptos:
+        subconjuntos = []
+        for nombre_capa in ("parques", "resguardos"):
+            capa, idx_capa, nombres_dept = candidatos[nombre_capa]
+            subconjuntos.append(capa.iloc[np.sort(idx_capa[nombres_dept == depto])])
+        tareas[depto] = (subconjuntos[0], subconjuntos[1], departamentos[depto])
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ejecutor:
+            futuros = {depto: ejecutor.submit(_recortar_departamento, *args) for depto, args in tareas.items()}
+            resultados = {depto: futuro.result() for depto, futuro in futuros.items()}
+    else:
+        resultados = {depto: _recortar_departamento(*args) for depto, args in tareas.items()}
+
+    for depto, (Departamento, resguardos_dpto, parques_dpto) in resultados.items():
+        print(f"Departamento: {depto} - parques: {len(parques_dpto)} - resguardos: {len(resguardos_dpto)}")
+
+        if carpeta is not None:
+            dpto_4326, resguardos_dpto_4326, parques_dpto_4326 = reproject_layers(Departamento, resguardos_dpto, parques_dpto)
+            save_layers(dpto_4326, resguardos_dpto_4326, parques_dpto_4326, os.path.join(carpeta, depto))
+
+    return resultados
+
+
+def _recortar_departamento(parques_candidatos, resguardos_candidatos, Departamento):
+    """
+    Recorta los polígonos candidatos de parques y resguardos a un departamento
+    (mismo resultado que `gpd.overlay(..., how='intersection')`).
+    """
+    parques_dpto = _interseccion_con_atributos(parques_candidatos, Departamento)
+    resguardos_dpto = _interseccion_con_atributos(resguardos_candidatos, Departamento)
+
+    # Eliminar columnas duplicadas (por nombre insensible a mayúsculas)
+    Departamento = Departamento.loc[:, ~Departamento.columns.str.lower().duplicated()]
+    resguardos_dpto = resguardos_dpto.loc[:, ~resguardos_dpto.columns.str.lower().duplicated()]
+    parques_dpto = parques_dpto.loc[:, ~parques_dpto.columns.str.lower().duplicated()]
+
+    return Departamento, resguardos_dpto, parques_dpto
+
+
+def _interseccion_con_atributos(capa, Departamento):
+    """
+    Intersección de cada polígono de la capa con el departamento, conservando los atributos de ambos
+    con la misma convención de columnas que gpd.overlay (sufijos _1 y _2 en nombres repetidos).
+    """
+    capa = capa.reset_index(drop=True)
+    departamento = Departamento.reset_index(drop=True)
+    geom_capa = _geometrias_validas(capa.geometry)
+    geom_dept = _geometrias_validas(departamento.geometry)
+
+    idx_capa, idx_dept = geom_dept.sindex.query(geom_capa, predicate='intersects')
+    orden = np.lexsort((idx_dept, idx_capa))
+    idx_capa, idx_dept = idx_capa[orden], idx_dept[orden]
+
+    geometrias = geom_capa.iloc[idx_capa].reset_index(drop=True).intersection(
+        geom_dept.iloc[idx_dept].reset_index(drop=True), align=False)
+    geometrias = geometrias.apply(_solo_poligonos)
+    validos = ~(geometrias.isna() | geometrias.is_empty).to_numpy()
+
+    # Atributos de ambas capas con sufijos para los nombres repetidos
+    atributos_capa = capa.drop(columns=capa.geometry.name)
+    atributos_dept = departamento.drop(columns=departamento.geometry.name)
+    repetidas = set(atributos_capa.columns) & set(atributos_dept.columns)
+    atributos_capa = atributos_capa.rename(columns={c: f"{c}_1" for c in repetidas})
+    atributos_dept = atributos_dept.rename(columns={c: f"{c}_2" for c in repetidas})
+
+    atributos = pd.concat([
+        atributos_capa.iloc[idx_capa[validos]].reset_index(drop=True),
+        atributos_dept.iloc[idx_dept[validos]].reset_index(drop=True),
+    ], axis=1)
+
+    return gpd.GeoDataFrame(atributos, geometry=geometrias[validos].reset_index(drop=True).values, crs=capa.crs)
+
+
+def _solo_poligonos(geom):
+    """
+    Conserva solo la parte poligonal de una intersección (como keep_geom_type=True en gpd.overlay).
+    """
+    if geom is None or geom.geom_type in ("Polygon", "MultiPolygon"):
+        return geom
+    if geom.geom_type == "GeometryCollection":
+        poligonos = []
+        for parte in geom.geoms:
+            if parte.geom_type == "Polygon":
+                poligonos.append(parte)
+            elif parte.geom_type == "MultiPolygon":
+                poligonos.extend(parte.geoms)
+        if poligonos:
+            return MultiPolygon(poligonos) if len(poligonos) > 1 else poligonos[0]
+    return None
+
+
 # Reproyectar las capas a EPSG:4326
 def reproject_layers(Departamento, resguardos_dpto, parques_dpto):
     """
@@ -205,6 +525,7 @@ def reproject_layers(Departamento, resguardos_dpto, parques_dpto):
 
 
 # Guardar las capas recortadas y reproyectadas como archivos GPKG
+@instrumentacion.instrumentar
 def save_layers(dpto_4326, resguardos_dpto_4326, parques_dpto_4326, carpeta):
     """
     Guarda las capas recortadas y reproyectadas en formato .gpkg.
@@ -251,8 +572,28 @@ def clip_raster_to_region(dpto_4326):
 
 
 
+def region_nacional(dept_9377, tolerancia_m=100, margen_m=1000):
+    """
+    Región de exportación nacional: unión de todos los departamentos, simplificada y con un margen,
+    como GeoDataFrame de una fila en EPSG:4326.
+
+    Sirve en lugar de `dpto_4326` en `clip_raster_to_region` y `exportar_bandas_mapbiomas_por_teselas`
+    para exportar una sola vez la imagen nacional; las estadísticas por departamento se obtienen
+    luego con `analysis_functions.procesar_mapbiomas_por_departamentos`. El margen evita perder los
+    píxeles del borde al simplificar la geometría (más liviana para Earth Engine).
+
+    Parámetros:
+    - dept_9377: GeoDataFrame de departamentos en EPSG:9377
+    - tolerancia_m: tolerancia de simplificación en metros (por defecto 100 m)
+    - margen_m: margen alrededor del país en metros (por defecto 1 km)
+    """
+    nacional = _geometrias_validas(dept_9377.geometry).union_all()
+    nacional = nacional.buffer(margen_m).simplify(tolerancia_m)
+    return gpd.GeoDataFrame({"nombre": ["Colombia"]}, geometry=[nacional], crs=dept_9377.crs).to_crs(epsg=4326)
+
+
 # Exportar capas recortadas al Google Drive
-def exportar_bandas_mapbiomas(cober_clipped, dpto_4326):
+def exportar_bandas_mapbiomas(cober_clipped, dpto_4326, anio_inicio=None, anio_final=None):
     """
     Solicita al usuario un año inicial y final, selecciona las bandas correspondientes
     desde una imagen MapBiomas recortada, y exporta el resultado a Google Drive.
@@ -260,24 +601,20 @@ def exportar_bandas_mapbiomas(cober_clipped, dpto_4326):
     Parámetros:
     - cober_clipped: ee.Image ya recortada al área de Caquetá
     - cober_4326: GeoDataFrame que contiene la geometría de Caquetá en EPSG:4326
+    - anio_inicio, anio_final: rango de años; si no se indican se solicitan al usuario
+      (indicarlos permite ejecutar la exportación sin interacción, p. ej. desde pipeline.py).
+      Con anio_inicio == anio_final se exporta una sola banda, p. ej. el año nuevo de una
+      colección para `actualizacion_anual.actualizar_anio_nuevo`.
     """
 
     # --- Paso 1: Entrada del usuario (rango de años) ---
-    anio_inicio = int(input("📅 Ingrese el año inicial (ej: 2019): "))
-    anio_final = int(input("📅 Ingrese el año final (ej: 2023): "))
+    if anio_inicio is None:
+        anio_inicio = int(input("📅 Ingrese el año inicial (ej: 2019): "))
+    if anio_final is None:
+        anio_final = int(input("📅 Ingrese el año final (ej: 2023): "))
 
-    if anio_inicio >= anio_final:
-        raise ValueError("⚠️ El año final debe ser mayor que el año inicial.")
-
-    # --- Paso 2: Crear lista de años y bandas ---
-    anios_usuario = [str(anio) for anio in range(anio_inicio, anio_final + 1)]
-    bandas_deseadas = [f'classification_{anio}' for anio in anios_usuario]
-
-    print(f"✅ Años seleccionados: {anios_usuario}")
-    print(f"✅ Bandas seleccionadas: {bandas_deseadas}")
-
-    # --- Paso 3: Seleccionar las bandas de interés ---
-    imagen_filtrada = cober_clipped.select(bandas_deseadas)
+    # --- Paso 2 y 3: Crear lista de años y seleccionar las bandas de interés ---
+    imagen_filtrada = _seleccionar_bandas_mapbiomas(cober_clipped, anio_inicio, anio_final)
 
     # --- Paso 4: Preparar geometría para exportación ---
     dpto_geom = dpto_4326.geometry.iloc[0]
@@ -300,3 +637,60 @@ def exportar_bandas_mapbiomas(cober_clipped, dpto_4326):
     )
     task.start()
     print(f"🚀 Exportación iniciada: {nombre_salida}. Revisa la pestaña 'Tasks' en Earth Engine.")
+
+    return task
+
+
+def _seleccionar_bandas_mapbiomas(cober_clipped, anio_inicio, anio_final):
+    """
+    Selecciona las bandas `classification_<año>` del rango de años indicado.
+    """
+    if anio_inicio > anio_final:
+        raise ValueError("⚠️ El año final debe ser mayor o igual que el año inicial.")
+
+    anios_usuario = [str(anio) for anio in range(anio_inicio, anio_final + 1)]
+    bandas_deseadas = [f'classification_{anio}' for anio in anios_usuario]
+
+    print(f"✅ Años seleccionados: {anios_usuario}")
+    print(f"✅ Bandas seleccionadas: {bandas_deseadas}")
+
+    return cober_clipped.select(bandas_deseadas)
+
+
+# Exportar capas recortadas por teselas y unirlas localmente
+@instrumentacion.instrumentar
+def exportar_bandas_mapbiomas_por_teselas(cober_clipped, dpto_4326, anio_inicio, anio_final, carpeta_descargas,
+                                          carpeta_salida, tamano_tesela=4096, max_concurrentes=4,
+                                          max_reintentos=2, intervalo_sondeo=30, tiempo_max=None,
+                                          max_descargas=20):
+    """
+    Exporta las bandas MapBiomas del departamento dividiendo la región en teselas, con varias
+    tareas simultáneas, reintentos de las teselas fallidas y mosaico local de las descargas.
+
+    Parámetros:
+    - cober_clipped: ee.Image ya recortada al departamento
+    - dpto_4326: GeoDataFrame con la geometría del departamento en EPSG:4326
+    - anio_inicio, anio_final: rango de años a exportar
+    - carpeta_descargas: carpeta local sincronizada con la carpeta 'earthengine' de Google Drive
+    - carpeta_salida: carpeta donde se guarda el GeoTIFF unido (p. ej. results/COBER_DPTO)
+    - tamano_tesela, max_concurrentes, max_reintentos, intervalo_sondeo, tiempo_max, max_descargas:
+      ver `exportacion_teselas.exportar_por_teselas`
+
+    Retorna la ruta del GeoTIFF multibanda `Mapbiomas_from_<inicio>_to_<fin>.tif`.
+    """
+    imagen_filtrada = _seleccionar_bandas_mapbiomas(cober_clipped, anio_inicio, anio_final)
+    nombre_salida = f"Mapbiomas_from_{anio_inicio}_to_{anio_final}"
+
+    dpto_geom = dpto_4326.geometry.iloc[0]
+    grilla = exportacion_teselas.definir_grilla(dpto_geom.bounds)
+    teselas = exportacion_teselas.dividir_en_teselas(grilla, tamano_tesela, geometria=dpto_geom)
+    print(f"✅ Región dividida en {len(teselas)} teselas de {tamano_tesela} píxeles")
+
+    carpeta_teselas = os.path.join(carpeta_salida, f"{nombre_salida}_teselas")
+    # Al salir del bloque (también por error o interrupción) se cancelan las tareas aún activas
+    with exportacion_teselas.BackendEarthEngine(imagen_filtrada, carpeta_descargas, prefijo=nombre_salida) as backend:
+        rutas = exportacion_teselas.exportar_por_teselas(backend, teselas, carpeta_teselas, max_concurrentes,
+                                                         max_reintentos, intervalo_sondeo, tiempo_max,
+                                                         max_descargas)
+
+    return exportacion_teselas.mosaico_teselas(rutas, grilla, os.path.join(carpeta_salida, f"{nombre_salida}.tif"))
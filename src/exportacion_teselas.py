@@ -0,0 +1,408 @@
+"""
+Exportación por teselas de imágenes de Earth Engine.
+
+La región se divide en teselas alineadas a una misma grilla de píxeles; las teselas se envían
+como tareas independientes con un número máximo de tareas simultáneas, su estado se sondea
+periódicamente, las que fallan se reintentan y, al final, las teselas descargadas se unen en un
+único GeoTIFF multibanda.
+
+El envío y la descarga dependen de un "backend" con tres métodos:
+
+- enviar(tesela) → tarea
+- estado(tarea) → "EN_CURSO", "COMPLETADA" o "FALLIDA"
+- descargar(tarea, tesela, ruta) → True si la tesela quedó en `ruta`, False si aún no está disponible
+
+y, opcionalmente, `cancelar(tarea)` para las tareas abandonadas y `cerrar()` (o uso con `with`) para
+liberar sus recursos al terminar.
+
+`BackendEarthEngine` exporta a Google Drive y recoge los archivos desde la carpeta sincronizada de
+Drive; `BackendGeoTIFFLocal` sirve las teselas desde un GeoTIFF en disco, lo que permite probar la
+planificación y el mosaico sin conexión.
+"""
+# Librerías para manejo de datos raster
+import rasterio  #Leer y escribir archivos raster (GeoTIFF)
+from rasterio.windows import Window, from_bounds  #Ubicar cada tesela dentro del mosaico
+from rasterio.transform import from_origin  #Definir la grilla de píxeles de la exportación
+import numpy as np  #Operaciones con matrices y arrays numéricos
+
+# Librerías para manejo de archivos, tiempos y concurrencia
+import os  #Interactuar con el sistema de archivos (rutas)
+import time  #Esperar entre sondeos del estado de las tareas
+import tempfile  #Carpeta temporal de las teselas del backend local
+import shutil  #Eliminar la carpeta temporal al cerrar el backend local
+from concurrent.futures import ThreadPoolExecutor  #Atender teselas en paralelo en el backend local
+
+# Librería para manejo de datos geoespaciales (importación diferida)
+from lazy_imports import importar_perezoso
+ee = importar_perezoso("ee")  #Usar Google Earth Engine
+
+
+# Resolución nativa de MapBiomas Colombia (1 segundo de arco ≈ 30 m)
+RESOLUCION_MAPBIOMAS_GRADOS = 0.00026949458523585647
+
+EN_CURSO = "EN_CURSO"
+COMPLETADA = "COMPLETADA"
+FALLIDA = "FALLIDA"
+
+
+def definir_grilla(limites, resolucion=RESOLUCION_MAPBIOMAS_GRADOS):
+    """
+    Grilla de píxeles que cubre los límites (minx, miny, maxx, maxy), con origen alineado a la resolución.
+
+    Retorna un diccionario con `transform`, `ancho` y `alto`.
+    """
+    minx, miny, maxx, maxy = limites
+    tolerancia = 1e-6  # fracción de píxel; evita sumar un píxel por errores de redondeo
+    x0 = np.floor(minx / resolucion + tolerancia) * resolucion
+    y0 = np.ceil(maxy / resolucion - tolerancia) * resolucion
+    ancho = int(np.ceil((maxx - x0) / resolucion - tolerancia))
+    alto = int(np.ceil((y0 - miny) / resolucion - tolerancia))
+    return {"transform": from_origin(x0, y0, resolucion, resolucion), "ancho": ancho, "alto": alto}
+
+
+def dividir_en_teselas(grilla, tamano_tesela=4096, geometria=None):
+    """
+    Divide la grilla en teselas de `tamano_tesela` × `tamano_tesela` píxeles.
+
+    Parámetros:
+    -----------
+    grilla : dict
+        Resultado de `definir_grilla` (o un diccionario equivalente con transform, ancho y alto).
+
+    tamano_tesela : int, opcional
+        Lado de cada tesela en píxeles.
+
+    geometria : shapely.geometry, opcional
+        Si se indica, se descartan las teselas que no la intersectan (p. ej. esquinas fuera del departamento).
+
+    Retorna:
+    --------
+    teselas : list of dict
+        Cada tesela tiene `indice`, `ventana` (Window dentro de la grilla), `transform` y `limites`.
+    """
+    if geometria is not None:
+        from shapely.geometry import box  #Solo se necesita al filtrar por geometría
+
+    transform = grilla["transform"]
+    teselas = []
+    for fila in range(0, grilla["alto"], tamano_tesela):
+        for col in range(0, grilla["ancho"], tamano_tesela):
+            ventana = Window(col, fila,
+                             min(tamano_tesela, grilla["ancho"] - col),
+                             min(tamano_tesela, grilla["alto"] - fila))
+            limites = rasterio.windows.bounds(ventana, transform)
+            if geometria is not None and not geometria.intersects(box(*limites)):
+                continue
+            teselas.append({
+                "indice": len(teselas),
+                "ventana": ventana,
+                "transform": rasterio.windows.transform(ventana, transform),
+                "limites": limites,
+            })
+    return teselas
+
+
+def _cancelar(backend, tarea):
+    """
+    Cancela una tarea abandonada si el backend lo permite (método opcional `cancelar`).
+    """
+    cancelar = getattr(backend, "cancelar", None)
+    if cancelar is None:
+        return
+    try:
+        cancelar(tarea)
+    except Exception as ex:
+        print(f"⚠️ No se pudo cancelar una tarea abandonada: {ex}")
+
+
+def exportar_por_teselas(backend, teselas, carpeta_teselas, max_concurrentes=4, max_reintentos=2,
+                         intervalo_sondeo=30, tiempo_max=None, max_descargas=20):
+    """
+    Envía las teselas al backend con un máximo de tareas simultáneas, sondea su estado,
+    reintenta las fallidas y descarga las completadas.
+
+    Un intento de tesela falla (y pasa a los reintentos) si el backend lo informa como fallido,
+    si `enviar`, `estado` o `descargar` lanzan una excepción (cuota de Earth Engine, errores de red),
+    si supera `tiempo_max` o si la descarga no está disponible tras `max_descargas` consultas.
+    Las tareas abandonadas se cancelan cuando el backend tiene un método `cancelar`.
+
+    Parámetros:
+    -----------
+    backend : objeto con métodos enviar, estado y descargar (ver docstring del módulo).
+
+    teselas : list of dict
+        Teselas generadas con `dividir_en_teselas`.
+
+    carpeta_teselas : str
+        Carpeta donde se guardan las teselas descargadas (`tesela_<indice>.tif`).
+
+    max_concurrentes : int, opcional
+        Número máximo de tareas en curso al mismo tiempo.
+
+    max_reintentos : int, opcional
+        Veces que se reenvía una tesela fallida antes de darla por perdida.
+
+    intervalo_sondeo : float, opcional
+        Segundos de espera entre rondas de consulta de estado.
+
+    tiempo_max : float, opcional
+        Segundos máximos de cada intento de tesela, desde el envío hasta la descarga
+        (por defecto sin límite).
+
+    max_descargas : int, opcional
+        Consultas de una tarea completada cuyo archivo aún no está disponible (p. ej. Drive
+        todavía no lo sincronizó) antes de dar el intento por fallido.
+
+    Retorna:
+    --------
+    rutas : dict
+        Ruta del GeoTIFF descargado por índice de tesela.
+    """
+    os.makedirs(carpeta_teselas, exist_ok=True)
+
+    pendientes = list(teselas)
+    en_curso = {}        # indice → (tesela, tarea, inicio del intento, descargas intentadas)
+    intentos = {tesela["indice"]: 0 for tesela in teselas}
+    rutas = {}
+    perdidas = []
+
+    def fallar(tesela, motivo):
+        indice = tesela["indice"]
+        if intentos[indice] <= max_reintentos:
+            print(f"⚠️ Tesela {indice} fallida ({motivo}), reintento {intentos[indice]}/{max_reintentos}")
+            pendientes.append(tesela)
+        else:
+            print(f"❌ Tesela {indice} fallida tras {intentos[indice]} intentos ({motivo})")
+            perdidas.append(indice)
+
+    while pendientes or en_curso:
+        # Completar los cupos libres con teselas pendientes
+        while pendientes and len(en_curso) < max_concurrentes:
+            tesela = pendientes.pop(0)
+            intentos[tesela["indice"]] += 1
+            try:
+                en_curso[tesela["indice"]] = (tesela, backend.enviar(tesela), time.monotonic(), 0)
+            except Exception as ex:
+                fallar(tesela, f"error al enviar: {ex}")
+
+        # Consultar el estado de las tareas en curso
+        for indice, (tesela, tarea, inicio, descargas) in list(en_curso.items()):
+            try:
+                estado = backend.estado(tarea)
+                if estado == COMPLETADA:
+                    ruta = os.path.join(carpeta_teselas, f"tesela_{indice}.tif")
+                    if backend.descargar(tarea, tesela, ruta):
+                        rutas[indice] = ruta
+                        del en_curso[indice]
+                        print(f"✅ Tesela {indice} descargada ({len(rutas)}/{len(teselas)})")
+                        continue
+                    descargas += 1
+                    en_curso[indice] = (tesela, tarea, inicio, descargas)
+            except Exception as ex:
+                estado, motivo = FALLIDA, f"error del backend: {ex}"
+            else:
+                motivo = "informada por el backend"
+
+            if estado != FALLIDA:
+                if descargas >= max_descargas:
+                    estado, motivo = FALLIDA, f"descarga no disponible tras {descargas} consultas"
+                elif tiempo_max is not None and time.monotonic() - inicio > tiempo_max:
+                    estado, motivo = FALLIDA, f"más de {tiempo_max} s"
+
+            if estado == FALLIDA:
+                del en_curso[indice]
+                _cancelar(backend, tarea)
+                fallar(tesela, motivo)
+
+        if en_curso and intervalo_sondeo:
+            time.sleep(intervalo_sondeo)
+
+    if perdidas:
+        raise RuntimeError(f"❌ No se pudieron exportar las teselas {sorted(perdidas)}.")
+
+    return rutas
+
+
+def mosaico_teselas(rutas_teselas, grilla, ruta_salida, nodata=None):
+    """
+    Une las teselas descargadas en un único GeoTIFF multibanda con la grilla completa.
+
+    Cada tesela se ubica según su propia georreferencia, por lo que se admiten teselas con
+    uno o dos píxeles de más o de menos en los bordes. Los píxeles sin tesela quedan en 0.
+
+    Retorna la ruta del mosaico.
+    """
+    rutas = list(rutas_teselas.values()) if isinstance(rutas_teselas, dict) else list(rutas_teselas)
+    if not rutas:
+        raise ValueError("⚠️ No hay teselas para unir.")
+
+    with rasterio.open(rutas[0]) as primera:
+        perfil = {
+            "driver": "GTiff",
+            "count": primera.count,
+            "dtype": primera.dtypes[0],
+            "crs": primera.crs,
+            "transform": grilla["transform"],
+            "width": grilla["ancho"],
+            "height": grilla["alto"],
+            "tiled": True,
+            "blockxsize": 256,
+            "blockysize": 256,
+            "nodata": nodata if nodata is not None else primera.nodata,
+        }
+
+    os.makedirs(os.path.dirname(ruta_salida) or ".", exist_ok=True)
+    with rasterio.open(ruta_salida, "w", **perfil) as dst:
+        for ruta in rutas:
+            with rasterio.open(ruta) as tesela:
+                ventana = from_bounds(*tesela.bounds, transform=dst.transform).round_offsets().round_lengths()
+                # Recortar la parte de la tesela que cae fuera del mosaico
+                destino = ventana.intersection(Window(0, 0, dst.width, dst.height))
+                origen = Window(destino.col_off - ventana.col_off, destino.row_off - ventana.row_off,
+                                destino.width, destino.height)
+                dst.write(tesela.read(window=origen), window=destino)
+
+    print(f"✅ Mosaico guardado en: {ruta_salida}")
+    return ruta_salida
+
+
+class BackendEarthEngine:
+    """
+    Exporta cada tesela de una ee.Image a Google Drive (`Export.image.toDrive`) con la grilla común
+    y recoge el GeoTIFF desde una carpeta local sincronizada con Drive (p. ej. Drive montado en Colab).
+    """
+
+    def __init__(self, imagen, carpeta_descargas, carpeta_drive="earthengine", prefijo="Mapbiomas",
+                 crs="EPSG:4326"):
+        self.imagen = imagen
+        self.carpeta_descargas = carpeta_descargas
+        self.carpeta_drive = carpeta_drive
+        self.prefijo = prefijo
+        self.crs = crs
+        self.tareas = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+    def cerrar(self):
+        """
+        Cancela las tareas enviadas que siguen activas (p. ej. si la exportación se interrumpió).
+        """
+        for tarea in self.tareas:
+            try:
+                if tarea.active():
+                    tarea.cancel()
+            except Exception as ex:
+                print(f"⚠️ No se pudo cancelar la tarea {tarea}: {ex}")
+        self.tareas = []
+
+    def _nombre(self, tesela):
+        return f"{self.prefijo}_tesela_{tesela['indice']}"
+
+    def enviar(self, tesela):
+        transform = tesela["transform"]
+        task = ee.batch.Export.image.toDrive(
+            image=self.imagen,
+            description=self._nombre(tesela),
+            folder=self.carpeta_drive,
+            fileNamePrefix=self._nombre(tesela),
+            region=ee.Geometry.Rectangle(list(tesela["limites"]), self.crs, False),
+            crs=self.crs,
+            crsTransform=[transform.a, transform.b, transform.c, transform.d, transform.e, transform.f],
+            maxPixels=1e13,
+            fileFormat='GeoTIFF'
+        )
+        task.start()
+        self.tareas.append(task)
+        print(f"🚀 Exportación iniciada: {self._nombre(tesela)}")
+        return task
+
+    def cancelar(self, tarea):
+        tarea.cancel()
+
+    def estado(self, tarea):
+        estado = tarea.status()["state"]
+        if estado == "COMPLETED":
+            return COMPLETADA
+        if estado in ("FAILED", "CANCELLED", "CANCEL_REQUESTED"):
+            return FALLIDA
+        return EN_CURSO
+
+    def descargar(self, tarea, tesela, ruta):
+        # Drive puede tardar en sincronizar el archivo; mientras no aparezca la tesela sigue pendiente
+        origen = os.path.join(self.carpeta_descargas, self._nombre(tesela) + ".tif")
+        if not os.path.exists(origen):
+            return False
+        os.replace(origen, ruta)
+        return True
+
+
+class BackendGeoTIFFLocal:
+    """
+    Sirve las teselas desde un GeoTIFF en disco, en hilos de fondo, imitando tareas asíncronas.
+
+    `fallos` permite simular errores: {indice de tesela: número de intentos que fallarán}.
+    """
+
+    def __init__(self, ruta_tif, workers=4, fallos=None):
+        self.ruta_tif = ruta_tif
+        self.fallos = dict(fallos or {})
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.carpeta_temporal = tempfile.mkdtemp(prefix="teselas_")
+        self.envios = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+    def cerrar(self):
+        """
+        Detiene los hilos de fondo y elimina la carpeta temporal de las teselas no descargadas.
+        """
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(self.carpeta_temporal, ignore_errors=True)
+
+    def _extraer(self, tesela, ruta_temporal):
+        if self.fallos.get(tesela["indice"], 0) > 0:
+            self.fallos[tesela["indice"]] -= 1
+            raise RuntimeError(f"Fallo simulado en la tesela {tesela['indice']}")
+
+        with rasterio.open(self.ruta_tif) as src:
+            ventana = from_bounds(*tesela["limites"], transform=src.transform).round_offsets().round_lengths()
+            perfil = src.profile.copy()
+            perfil.update({
+                "driver": "GTiff",
+                "width": int(ventana.width),
+                "height": int(ventana.height),
+                "transform": src.window_transform(ventana),
+            })
+            perfil.pop("blockxsize", None)
+            perfil.pop("blockysize", None)
+            perfil["tiled"] = False
+            datos = src.read(window=ventana, boundless=True, fill_value=0)
+
+        with rasterio.open(ruta_temporal, "w", **perfil) as dst:
+            dst.write(datos)
+        return ruta_temporal
+
+    def enviar(self, tesela):
+        self.envios += 1
+        ruta_temporal = os.path.join(self.carpeta_temporal, f"tesela_{tesela['indice']}_{self.envios}.tif")
+        return self.executor.submit(self._extraer, tesela, ruta_temporal)
+
+    def estado(self, tarea):
+        if not tarea.done():
+            return EN_CURSO
+        return FALLIDA if tarea.exception() is not None else COMPLETADA
+
+    def cancelar(self, tarea):
+        tarea.cancel()
+
+    def descargar(self, tarea, tesela, ruta):
+        os.replace(tarea.result(), ruta)
+        return True
@@ -0,0 +1,370 @@
+"""
+Instrumentación de las etapas de procesamiento: tiempo, CPU, memoria, E/S y píxeles procesados.
+
+Las funciones del proyecto marcan sus etapas con el decorador `instrumentar` o con el gestor de
+contexto `etapa` (p. ej. una etapa por año o por par de años), y anotan los píxeles procesados con
+`registrar`. Mientras la instrumentación está desactivada (por defecto) cada marca solo consulta
+una variable global, por lo que puede dejarse en el código de producción.
+
+Al activarla, cada etapa terminada emite un evento JSON (diccionario) a los sumideros configurados:
+cualquier función que reciba el evento, como `SumideroJSONL` (un evento por línea en un archivo)
+o `SumideroMemoria`. Opcionalmente cada etapa se perfila con cProfile y se guarda su volcado .prof.
+
+Uso:
+    import instrumentacion
+    instrumentacion.activar(instrumentacion.SumideroJSONL("metricas.jsonl"), carpeta_perfiles="perfiles")
+    analysis_functions.calcular_transiciones(...)
+    instrumentacion.desactivar()
+
+Campos de cada evento: evento ("etapa"), nombre, id ("<pid>-<n>"), padre (id de la etapa que la
+contiene), pid, inicio (UTC), estado ("ok" o "error"), segundos, cpu_segundos (incluye los procesos
+hijos terminados), rss_mb, rss_max_mb, bytes_leidos, bytes_escritos, pixeles (incluye los de sus
+etapas internas), mpx_s, los atributos de la etapa y los contadores registrados.
+La memoria máxima es la de la etapa cuando el sistema permite reiniciar el máximo del proceso
+(/proc/self/clear_refs en Linux); si no, es el máximo del proceso desde su inicio. La E/S (Linux,
+/proc/self/io) es la del proceso, incluida la de otros hilos que trabajen a la vez.
+
+Los procesos trabajadores creados con fork (p. ej. `calcular_transiciones(..., workers=4)`) heredan
+la configuración y emiten sus propios eventos: `SumideroJSONL` los recibe todos, mientras que
+`SumideroMemoria` solo guarda los del proceso principal.
+"""
+# Librerías para medir tiempos y recursos
+import os  #Tiempos de CPU y archivos /proc del proceso
+import sys  #Plataforma (unidades de ru_maxrss)
+import time  #Tiempo de reloj
+import datetime  #Marca de inicio de cada etapa
+import functools  #Conservar nombre y docstring de las funciones decoradas
+import itertools  #Identificadores de etapa
+import threading  #Proteger el estado compartido entre hilos
+import contextvars  #Etapa en curso de cada hilo o tarea
+import json  #Serializar los eventos
+
+
+_ACTIVA = False
+_SUMIDEROS = []
+_PERFILES = {"carpeta": None, "nombres": None}
+
+_etapa_actual = contextvars.ContextVar("etapa_actual", default=None)
+_contador_ids = itertools.count(1)
+_candado = threading.Lock()
+_abiertas = set()  # Etapas en curso (todos los hilos), para repartir el máximo de memoria
+_perfil_en_uso = [False]  # cProfile admite un solo perfilador activo por proceso
+
+
+def activar(*sumideros, carpeta_perfiles=None, perfilar=None):
+    """
+    Activa la instrumentación.
+
+    Parámetros:
+    -----------
+    sumideros : callable
+        Funciones que reciben cada evento (dict), p. ej. `SumideroJSONL(ruta)`.
+    carpeta_perfiles : str, opcional
+        Si se indica, guarda allí un volcado cProfile (`<etapa>_<id>.prof`) de cada etapa perfilada.
+    perfilar : iterable de str, opcional
+        Nombres de las etapas a perfilar. Por defecto se perfila la primera etapa de cada anidamiento
+        (cProfile no admite perfiles simultáneos).
+    """
+    global _ACTIVA
+    if carpeta_perfiles is not None:
+        os.makedirs(carpeta_perfiles, exist_ok=True)
+    _SUMIDEROS[:] = sumideros
+    _PERFILES["carpeta"] = carpeta_perfiles
+    _PERFILES["nombres"] = set(perfilar) if perfilar is not None else None
+    _ACTIVA = True
+
+
+def desactivar():
+    """
+    Desactiva la instrumentación y quita los sumideros.
+    """
+    global _ACTIVA
+    _ACTIVA = False
+    _SUMIDEROS.clear()
+    _PERFILES["carpeta"] = _PERFILES["nombres"] = None
+
+
+def esta_activa():
+    return _ACTIVA
+
+
+def emitir(evento):
+    """
+    Envía un evento (dict) a todos los sumideros. Los errores de un sumidero no detienen el procesamiento.
+    """
+    for sumidero in list(_SUMIDEROS):
+        try:
+            sumidero(evento)
+        except Exception as ex:
+            print(f"⚠️ Error en el sumidero de métricas {sumidero!r}: {ex}")
+
+
+class SumideroJSONL:
+    """
+    Agrega cada evento como una línea JSON al final de un archivo.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._candado = threading.Lock()
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+
+    def __call__(self, evento):
+        linea = json.dumps(evento, ensure_ascii=False, default=str) + "\n"
+        with self._candado, open(self.ruta, "a", encoding="utf-8") as f:
+            f.write(linea)
+
+
+class SumideroMemoria:
+    """
+    Guarda los eventos en la lista `eventos` (útil en cuadernos y pruebas).
+    """
+
+    def __init__(self):
+        self.eventos = []
+
+    def __call__(self, evento):
+        self.eventos.append(evento)
+
+
+def _leer_io():
+    """
+    Bytes leídos y escritos por el proceso (rchar/wchar de /proc/self/io), o None si no está disponible.
+    """
+    try:
+        with open("/proc/self/io", encoding="ascii") as f:
+            campos = dict(linea.split(": ") for linea in f.read().splitlines())
+        return int(campos["rchar"]), int(campos["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _leer_memoria_mb():
+    """
+    Memoria residente actual y máxima (MB) del proceso.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            campos = dict(linea.split(":", 1) for linea in f if linea.startswith(("VmRSS", "VmHWM")))
+        return int(campos["VmRSS"].split()[0]) / 1024, int(campos["VmHWM"].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        import resource
+        # ru_maxrss está en KB en Linux y en bytes en macOS
+        maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+        return None, maximo
+
+
+def _reiniciar_maximo_memoria():
+    """
+    Reinicia el máximo de memoria residente del proceso (Linux). Retorna False si no es posible.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _tiempo_cpu():
+    tiempos = os.times()
+    return tiempos.user + tiempos.system + tiempos.children_user + tiempos.children_system
+
+
+class Medicion:
+    """
+    Etapa instrumentada en curso. Se obtiene con `etapa(...)` y se usa como gestor de contexto.
+    """
+
+    def __init__(self, nombre, atributos):
+        self.nombre = nombre
+        self.atributos = atributos
+        self.contadores = {}
+        self.pixeles = 0
+        self._padre = None
+
+    def registrar(self, pixeles=0, **contadores):
+        """
+        Suma píxeles procesados y otros contadores numéricos a la etapa y a las etapas que la contienen.
+        """
+        with _candado:  # Puede llamarse desde varios hilos de la misma etapa
+            medicion = self
+            while medicion is not None:
+                medicion.pixeles += pixeles
+                for clave, valor in contadores.items():
+                    medicion.contadores[clave] = medicion.contadores.get(clave, 0) + valor
+                medicion = medicion._padre
+
+    def anotar(self, **atributos):
+        """
+        Agrega atributos (p. ej. archivo o año) al evento de la etapa.
+        """
+        self.atributos.update(atributos)
+
+    def _actualizar_pico(self, pico):
+        self.rss_max = max(self.rss_max, pico)
+
+    def __enter__(self):
+        self.id = f"{os.getpid()}-{next(_contador_ids)}"  # Único también entre procesos trabajadores
+        self._padre = _etapa_actual.get()
+        self.padre = self._padre.id if self._padre is not None else None
+        self._token = _etapa_actual.set(self)
+
+        # El máximo de memoria acumulado hasta ahora pertenece a las etapas ya abiertas
+        _, pico = _leer_memoria_mb()
+        with _candado:
+            for abierta in _abiertas:
+                abierta._actualizar_pico(pico)
+            self._maximo_propio = _reiniciar_maximo_memoria()
+            # Tras reiniciar, el máximo de la etapa parte de la memoria actual
+            self.rss_max = (_leer_memoria_mb()[0] or pico) if self._maximo_propio else pico
+            _abiertas.add(self)
+
+        self._perfil = None
+        if _PERFILES["carpeta"] is not None and (_PERFILES["nombres"] is None or self.nombre in _PERFILES["nombres"]):
+            with _candado:
+                if not _perfil_en_uso[0]:
+                    import cProfile
+                    _perfil_en_uso[0] = True
+                    self._perfil = cProfile.Profile()
+            if self._perfil is not None:
+                self._perfil.enable()
+
+        self.inicio = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="milliseconds")
+        self._io = _leer_io()
+        self._cpu = _tiempo_cpu()
+        self._reloj = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo_error, error, traza):
+        segundos = time.perf_counter() - self._reloj
+        cpu = _tiempo_cpu() - self._cpu
+        io = _leer_io()
+
+        ruta_perfil = None
+        if self._perfil is not None:
+            self._perfil.disable()
+            ruta_perfil = os.path.join(_PERFILES["carpeta"] or ".", f"{self.nombre}_{self.id}.prof")
+            self._perfil.dump_stats(ruta_perfil)
+            with _candado:
+                _perfil_en_uso[0] = False
+
+        rss, pico = _leer_memoria_mb()
+        with _candado:
+            _abiertas.discard(self)
+            self._actualizar_pico(pico)
+            for abierta in _abiertas:
+                abierta._actualizar_pico(self.rss_max)
+        _etapa_actual.reset(self._token)
+
+        evento = {
+            "evento": "etapa",
+            "nombre": self.nombre,
+            "id": self.id,
+            "padre": self.padre,
+            "pid": os.getpid(),
+            "inicio": self.inicio,
+            "estado": "ok" if tipo_error is None else "error",
+            "segundos": round(segundos, 6),
+            "cpu_segundos": round(cpu, 6),
+            "rss_mb": round(rss, 1) if rss is not None else None,
+            "rss_max_mb": round(self.rss_max, 1),
+            "bytes_leidos": io[0] - self._io[0] if io and self._io else None,
+            "bytes_escritos": io[1] - self._io[1] if io and self._io else None,
+            "pixeles": self.pixeles,
+            "mpx_s": round(self.pixeles / 1e6 / segundos, 3) if self.pixeles and segundos > 0 else None,
+        }
+        if tipo_error is not None:
+            evento["error"] = f"{tipo_error.__name__}: {error}"
+        if ruta_perfil is not None:
+            evento["perfil"] = ruta_perfil
+        evento.update(self.atributos)
+        evento.update(self.contadores)
+        emitir(evento)
+        return False
+
+
+class _MedicionInactiva:
+    """
+    Etapa sin efecto que se usa mientras la instrumentación está desactivada.
+    """
+
+    def registrar(self, pixeles=0, **contadores):
+        pass
+
+    def anotar(self, **atributos):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_error, error, traza):
+        return False
+
+
+_MEDICION_INACTIVA = _MedicionInactiva()
+
+
+def etapa(nombre, **atributos):
+    """
+    Gestor de contexto que mide una etapa: `with instrumentacion.etapa("transicion", anio=2020) as m:`.
+
+    Los atributos (p. ej. año, ruta) se copian al evento. Las etapas pueden anidarse; cada evento
+    indica el `id` de la etapa que lo contiene (`padre`).
+    """
+    if not _ACTIVA:
+        return _MEDICION_INACTIVA
+    return Medicion(nombre, atributos)
+
+
+def registrar(pixeles=0, **contadores):
+    """
+    Suma píxeles procesados (y otros contadores) a la etapa en curso, si la hay, y a las que la contienen.
+    """
+    if _ACTIVA:
+        actual = _etapa_actual.get()
+        if actual is not None:
+            actual.registrar(pixeles, **contadores)
+
+
+def anotar(**atributos):
+    """
+    Agrega atributos al evento de la etapa en curso, si la hay.
+    """
+    if _ACTIVA:
+        actual = _etapa_actual.get()
+        if actual is not None:
+            actual.anotar(**atributos)
+
+
+def en_etapa_actual(funcion):
+    """
+    Envuelve `funcion` para que, al ejecutarse en otro hilo, sus etapas y registros cuelguen de la etapa en curso.
+    """
+    if not _ACTIVA:
+        return funcion
+    contexto = contextvars.copy_context()
+    return lambda *args, **kwargs: contexto.copy().run(funcion, *args, **kwargs)
+
+
+def instrumentar(funcion=None, nombre=None):
+    """
+    Decorador que mide cada llamada de la función como una etapa (por defecto con el nombre de la función).
+
+    Se usa como `@instrumentar` o `@instrumentar(nombre="...")`.
+    """
+    if funcion is None:
+        return functools.partial(instrumentar, nombre=nombre)
+
+    nombre_etapa = nombre or funcion.__name__
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        if not _ACTIVA:
+            return funcion(*args, **kwargs)
+        with Medicion(nombre_etapa, {}):
+            return funcion(*args, **kwargs)
+
+    return envoltura
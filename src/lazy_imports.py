@@ -0,0 +1,38 @@
+# Librerías para importar módulos de forma diferida
+import importlib  #Importar módulos a partir de su nombre
+
+
+class ModuloPerezoso:
+    """
+    Representa un módulo que solo se importa la primera vez que se usa uno de sus atributos.
+
+    Permite declarar dependencias pesadas u opcionales (Earth Engine, geemap, matplotlib,
+    contextily, ipywidgets...) al inicio de un módulo sin pagar su importación, ni fallar
+    cuando no están instaladas, hasta que una función realmente las necesita.
+    """
+
+    def __init__(self, nombre):
+        self._nombre = nombre
+        self._modulo = None
+
+    def _cargar(self):
+        if self._modulo is None:
+            try:
+                self._modulo = importlib.import_module(self._nombre)
+            except ImportError as ex:
+                raise ImportError(f"❌ Esta función requiere el paquete '{self._nombre}', que no está instalado.") from ex
+        return self._modulo
+
+    def __getattr__(self, atributo):
+        return getattr(self._cargar(), atributo)
+
+    def __repr__(self):
+        estado = "cargado" if self._modulo is not None else "sin cargar"
+        return f"<módulo perezoso '{self._nombre}' ({estado})>"
+
+
+def importar_perezoso(nombre):
+    """
+    Devuelve un ModuloPerezoso para `nombre` (ej. "matplotlib.pyplot").
+    """
+    return ModuloPerezoso(nombre)
@@ -0,0 +1,294 @@
+"""
+Estadísticas de parches (componentes conexos) de deforestación en los rásteres de transición.
+
+Cada ráster se recorre por franjas: en cada franja se etiquetan los píxeles de la clase de interés
+con `scipy.ndimage.label` y los parches que continúan de una franja a la siguiente se unen con una
+estructura union-find sobre las filas de borde. Así se obtienen el número de parches, su área y su
+extensión sin cargar nunca el ráster completo.
+"""
+# Librerías para manejo de datos raster
+import rasterio  #Leer y escribir archivos raster (GeoTIFF)
+import numpy as np  #Operaciones con matrices y arrays numéricos
+
+# Librerías para manejo de archivos y rutas
+import os  #Interactuar con el sistema de archivos (rutas)
+import csv  #Escribir las tablas de parches
+import glob  #Buscar los rásteres de transición
+
+# Funciones del proyecto
+import analysis_functions
+import instrumentacion
+
+# SciPy se importa en el primer uso (solo lo necesita el etiquetado de parches)
+from lazy_imports import importar_perezoso
+ndimage = importar_perezoso("scipy.ndimage")  #Etiquetar componentes conexos
+
+
+# Rangos de tamaño (ha) para la distribución de parches del resumen
+RANGOS_TAMANO_HA = [(0, 1), (1, 5), (5, 10), (10, 50), (50, 100), (100, float("inf"))]
+
+
+class _UnionFind:
+    """
+    Conjuntos disjuntos sobre etiquetas enteras 1..n.
+
+    El arreglo de padres duplica su capacidad cuando se queda corto, de modo que agregar las
+    etiquetas de muchas franjas copia el arreglo solo O(log n) veces; las posiciones sin usar ya
+    son su propio padre y `total` indica la última etiqueta agregada.
+    """
+
+    def __init__(self, capacidad=1024):
+        self.padre = np.arange(max(capacidad, 1), dtype=np.int64)  # La etiqueta 0 es el fondo
+        self.total = 0
+
+    def agregar(self, total):
+        if total >= len(self.padre):
+            padre = np.arange(max(total + 1, 2 * len(self.padre)), dtype=np.int64)
+            padre[:len(self.padre)] = self.padre
+            self.padre = padre
+        self.total = max(self.total, total)
+
+    def buscar(self, etiqueta):
+        padre = self.padre
+        while padre[etiqueta] != etiqueta:
+            padre[etiqueta] = padre[padre[etiqueta]]  # Compresión de caminos por mitades
+            etiqueta = padre[etiqueta]
+        return etiqueta
+
+    def unir(self, a, b):
+        raiz_a, raiz_b = self.buscar(a), self.buscar(b)
+        if raiz_a != raiz_b:
+            # La raíz es siempre la etiqueta menor: el parche conserva su primera aparición
+            self.padre[max(raiz_a, raiz_b)] = min(raiz_a, raiz_b)
+
+    def raices(self):
+        """
+        Raíz de las etiquetas 0..total, resuelta de forma vectorizada.
+        """
+        raiz = self.padre[:self.total + 1].copy()
+        while True:
+            siguiente = raiz[raiz]
+            if np.array_equal(siguiente, raiz):
+                return raiz
+            raiz = siguiente
+
+
+def _pares_en_borde(fila_anterior, fila_actual, conectividad):
+    """
+    Pares únicos (etiqueta de arriba, etiqueta de abajo) de píxeles conectados a través de un borde entre franjas.
+    """
+    desplazamientos = [0] if conectividad == 4 else [-1, 0, 1]
+    pares = []
+    for d in desplazamientos:
+        arriba = fila_anterior[max(0, -d):len(fila_anterior) - max(0, d)]
+        abajo = fila_actual[max(0, d):len(fila_actual) - max(0, -d)]
+        conectados = (arriba > 0) & (abajo > 0)
+        pares.append(np.stack([arriba[conectados], abajo[conectados]], axis=1))
+    return np.unique(np.concatenate(pares), axis=0)
+
+
+@instrumentacion.instrumentar
+def etiquetar_parches(ruta_raster, clase=1, conectividad=8, pixel_area_ha=None, ruta_etiquetas=None,
+                      memoria_max_mb=256, formato_salida=None, compresion="deflate"):
+    """
+    Etiqueta los parches (componentes conexos) de una clase en un ráster, franja por franja.
+
+    Parámetros:
+    -----------
+    ruta_raster : str
+        Ráster de transición (p. ej. `transicion_2019_to_2020.tif`).
+
+    clase : int, opcional
+        Valor de los píxeles que forman los parches (por defecto 1, deforestación).
+
+    conectividad : int, opcional
+        8 (por defecto, incluye diagonales) o 4.
+
+    pixel_area_ha : float, opcional
+        Área en hectáreas por píxel. Por defecto (None) cada píxel suma el área geodésica de su fila
+        (`analysis_functions.areas_pixel_por_fila_ha`).
+
+    ruta_etiquetas : str, opcional
+        Si se indica, guarda allí un GeoTIFF uint32 con el identificador de parche de cada píxel (0 = fondo).
+
+    memoria_max_mb : float, opcional
+        Presupuesto de memoria (MB) por franja.
+
+    formato_salida, compresion : opcional
+        Formato del GeoTIFF de etiquetas, como en `analysis_functions.calcular_transiciones`
+        ("cog" para Cloud-Optimized GeoTIFF).
+
+    Retorna:
+    --------
+    parches : dict
+        Columnas de la tabla de parches, ordenada por identificador (orden de aparición de arriba abajo):
+        id, pixeles, area_ha, fila_min, fila_max, col_min, col_max, y los límites en el CRS del
+        ráster (minx, miny, maxx, maxy).
+    """
+    if conectividad not in (4, 8):
+        raise ValueError("⚠️ La conectividad debe ser 4 u 8.")
+    estructura = ndimage.generate_binary_structure(2, 1 if conectividad == 4 else 2)
+
+    uf = _UnionFind()
+    total = 0
+    pixeles, areas, fila_min, fila_max, col_min, col_max = [], [], [], [], [], []
+    ruta_provisional = ruta_etiquetas + ".provisional" if ruta_etiquetas is not None else None
+
+    with rasterio.open(ruta_raster) as src:
+        transform = src.transform
+        instrumentacion.anotar(archivo=os.path.basename(ruta_raster))
+        instrumentacion.registrar(pixeles=src.width * src.height)
+        areas_fila = analysis_functions.areas_pixel_por_fila_ha(src) if pixel_area_ha is None else None
+        perfil = analysis_functions.perfil_transicion(src)
+        perfil.update(dtype="uint32", nodata=0, compress="deflate", tiled=True, blockxsize=512, blockysize=512)
+        provisional = rasterio.open(ruta_provisional, "w", **perfil) if ruta_provisional else None
+
+        try:
+            fila_anterior = None
+            # Banda uint8, máscara, etiquetas int32 y temporales de find_objects (más los pesos float64 por píxel)
+            arreglos_por_pixel = 10 if areas_fila is None else 18
+            for ventana in analysis_functions.generar_ventanas_por_memoria(src, memoria_max_mb, arreglos_por_pixel):
+                etiquetas, n = ndimage.label(src.read(1, window=ventana) == clase, structure=estructura)
+
+                if n:
+                    # Área y extensión de los parches de la franja (etiquetas locales 1..n)
+                    pixeles.append(np.bincount(etiquetas.ravel(), minlength=n + 1)[1:])
+                    if areas_fila is not None:
+                        filas_franja = areas_fila[ventana.row_off:ventana.row_off + ventana.height]
+                        pesos = np.broadcast_to(filas_franja[:, None], etiquetas.shape).ravel()
+                        areas.append(np.bincount(etiquetas.ravel(), weights=pesos, minlength=n + 1)[1:])
+                    for rebanada in ndimage.find_objects(etiquetas):
+                        fila_min.append(ventana.row_off + rebanada[0].start)
+                        fila_max.append(ventana.row_off + rebanada[0].stop - 1)
+                        col_min.append(rebanada[1].start)
+                        col_max.append(rebanada[1].stop - 1)
+
+                    # Etiquetas globales provisionales: se desplazan según los parches ya vistos
+                    etiquetas[etiquetas > 0] += total
+                    uf.agregar(total + n)
+
+                    # Unir con los parches de la franja anterior que tocan el borde
+                    if fila_anterior is not None:
+                        for arriba, abajo in _pares_en_borde(fila_anterior, etiquetas[0], conectividad):
+                            uf.unir(arriba, abajo)
+                    total += n
+
+                fila_anterior = etiquetas[-1].copy()
+                if provisional is not None:
+                    provisional.write(etiquetas.astype(np.uint32), 1, window=ventana)
+        finally:
+            if provisional is not None:
+                provisional.close()
+
+    # Resolver cada etiqueta provisional a su parche definitivo (1..número de parches)
+    raiz = uf.raices()
+    raices_unicas, definitivo = np.unique(raiz[1:], return_inverse=True)
+    definitivo = definitivo + 1
+    n_parches = len(raices_unicas)
+
+    pixeles = np.concatenate(pixeles) if pixeles else np.zeros(0, dtype=np.int64)
+    parches = {"id": np.arange(1, n_parches + 1)}
+    parches["pixeles"] = np.bincount(definitivo, weights=pixeles, minlength=n_parches + 1)[1:].astype(np.int64)
+    if areas_fila is None:
+        parches["area_ha"] = parches["pixeles"] * pixel_area_ha
+    else:
+        areas = np.concatenate(areas) if areas else np.zeros(0)
+        parches["area_ha"] = np.bincount(definitivo, weights=areas, minlength=n_parches + 1)[1:]
+    for nombre, valores, operacion, inicial in [
+        ("fila_min", fila_min, np.minimum, np.iinfo(np.int64).max),
+        ("fila_max", fila_max, np.maximum, -1),
+        ("col_min", col_min, np.minimum, np.iinfo(np.int64).max),
+        ("col_max", col_max, np.maximum, -1),
+    ]:
+        resultado = np.full(n_parches + 1, inicial, dtype=np.int64)
+        operacion.at(resultado, definitivo, np.asarray(valores, dtype=np.int64))
+        parches[nombre] = resultado[1:]
+
+    # Límites en el CRS del ráster (esquinas exteriores de los píxeles extremos)
+    x0, y0 = transform * (parches["col_min"], parches["fila_min"])
+    x1, y1 = transform * (parches["col_max"] + 1, parches["fila_max"] + 1)
+    parches["minx"], parches["maxx"] = np.minimum(x0, x1), np.maximum(x0, x1)
+    parches["miny"], parches["maxy"] = np.minimum(y0, y1), np.maximum(y0, y1)
+
+    # Segunda pasada: reemplazar las etiquetas provisionales por los identificadores definitivos
+    if ruta_etiquetas is not None:
+        tabla = np.concatenate([[0], definitivo]).astype(np.uint32)
+        with rasterio.open(ruta_provisional) as src, \
+                analysis_functions.abrir_salida_raster(ruta_etiquetas, src.profile, formato_salida, compresion,
+                                                       nodata=0) as dst:
+            for ventana in analysis_functions.generar_ventanas_por_memoria(src, memoria_max_mb, arreglos_por_pixel=3):
+                dst.write(tabla[src.read(1, window=ventana)], 1, window=ventana)
+        os.remove(ruta_provisional)
+        analysis_functions.finalizar_salida_raster(ruta_etiquetas, formato_salida, compresion)
+
+    return parches
+
+
+def resumir_parches(parches):
+    """
+    Número de parches, área total, parche mayor, área media y número de parches por rango de tamaño.
+    """
+    area = parches["area_ha"]
+    resumen = {
+        "Parches": int(len(area)),
+        "Área total (ha)": float(area.sum()),
+        "Parche mayor (ha)": float(area.max()) if len(area) else 0.0,
+        "Área media (ha)": float(area.mean()) if len(area) else 0.0,
+    }
+    for minimo, maximo in RANGOS_TAMANO_HA:
+        etiqueta = f"{minimo}-{maximo} ha" if maximo != float("inf") else f">{minimo} ha"
+        resumen[etiqueta] = int(((area >= minimo) & (area < maximo)).sum())
+    return resumen
+
+
+def exportar_tabla_parches(parches, ruta_csv):
+    """
+    Guarda la tabla de parches (una fila por parche) en CSV.
+    """
+    columnas = list(parches)
+    with open(ruta_csv, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(columnas)
+        escritor.writerows(zip(*(parches[columna].tolist() for columna in columnas)))
+    return ruta_csv
+
+
+@instrumentacion.instrumentar
+def analizar_parches_transiciones(carpeta_transiciones, carpeta_salida, clase=1, conectividad=8,
+                                  pixel_area_ha=None, rasteres_etiquetas=False, memoria_max_mb=256,
+                                  formato_salida=None, compresion="deflate"):
+    """
+    Calcula los parches de cada `transicion_<año1>_to_<año2>.tif` de la carpeta.
+
+    Guarda en `carpeta_salida` una tabla `parches_<año1>_to_<año2>.csv` por archivo, el resumen anual
+    `resumen_parches.csv` (número de parches, distribución de tamaños y parche mayor) y, si
+    `rasteres_etiquetas` es True, los rásteres `parches_<año1>_to_<año2>.tif` con el identificador de parche.
+    `formato_salida` y `compresion` se aplican a esos rásteres (ver `etiquetar_parches`).
+
+    Retorna el resumen como diccionario {año destino: {métrica: valor}}.
+    """
+    os.makedirs(carpeta_salida, exist_ok=True)
+    resumen = {}
+
+    for ruta in sorted(glob.glob(os.path.join(carpeta_transiciones, "transicion_*.tif"))):
+        clave = os.path.splitext(os.path.basename(ruta))[0].replace("transicion_", "")
+        ruta_etiquetas = os.path.join(carpeta_salida, f"parches_{clave}.tif") if rasteres_etiquetas else None
+
+        parches = etiquetar_parches(ruta, clase, conectividad, pixel_area_ha, ruta_etiquetas, memoria_max_mb,
+                                    formato_salida, compresion)
+        exportar_tabla_parches(parches, os.path.join(carpeta_salida, f"parches_{clave}.csv"))
+
+        anio = int(clave.split("_")[-1])
+        resumen[anio] = resumir_parches(parches)
+        print(f"✅ Parches {clave}: {resumen[anio]['Parches']} parches, "
+              f"mayor de {resumen[anio]['Parche mayor (ha)']:.2f} ha")
+
+    if resumen:
+        columnas = list(next(iter(resumen.values())))
+        with open(os.path.join(carpeta_salida, "resumen_parches.csv"), "w", newline="", encoding="utf-8") as f:
+            escritor = csv.writer(f)
+            escritor.writerow(["Año"] + columnas)
+            for anio in sorted(resumen):
+                escritor.writerow([anio] + [resumen[anio][columna] for columna in columnas])
+
+    return resumen
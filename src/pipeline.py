@@ -0,0 +1,377 @@
+"""
+Ejecución por lotes (sin notebooks ni preguntas al usuario) del flujo completo:
+
+    reproyeccion → seleccion → recorte → reclasificacion → transiciones → estadisticas
+
+Toda la configuración se lee de un archivo JSON. Cada etapa registra la huella (tamaño y fecha de
+modificación) de sus archivos de entrada, sus parámetros y sus archivos de salida en
+`<resultados>/.pipeline_estado.json`; al volver a ejecutar, las etapas cuyas entradas, parámetros
+y salidas no cambiaron se omiten, de modo que solo se rehace lo que depende de lo modificado.
+
+Uso:
+    python src/pipeline.py config.json [--hasta ETAPA] [--forzar ETAPA [ETAPA ...]]
+                                       [--metricas metricas.jsonl] [--perfiles CARPETA]
+
+Con `--metricas` cada etapa (y cada función o año instrumentado dentro de ella) agrega un evento
+JSON con tiempos, memoria, E/S y píxeles procesados (ver `instrumentacion.py`); con `--perfiles`
+se guarda además un volcado cProfile de cada etapa.
+
+Ejemplo de config.json (las rutas relativas se resuelven respecto a la carpeta del archivo):
+    {
+        "datos": "DATOS",
+        "resultados": "results",
+        "departamento": "Caquetá",
+        "raster_mapbiomas": "results/COBER_DPTO/Mapbiomas_from_2019_to_2023.tif",
+        "anio_inicial": 2019,
+        "workers": 4
+    }
+"""
+# Librerías para manejo de argumentos, archivos y rutas
+import argparse  #Leer argumentos de la línea de comandos
+import json  #Leer la configuración y guardar el estado de las etapas
+import os  #Interactuar con el sistema de archivos (rutas)
+
+# Funciones del proyecto
+import analysis_functions
+import almacen_resultados
+import data_preprocessing
+import instrumentacion
+
+
+# Orden de ejecución de las etapas
+ETAPAS = ["reproyeccion", "seleccion", "recorte", "reclasificacion", "transiciones", "estadisticas"]
+
+CONFIGURACION_POR_DEFECTO = {
+    "datos": "DATOS",
+    "resultados": "results",
+    "departamento": None,           # Si es None se elige con dep_con_menor_area_protegida
+    "raster_mapbiomas": None,       # GeoTIFF multibanda exportado de MapBiomas
+    "anio_inicial": None,           # Año de la primera banda del raster
+    "tabla_reclasificacion": None,  # {"código original": clase nueva}; None = tabla por defecto
+    "formato_salida": "cog",        # None = perfil del ráster de entrada; "cog" = Cloud-Optimized GeoTIFF
+    "compresion": "deflate",        # "deflate", "zstd" o "lzw" (solo con formato_salida "cog")
+    "workers": 1,
+    "memoria_max_mb": 256,
+    "pixel_area_ha": None,  # None: área geodésica por fila del ráster
+    "resolucion": None,
+    "exportar_csv": True,   # Además del almacén resultados.sqlite, escribir resumen_transiciones.csv
+}
+
+CAMPOS_RUTA = ["datos", "resultados", "raster_mapbiomas"]
+
+
+def cargar_configuracion(ruta_config):
+    """
+    Lee el archivo JSON de configuración, completa los valores por defecto y resuelve las rutas
+    relativas respecto a la carpeta del archivo.
+    """
+    with open(ruta_config, encoding="utf-8") as f:
+        config = {**CONFIGURACION_POR_DEFECTO, **json.load(f)}
+
+    base = os.path.dirname(os.path.abspath(ruta_config))
+    for campo in CAMPOS_RUTA:
+        if config[campo] is not None:
+            config[campo] = os.path.normpath(os.path.join(base, config[campo]))
+
+    if config["tabla_reclasificacion"] is not None:
+        config["tabla_reclasificacion"] = {int(k): int(v) for k, v in config["tabla_reclasificacion"].items()}
+
+    return config
+
+
+# --- Rutas de los productos de cada etapa ---
+
+def _ruta_capa_reproyectada(config, nombre):
+    return os.path.join(config["resultados"], "CAPAS_9377", f"{nombre}.parquet")
+
+
+def _ruta_seleccion(config):
+    return os.path.join(config["resultados"], "STATS", "departamento_seleccionado.json")
+
+
+def _carpeta_capas_dpto(config):
+    return os.path.join(config["resultados"], "CAPAS_DPTO")
+
+
+def _ruta_reclass(config):
+    nombre = os.path.splitext(os.path.basename(_requerido(config, "raster_mapbiomas")))[0] + "_reclass.tif"
+    return os.path.join(config["resultados"], "RECLASS", nombre)
+
+
+def _carpeta_transiciones(config):
+    return os.path.join(config["resultados"], "TRANSICIONES")
+
+
+def _carpeta_estadisticas(config):
+    return os.path.join(config["resultados"], "STATS")
+
+
+def _requerido(config, campo):
+    if config.get(campo) is None:
+        raise ValueError(f"⚠️ Falta el campo '{campo}' en el archivo de configuración.")
+    return config[campo]
+
+
+def _cargar_capas_reproyectadas(config):
+    return {nombre: data_preprocessing.gpd.read_parquet(_ruta_capa_reproyectada(config, nombre))
+            for nombre in data_preprocessing.CAPAS_GEOESPACIALES}
+
+
+# --- Etapas: cada una declara sus entradas, sus parámetros y cómo ejecutarse ---
+
+def _entradas_reproyeccion(config, estado):
+    rutas = []
+    for relativa in data_preprocessing.CAPAS_GEOESPACIALES.values():
+        base = os.path.splitext(os.path.join(config["datos"], relativa))[0]
+        rutas.extend(base + ext for ext in data_preprocessing.EXTENSIONES_SHAPEFILE if os.path.exists(base + ext))
+    return rutas
+
+
+def _ejecutar_reproyeccion(config):
+    dept, reg, resg, runap = data_preprocessing.load_geospatial_layers(config["datos"])
+    dept_9377, resg_9377, runap_9377, reg_9377 = data_preprocessing.reproject_layers_pl(dept, resg, runap, reg)
+
+    salidas = []
+    for nombre, capa in [("dept", dept_9377), ("reg", reg_9377), ("resg", resg_9377), ("runap", runap_9377)]:
+        ruta = _ruta_capa_reproyectada(config, nombre)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        capa.to_parquet(ruta + ".tmp")
+        os.replace(ruta + ".tmp", ruta)
+        salidas.append(ruta)
+    return salidas
+
+
+def _entradas_capas_reproyectadas(config, estado):
+    return [_ruta_capa_reproyectada(config, nombre) for nombre in data_preprocessing.CAPAS_GEOESPACIALES]
+
+
+def _ejecutar_seleccion(config):
+    departamento = config["departamento"]
+    if departamento is None:
+        capas = _cargar_capas_reproyectadas(config)
+        # Mismos argumentos que en notebooks/data_preparation.ipynb
+        resumen = data_preprocessing.resumen_area_libre_departamentos(capas["dept"], capas["resg"], capas["runap"])[0]
+        departamento = str(resumen.iloc[0]["DeNombre"])
+
+    ruta = _ruta_seleccion(config)
+    _escribir_json(ruta, {"departamento": departamento})
+    print(f"✅ Departamento seleccionado: {departamento}")
+    return [ruta]
+
+
+def _entradas_recorte(config, estado):
+    return _entradas_capas_reproyectadas(config, estado) + [_ruta_seleccion(config)]
+
+
+def _ejecutar_recorte(config):
+    with open(_ruta_seleccion(config), encoding="utf-8") as f:
+        departamento = json.load(f)["departamento"]
+
+    capas = _cargar_capas_reproyectadas(config)
+    Departamento, resguardos_dpto, parques_dpto = data_preprocessing.recortar_capas_por_departamento(
+        capas["dept"], capas["resg"], capas["runap"], departamento)
+    dpto_4326, resguardos_dpto_4326, parques_dpto_4326 = data_preprocessing.reproject_layers(
+        Departamento, resguardos_dpto, parques_dpto)
+
+    carpeta = _carpeta_capas_dpto(config)
+    data_preprocessing.save_layers(dpto_4326, resguardos_dpto_4326, parques_dpto_4326, carpeta)
+    return [os.path.join(carpeta, nombre) for nombre in
+            ("dpto_4326.gpkg", "resguardos_dpto_4326.gpkg", "parques_dpto_4326.gpkg")]
+
+
+def _entradas_reclasificacion(config, estado):
+    return [_requerido(config, "raster_mapbiomas")]
+
+
+def _ejecutar_reclasificacion(config):
+    ruta = analysis_functions.reclasificar_coberturas_mapbiomas(
+        config["raster_mapbiomas"], os.path.dirname(_ruta_reclass(config)),
+        config["tabla_reclasificacion"], workers=config["workers"],
+        formato_salida=config["formato_salida"], compresion=config["compresion"])
+    return [ruta]
+
+
+def _entradas_transiciones(config, estado):
+    return [_ruta_reclass(config)]
+
+
+def _ejecutar_transiciones(config):
+    transiciones = analysis_functions.calcular_transiciones(
+        _ruta_reclass(config), _requerido(config, "anio_inicial"), _carpeta_transiciones(config),
+        streaming=True, memoria_max_mb=config["memoria_max_mb"], workers=config["workers"],
+        formato_salida=config["formato_salida"], compresion=config["compresion"])
+    return [metadatos["ruta"] for metadatos in transiciones.values()]
+
+
+def _rutas_transiciones(estado):
+    return list(estado.get("transiciones", {}).get("salidas", {}))
+
+
+def _entradas_estadisticas(config, estado):
+    carpeta = _carpeta_capas_dpto(config)
+    return _rutas_transiciones(estado) + [os.path.join(carpeta, "parques_dpto_4326.gpkg"),
+                                          os.path.join(carpeta, "resguardos_dpto_4326.gpkg")]
+
+
+def _ejecutar_estadisticas(config, estado):
+    rutas = _rutas_transiciones(estado)
+    if not rutas:
+        raise ValueError("⚠️ No hay rásteres de transición registrados; ejecute la etapa 'transiciones'.")
+
+    carpeta = _carpeta_estadisticas(config)
+    anios = {ruta: int(os.path.splitext(os.path.basename(ruta))[0].split("_")[-1]) for ruta in rutas}
+
+    # Resumen anual (mismas columnas que visualization_tools.analizar_transiciones_y_exportar)
+    areas_clase = analysis_functions.areas_por_clase_rasters(rutas, workers=config["workers"],
+                                                             pixel_area_ha=config["pixel_area_ha"])
+    datos = {}
+    for ruta, anio in anios.items():
+        areas = datos.setdefault(anio, {nombre: 0 for nombre in analysis_functions.NOMBRES_TRANSICIONES.values()})
+        for clase, nombre in analysis_functions.NOMBRES_TRANSICIONES.items():
+            areas[nombre] += areas_clase[ruta][clase]
+
+    # Cubo año × área × clase para parques y resguardos del departamento
+    capas_dpto = _carpeta_capas_dpto(config)
+    gdf_pnn = data_preprocessing.gpd.read_file(os.path.join(capas_dpto, "parques_dpto_4326.gpkg"))
+    gdf_resguardos = data_preprocessing.gpd.read_file(os.path.join(capas_dpto, "resguardos_dpto_4326.gpkg"))
+    ruta_cubo = os.path.join(carpeta, "cubo_transiciones_areas.npz")
+    cubo = analysis_functions.calcular_cubo_transiciones_por_area(
+        _carpeta_transiciones(config), min(anios.values()), max(anios.values()),
+        gdf_pnn, gdf_resguardos, resolucion=config["resolucion"], ruta_salida=ruta_cubo)
+
+    # Almacén indexado con el resumen anual y las áreas protegidas; el CSV es opcional
+    ruta_almacen = os.path.join(carpeta, almacen_resultados.ARCHIVO_ALMACEN)
+    almacen_resultados.agregar_areas(ruta_almacen, almacen_resultados.filas_resumen(datos) +
+                                     almacen_resultados.filas_cubo(cubo))
+    salidas = [ruta_almacen, ruta_cubo]
+    if config["exportar_csv"]:
+        salidas.append(analysis_functions.exportar_resumen_transiciones(datos, carpeta))
+
+    return salidas
+
+
+DEFINICION_ETAPAS = {
+    "reproyeccion": {"entradas": _entradas_reproyeccion, "parametros": [],
+                     "ejecutar": _ejecutar_reproyeccion},
+    "seleccion": {"entradas": _entradas_capas_reproyectadas, "parametros": ["departamento"],
+                  "ejecutar": _ejecutar_seleccion},
+    "recorte": {"entradas": _entradas_recorte, "parametros": [],
+                "ejecutar": _ejecutar_recorte},
+    "reclasificacion": {"entradas": _entradas_reclasificacion, "parametros": ["tabla_reclasificacion", "formato_salida", "compresion"],
+                        "ejecutar": _ejecutar_reclasificacion},
+    "transiciones": {"entradas": _entradas_transiciones, "parametros": ["anio_inicial", "formato_salida", "compresion"],
+                     "ejecutar": _ejecutar_transiciones},
+    "estadisticas": {"entradas": _entradas_estadisticas, "parametros": ["pixel_area_ha", "resolucion", "exportar_csv"],
+                     "ejecutar": _ejecutar_estadisticas, "usa_estado": True},
+}
+
+
+# --- Seguimiento del estado de las etapas ---
+
+def firma_archivo(ruta):
+    """
+    Huella rápida de un archivo: tamaño y fecha de modificación (ns).
+    """
+    estado = os.stat(ruta)
+    return f"{estado.st_size}:{estado.st_mtime_ns}"
+
+
+def _firmas(rutas):
+    faltantes = [ruta for ruta in rutas if not os.path.exists(ruta)]
+    if faltantes:
+        raise FileNotFoundError(f"❌ Faltan archivos de entrada: {faltantes}")
+    return {ruta: firma_archivo(ruta) for ruta in rutas}
+
+
+def _ruta_estado(config):
+    return os.path.join(config["resultados"], ".pipeline_estado.json")
+
+
+def cargar_estado(config):
+    ruta = _ruta_estado(config)
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _escribir_json(ruta, contenido):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(contenido, f, ensure_ascii=False, indent=2)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def etapa_al_dia(registro, entradas, parametros):
+    """
+    Una etapa está al día si ya se ejecutó con las mismas entradas y parámetros
+    y todas sus salidas siguen existiendo sin cambios.
+    """
+    if not registro or registro.get("entradas") != entradas or registro.get("parametros") != parametros:
+        return False
+    return all(os.path.exists(ruta) and firma_archivo(ruta) == firma
+               for ruta, firma in registro.get("salidas", {}).items())
+
+
+def ejecutar_pipeline(config, hasta=None, forzar=()):
+    """
+    Ejecuta las etapas en orden hasta `hasta` (inclusive), omitiendo las que están al día.
+
+    Parámetros:
+    - config: diccionario de configuración (ver `cargar_configuracion`)
+    - hasta: última etapa a ejecutar (por defecto todas)
+    - forzar: etapas que se ejecutan aunque estén al día
+
+    Retorna la lista de etapas que se ejecutaron.
+    """
+    ultima = ETAPAS.index(hasta) if hasta is not None else len(ETAPAS) - 1
+    estado = cargar_estado(config)
+    ejecutadas = []
+
+    for nombre in ETAPAS[:ultima + 1]:
+        definicion = DEFINICION_ETAPAS[nombre]
+        entradas = _firmas(definicion["entradas"](config, estado))
+        parametros = {campo: config[campo] for campo in definicion["parametros"]}
+
+        if nombre not in forzar and etapa_al_dia(estado.get(nombre), entradas, parametros):
+            print(f"⏭️ Etapa '{nombre}' al día, se omite")
+            instrumentacion.emitir({"evento": "etapa_omitida", "nombre": f"pipeline.{nombre}"})
+            continue
+
+        print(f"▶️ Ejecutando etapa '{nombre}'")
+        with instrumentacion.etapa(f"pipeline.{nombre}"):
+            if definicion.get("usa_estado"):
+                salidas = definicion["ejecutar"](config, estado)
+            else:
+                salidas = definicion["ejecutar"](config)
+
+        estado[nombre] = {"entradas": entradas, "parametros": parametros, "salidas": _firmas(salidas)}
+        _escribir_json(_ruta_estado(config), estado)
+        ejecutadas.append(nombre)
+
+    print(f"✅ Pipeline finalizado. Etapas ejecutadas: {ejecutadas or 'ninguna'}")
+    return ejecutadas
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Cálculo de transiciones de cobertura por lotes")
+    parser.add_argument("config", help="Archivo JSON de configuración")
+    parser.add_argument("--hasta", choices=ETAPAS, help="Última etapa a ejecutar")
+    parser.add_argument("--forzar", nargs="*", choices=ETAPAS, default=[],
+                        help="Etapas que se ejecutan aunque estén al día")
+    parser.add_argument("--metricas", help="Archivo JSONL donde agregar las métricas de cada etapa")
+    parser.add_argument("--perfiles", help="Carpeta donde guardar un perfil cProfile (.prof) de cada etapa")
+    args = parser.parse_args(argumentos)
+
+    if args.metricas or args.perfiles:
+        sumideros = [instrumentacion.SumideroJSONL(args.metricas)] if args.metricas else []
+        instrumentacion.activar(*sumideros, carpeta_perfiles=args.perfiles,
+                                perfilar=[f"pipeline.{nombre}" for nombre in ETAPAS])
+    try:
+        ejecutar_pipeline(cargar_configuracion(args.config), hasta=args.hasta, forzar=args.forzar)
+    finally:
+        instrumentacion.desactivar()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,32 @@
 # Librerías para análisis geoespacial
-import ee  #Usar Google Earth Engine
-import geopandas as gpd  #Manejo de datos geoespaciales
-import geemap
 import rasterio   #Trabajar con imágenes ráster
-import rasterio.plot
-from rasterio.mask import mask
-
-# Librerías para visualización
-import matplotlib.pyplot as plt      #Crear gráficos y visualizar datos
-import matplotlib.patches as mpatches #Crear objetos gráficos usando alias 
-from matplotlib.patches import Patch  #Crear objetos gráficos sin usar alias
-from matplotlib.colors import ListedColormap #Definir y manejar con paletas de colores personalizadas
-import contextily as ctx
-from rasterio.plot import show #Mostrar imágenes ráster con rasterio
 
 # Librerías para manejo de datos y procesamiento
 import numpy as np  #Operaciones con matrices y arrays numéricos
-import pandas as pd #Manejar datos tabulares de forma eficiente (dataframes).
 import glob   #Trabajar con patrones de archivos y buscar archivos que coincidan con un patrón específico.
 import re  #Trabajar con expresiones regulares
 
-# Librerías para interacción con widgets y visualización en Jupyter
-import ipywidgets as widgets  #Crear componentes graficas interactivos (botones, sliders)
-from IPython.display import display, clear_output 
-
 # Librerías para manejo de archivos y rutas
 import os  #Interactuar con el sistema de archivos (rutas)
 
+# Funciones de análisis del proyecto (estadísticas zonales) e instrumentación de etapas
+import analysis_functions
+import almacen_resultados
+import instrumentacion
+
+# Librerías pesadas u opcionales: se importan en el primer uso, para que el módulo
+# cargue rápido y funcione en nodos sin Earth Engine, geemap ni ipywidgets
+from lazy_imports import importar_perezoso
+ee = importar_perezoso("ee")  #Usar Google Earth Engine
+gpd = importar_perezoso("geopandas")  #Manejo de datos geoespaciales
+geemap = importar_perezoso("geemap")  #Mapas interactivos de Earth Engine
+plt = importar_perezoso("matplotlib.pyplot")  #Crear gráficos y visualizar datos
+mpatches = importar_perezoso("matplotlib.patches")  #Crear objetos gráficos
+mcolors = importar_perezoso("matplotlib.colors")  #Definir y manejar con paletas de colores personalizadas
+ctx = importar_perezoso("contextily")  #Mapas base
+pd = importar_perezoso("pandas")  #Manejar datos tabulares de forma eficiente (dataframes).
+widgets = importar_perezoso("ipywidgets")  #Crear componentes graficas interactivos (botones, sliders)
+
 
 # Autenticación en Google Earth Engine
 def authenticate_earth_engine():
@@ -190,9 +190,21 @@ def visualizacion_raster_dep(palette,dpto_geom,cober_clipped,anio):
     # Mostrar el mapa
     return Map
 
-def visualizar_reclass(ruta_salida, anios, anio_inicial):
+def _tamano_ejes_px(ax):
+    """
+    Tamaño (ancho, alto) en píxeles de pantalla del área de dibujo de un eje, según el DPI de la figura.
+    """
+    extension = ax.get_window_extent()
+    return max(1, int(np.ceil(extension.width))), max(1, int(np.ceil(extension.height)))
+
+
+def visualizar_reclass(ruta_salida, anios, anio_inicial, limites=None):
     """
     Visualiza bandas individuales directamente con Rasterio, aplicando una paleta personalizada.
+
+    Cada banda se lee a la resolución de pantalla del subgráfico (overviews o lectura diezmada).
+    Con `limites` (minx, miny, maxx, maxy en el CRS del ráster) se dibuja solo esa zona,
+    a resolución completa si cabe en el subgráfico.
     """
     # Paso 1 Definición de la paleta de colores (RGBA)
     #    índice 0: transparente; 1: bosque; 2: natural no forestal; 3: uso antrópico
@@ -201,7 +213,7 @@ def visualizar_reclass(ruta_salida, anios, anio_inicial):
                 (204/255, 204/255, 0/255, 1),      # 2: No forestal (amarillo)
                 (153/255, 0/255, 0/255, 1) ]       # 3: Antrópico (vinotinto)
 
-    cmap = ListedColormap(colores)
+    cmap = mcolors.ListedColormap(colores)
     # Paso 2 Abrir el raster reclasificado
     with rasterio.open(ruta_salida) as src:
         total_bandas = src.count
@@ -220,9 +232,10 @@ def visualizar_reclass(ruta_salida, anios, anio_inicial):
                 print(f"⚠️ El año {anio} no está disponible.")
                 continue
 
-            # leer la banda correspondiente
-            banda = src.read(banda_idx)  # No convierte a array enmascarado
-            axes[i].imshow(banda, cmap=cmap, vmin=0, vmax=3)
+            # leer la banda correspondiente al tamaño del subgráfico
+            ancho_px, alto_px = _tamano_ejes_px(axes[i])
+            banda, extension = analysis_functions.leer_banda_para_pantalla(src, banda_idx, ancho_px, alto_px, limites)
+            axes[i].imshow(banda, cmap=cmap, vmin=0, vmax=3, extent=extension)
             axes[i].set_title(f"{nombre_archivo}\nAño: {anio}")
             axes[i].axis('off')
 
@@ -244,8 +257,21 @@ def visualizar_transiciones(
     carpeta_tifs,
     anio_desde,
     anio_hasta,
-    ruta_shapefile_departamento=None
+    ruta_shapefile_departamento=None,
+    limites=None,
+    histogramas=None
 ):
+    """
+    Dibuja los rásteres de transición del rango de años, leídos a la resolución de la figura.
+
+    - limites: (minx, miny, maxx, maxy) en el CRS del ráster para dibujar solo esa zona
+    - histogramas: diccionario ruta → histograma (p. ej. de `analysis_functions.histogramas_rasters`) para
+      construir la leyenda con todas las clases del ráster completo; si no se indica, la leyenda usa las
+      clases de la lectura diezmada de la figura (sin leer el ráster a resolución completa), por lo que
+      una clase rara puede no aparecer en ella
+
+    Los colores se fijan por valor de clase (vmin=0, vmax=4), iguales en todos los años.
+    """
     # Leer shapefile si se proporciona
     gdf_departamento = gpd.read_file(ruta_shapefile_departamento) if ruta_shapefile_departamento else None
 
@@ -266,32 +292,37 @@ def visualizar_transiciones(
             fig, ax = plt.subplots(figsize=(10, 8))
             
 
-            # Crear colormap personalizado para clases 0–4
-            from matplotlib.colors import ListedColormap
-            colores = ['#ffffff','#e41a1c', '#4daf4a', '#ff7f00']
-            cmap_clases = ListedColormap(colores)
+            # Crear colormap personalizado para clases 0–4 (un color fijo por clase)
+            colores = ['#ffffff', '#e41a1c', '#4daf4a', '#ff7f00', '#999999']
+            cmap_clases = mcolors.ListedColormap(colores)
 
-            # Mostrar raster con los colores definidos
-            imagen = show(src, ax=ax, cmap=cmap_clases, title=nombre_archivo)
+            # Mostrar raster con los colores definidos, leído al tamaño del gráfico
+            ancho_px, alto_px = _tamano_ejes_px(ax)
+            array, extension = analysis_functions.leer_banda_para_pantalla(src, 1, ancho_px, alto_px, limites, masked=True)
+            ax.imshow(array, cmap=cmap_clases, vmin=0, vmax=len(colores) - 1, extent=extension)
+            ax.set_title(nombre_archivo)
 
             # Añadir shapefile si aplica
             if gdf_departamento is not None:
                gdf_departamento.boundary.plot(ax=ax, edgecolor='red', linewidth=1)
 
-            # Crear leyenda simple por valores únicos
-            array = src.read(1)
-            unique = sorted(set(array.flatten()) - {src.nodata})
-            colores = ['#ffffff', '#e41a1c', '#4daf4a', '#ff7f00', '#999999']
-            etiquetas = [str(int(u)) for u in unique]
+            # Crear leyenda con las clases del histograma recibido o, si no hay, con las de la lectura diezmada
+            histograma = histogramas.get(ruta_tif) if histogramas else None
+            if histograma is not None:
+                presentes = analysis_functions.clases_presentes(histograma=histograma, nodata=src.nodata)
+            else:
+                presentes = analysis_functions.clases_presentes(array)
+            unique = [int(u) for u in presentes if u < len(colores)]
 
             # Generar leyenda
-            from matplotlib.patches import Patch
-            leyenda_patches = [Patch(color=colores[i], label=etiquetas[i]) for i in range(len(unique))]
+            leyenda_patches = [mpatches.Patch(color=colores[u], label=str(u)) for u in unique]
             plt.legend(handles=leyenda_patches, title="Clases", bbox_to_anchor=(1.05, 1), loc='upper left')
             plt.tight_layout()
             plt.show()
 
-def analizar_transiciones_y_exportar(carpeta_tifs, carpeta_destino, pixel_area_ha=0.09):
+@instrumentacion.instrumentar
+def analizar_transiciones_y_exportar(carpeta_tifs, carpeta_destino, pixel_area_ha=None, workers=4,
+                                     ruta_almacen=None, exportar_csv=True):
     """
     Procesa rásteres de transiciones anuales con clases 1 (deforestación), 2 (regeneración), 3 (degradación),
     genera gráfico y guarda CSV con resultados anuales.
@@ -299,9 +330,15 @@ def analizar_transiciones_y_exportar(carpeta_tifs, carpeta_destino, pixel_area_h
     Parámetros:
     - carpeta_tifs: ruta donde están los rásteres de transición
     - carpeta_destino: ruta donde se guardarán el gráfico y el CSV
-    - pixel_area_ha: área en hectáreas por píxel (por defecto 0.09 ha)
+    - pixel_area_ha: área en hectáreas por píxel; por defecto (None) se usa el área geodésica de cada fila
+      del ráster (exacta en EPSG:4326, sin reproyectar)
+    - workers: número de archivos que se leen a la vez (por defecto 4)
+    - ruta_almacen: si se indica, el resumen se agrega al almacén SQLite (`almacen_resultados`)
+      como zona "Total"
+    - exportar_csv: escribir también `resumen_transiciones.csv` (por defecto True)
     """
     datos = {}
+    rutas = {}
 
     for archivo in os.listdir(carpeta_tifs):
         if archivo.endswith(".tif") and "transicion" in archivo.lower():
@@ -315,33 +352,37 @@ def analizar_transiciones_y_exportar(carpeta_tifs, carpeta_destino, pixel_area_h
                 print(f"⚠️ No se pudo extraer el año de: {archivo}")
                 continue
 
-            with rasterio.open(ruta) as src:
-                array = src.read(1)
-                array = array[array != src.nodata]
+            rutas[ruta] = anio_destino
+
+    # Área por clase de cada ráster, por bloques (varios archivos en paralelo)
+    areas = analysis_functions.areas_por_clase_rasters(list(rutas), workers=workers, pixel_area_ha=pixel_area_ha)
 
-                for clase in [1, 2, 3]:
-                    conteo = np.sum(array == clase)
-                    area = conteo * pixel_area_ha
+    for ruta, anio_destino in rutas.items():
+        for clase in [1, 2, 3]:
+            area = areas[ruta][clase]
 
-                    if anio_destino not in datos:
-                        datos[anio_destino] = {"Deforestación": 0, "Regeneración": 0, "Degradación": 0}
+            if anio_destino not in datos:
+                datos[anio_destino] = {"Deforestación": 0, "Regeneración": 0, "Degradación": 0}
 
-                    if clase == 1:
-                        datos[anio_destino]["Deforestación"] += area
-                    elif clase == 2:
-                        datos[anio_destino]["Regeneración"] += area
-                    elif clase == 3:
-                        datos[anio_destino]["Degradación"] += area
+            if clase == 1:
+                datos[anio_destino]["Deforestación"] += area
+            elif clase == 2:
+                datos[anio_destino]["Regeneración"] += area
+            elif clase == 3:
+                datos[anio_destino]["Degradación"] += area
 
     # Crear DataFrame
     df = pd.DataFrame.from_dict(datos, orient='index')
     df.index.name = 'Año'
     df = df.sort_index()
 
-    # Exportar CSV
+    # Guardar en el almacén y exportar CSV
     os.makedirs(carpeta_destino, exist_ok=True)
+    if ruta_almacen is not None:
+        almacen_resultados.agregar_areas(ruta_almacen, almacen_resultados.filas_resumen(datos))
     path_csv = os.path.join(carpeta_destino, "resumen_transiciones.csv")
-    df.to_csv(path_csv, index=True)
+    if exportar_csv:
+        df.to_csv(path_csv, index=True)
 
     # Graficar
     colores = {"Deforestación": "red", "Regeneración": "green", "Degradación": "orange"}
@@ -361,17 +402,21 @@ def analizar_transiciones_y_exportar(carpeta_tifs, carpeta_destino, pixel_area_h
     plt.savefig(path_img, dpi=300)
     plt.show()
 
-    print(f"✅ CSV guardado en: {path_csv}")
+    if exportar_csv:
+        print(f"✅ CSV guardado en: {path_csv}")
     print(f"✅ Gráfico guardado en: {path_img}")
 
 
+@instrumentacion.instrumentar
 def graficar_transiciones_por_area_protegida(
     carpeta_tifs,
     anio,
     gdf_pnn,
     gdf_resguardos,
-    resolucion=30,  # en metros
-    carpeta_exportacion='/notebooks/DEFORESTACION/results/STATS'  # Ruta para exportar las gráficas
+    resolucion=None,  # en metros; None = área geodésica por fila del ráster
+    carpeta_exportacion='/notebooks/DEFORESTACION/results/STATS',  # Ruta para exportar las gráficas
+    ruta_almacen=None,  # Almacén SQLite (almacen_resultados) donde agregar las filas del año
+    exportar_csv=True  # Escribir también transiciones_{anio}.csv
 ):
      # Buscar todos los archivos de transición para el par de años especificado (anio-1 to anio)
     archivos = sorted(glob.glob(os.path.join(carpeta_tifs, f"transicion_{anio-1}_to_{anio}.tif")))
@@ -382,14 +427,19 @@ def graficar_transiciones_por_area_protegida(
 
     # Tomar el primer archivo de la lista (si hubiera más de uno)
     ruta_tif = archivos[0]
-    # Calcular el área de un píxel en hectáreas (resolucion^2 en m² dividido por 10 000)
-    pixel_area_ha = (resolucion ** 2) / 10000  # conversión m² a ha
+    # Calcular el área de un píxel en hectáreas (resolucion^2 en m² dividido por 10 000);
+    # sin resolución, cada píxel pesa el área de su fila y los conteos salen ya en hectáreas
+    pixel_area_ha = (resolucion ** 2) / 10000 if resolucion is not None else 1.0  # conversión m² a ha
 
     resultados = []
+    filas_almacen = []  # Mismas filas con la posición del área en su capa (id_zona del almacén)
 
     # Abrir el raster de transición
     with rasterio.open(ruta_tif) as src:
         crs_raster = src.crs
+        instrumentacion.anotar(anio=anio)
+        instrumentacion.registrar(pixeles=src.width * src.height)
+        areas_fila = analysis_functions.areas_pixel_por_fila_ha(src) if resolucion is None else None
 
         # Asegurar que los GeoDataFrames de áreas protegidas al mismo CRS que el raster
         gdf_pnn = gdf_pnn.to_crs(crs_raster)
@@ -397,46 +447,51 @@ def graficar_transiciones_por_area_protegida(
 
         # Iterar sobre dos tipos de áreas: PNN y Resguardos
         for tipo_area, gdf in [("PNN", gdf_pnn), ("Resguardos", gdf_resguardos)]:
-            for idx, row in gdf.iterrows():
-                 # Obtener el nombre del área (campo "NOMBRE" o "ap_nombre")
-                nombre_area = row["NOMBRE"] if "NOMBRE" in row else row["ap_nombre"]
-                geom = [row["geometry"]]
-
-                try:
-                    # Recortar el raster a la geometría del área y obtener la matriz de valores
-                    array, _ = mask(src, geom, crop=True)
-                    array = array[0]
-
-                    # Para cada clase de interés, contar píxeles y convertir a hectáreas
-                    for clase, nombre_clase in zip([1, 2, 3], ['Deforestación', 'Regeneración', 'Degradación']):
-                        cantidad = np.sum(array == clase)
-                        area_ha = cantidad * pixel_area_ha
-
-                        # Agregar un registro a la lista de resultados
-                        resultados.append({
-                            "Año": anio,
-                            "Tipo": tipo_area,
-                            "Nombre": nombre_area,
-                            "Clase": nombre_clase,
-                            "Área_ha": area_ha
-                        })
-
-                except Exception as e:
-                    # Si hay error en el recorte/proceso, informar y continuar
-                    print(f"⚠️ Error al procesar {nombre_area}: {e}")
+            # Rasterizar todas las zonas una sola vez (en caché entre años) y contar
+            # píxeles zona × clase con un único bincount
+            zonas = analysis_functions.rasterizar_zonas(gdf, src)
+            conteos = analysis_functions.contar_clases_por_zona(src, zonas, areas_fila=areas_fila)
+
+            # Obtener el nombre del área (campo "NOMBRE" o "ap_nombre")
+            nombres = gdf["NOMBRE"] if "NOMBRE" in gdf.columns else gdf["ap_nombre"]
+
+            for posicion, nombre_area in enumerate(nombres):
+                if zonas["fuera"][posicion]:
+                    # El área no tiene píxeles dentro del ráster: informar y continuar
+                    print(f"⚠️ {tipo_area} {nombre_area}: sin píxeles dentro del ráster, se omite.")
                     continue
 
+                # Para cada clase de interés, convertir el conteo de píxeles a hectáreas
+                for clase, nombre_clase in zip([1, 2, 3], ['Deforestación', 'Regeneración', 'Degradación']):
+                    area_ha = conteos[posicion, clase] * pixel_area_ha
+
+                    # Agregar un registro a la lista de resultados
+                    resultados.append({
+                        "Año": anio,
+                        "Tipo": tipo_area,
+                        "Nombre": nombre_area,
+                        "Clase": nombre_clase,
+                        "Área_ha": area_ha
+                    })
+                    filas_almacen.append((anio, tipo_area, posicion, str(nombre_area), nombre_clase,
+                                          float(area_ha)))
+
     # Convertir la lista de resultados a un DataFrame
     df_resultados = pd.DataFrame(resultados)
     if df_resultados.empty:
         print("⚠️ No se encontraron transiciones en las áreas protegidas.")
         return
         
+    # Agregar las filas del año al almacén indexado
+    if ruta_almacen is not None:
+        almacen_resultados.agregar_areas(ruta_almacen, filas_almacen)
+
     # 🔽 Exportar todo el DataFrame a un CSV
-    nombre_csv = f"transiciones_{anio}.csv"
-    ruta_csv = os.path.join(carpeta_exportacion, nombre_csv)
-    df_resultados.to_csv(ruta_csv, index=False)
-    print(f"✅ CSV guardado en: {ruta_csv}")
+    if exportar_csv:
+        nombre_csv = f"transiciones_{anio}.csv"
+        ruta_csv = os.path.join(carpeta_exportacion, nombre_csv)
+        df_resultados.to_csv(ruta_csv, index=False)
+        print(f"✅ CSV guardado en: {ruta_csv}")
 
     # Guardar cada gráfico de forma independiente para cada tipo de transición
     clases = ['Deforestación', 'Regeneración', 'Degradación']
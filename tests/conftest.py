@@ -0,0 +1,83 @@
+"""
+Configuración común de las pruebas.
+
+Los módulos de src/ y de benchmarks/ se importan de forma plana, como en los notebooks y en los
+scripts de benchmarks, y los datos de entrada se generan con `benchmarks/datos_sinteticos.py`.
+"""
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for carpeta in ("src", "benchmarks"):
+    ruta = os.path.join(RAIZ, carpeta)
+    if ruta not in sys.path:
+        sys.path.insert(0, ruta)
+
+os.environ.setdefault("MPLBACKEND", "Agg")  # Sin ventanas al importar matplotlib
+
+import pytest
+import rasterio
+
+import datos_sinteticos
+
+ANIO_INICIAL = 2019
+BANDAS = 4
+ALTO, ANCHO = 300, 260
+MEMORIA_FRANJAS_MB = 0.05  # Franjas de pocas filas para ejercitar la lectura por ventanas
+
+
+@pytest.fixture(scope="session")
+def stack_mapbiomas(tmp_path_factory):
+    """
+    GeoTIFF sintético de MapBiomas (códigos originales, una banda por año de 2019 a 2022).
+    """
+    carpeta = tmp_path_factory.mktemp("mapbiomas")
+    ruta = str(carpeta / f"Mapbiomas_from_{ANIO_INICIAL}_to_{ANIO_INICIAL + BANDAS - 1}.tif")
+    return datos_sinteticos.generar_stack_mapbiomas(ruta, ALTO, ANCHO, BANDAS, tamano_parche=8,
+                                                    tasa_cambio=0.1, ruido=0.02, semilla=3)
+
+
+@pytest.fixture(scope="session")
+def areas_protegidas(stack_mapbiomas):
+    """
+    Parques y resguardos sintéticos sobre el ráster (algunos fuera de él).
+    """
+    with rasterio.open(stack_mapbiomas) as src:
+        limites = src.bounds
+    pnn = datos_sinteticos.generar_areas_protegidas(limites, 6, "ap_nombre", "Parque", semilla=1)
+    resguardos = datos_sinteticos.generar_areas_protegidas(limites, 8, "NOMBRE", "Resguardo", semilla=2)
+    return pnn, resguardos
+
+
+@pytest.fixture(scope="session")
+def departamentos(stack_mapbiomas):
+    """
+    Cuatro departamentos rectangulares, alineados con los bordes de los píxeles, que cubren el ráster.
+    """
+    gpd = pytest.importorskip("geopandas")
+    from shapely.geometry import box
+
+    with rasterio.open(stack_mapbiomas) as src:
+        transform, crs = src.transform, src.crs
+    cortes_filas, cortes_columnas = [0, 130, ALTO], [0, 110, ANCHO]
+    nombres, geometrias = [], []
+    for i in range(2):
+        for j in range(2):
+            oeste, norte = transform * (cortes_columnas[j], cortes_filas[i])
+            este, sur = transform * (cortes_columnas[j + 1], cortes_filas[i + 1])
+            nombres.append(f"Departamento {i * 2 + j + 1}")
+            geometrias.append(box(oeste, sur, este, norte))
+    return gpd.GeoDataFrame({"DeNombre": nombres, "NOMBRE": nombres}, geometry=geometrias, crs=crs)
+
+
+@pytest.fixture(scope="session")
+def etapas_separadas(stack_mapbiomas, tmp_path_factory):
+    """
+    Reclasificación y transiciones en memoria (etapas separadas, sin streaming).
+    """
+    import analysis_functions
+
+    carpeta = tmp_path_factory.mktemp("etapas")
+    ruta_reclass = analysis_functions.reclasificar_coberturas_mapbiomas(stack_mapbiomas, str(carpeta / "reclass"))
+    analysis_functions.calcular_transiciones(ruta_reclass, ANIO_INICIAL, str(carpeta / "transiciones"))
+    return {"reclass": ruta_reclass, "transiciones": str(carpeta / "transiciones")}
@@ -0,0 +1,105 @@
+"""
+La actualización incremental (`actualizar_anio_nuevo`) produce los mismos rásteres, resumen, cubo
+y almacén que procesar todos los años de una vez.
+"""
+import filecmp
+import os
+
+import numpy as np
+import rasterio
+
+import actualizacion_anual
+import almacen_resultados
+import analysis_functions
+from conftest import ANIO_INICIAL, BANDAS
+
+ANIO_FINAL = ANIO_INICIAL + BANDAS - 1
+
+
+def _dividir_stack(ruta, carpeta):
+    """
+    Separa el último año del stack: `Mapbiomas_from_<inicial>_to_<final-1>.tif` y `..._<final>_to_<final>.tif`.
+    """
+    os.makedirs(carpeta)
+    with rasterio.open(ruta) as src:
+        for desde, hasta in [(ANIO_INICIAL, ANIO_FINAL - 1), (ANIO_FINAL, ANIO_FINAL)]:
+            bandas = list(range(desde - ANIO_INICIAL + 1, hasta - ANIO_INICIAL + 2))
+            perfil = src.profile.copy()
+            perfil.update(count=len(bandas))
+            with rasterio.open(os.path.join(carpeta, f"Mapbiomas_from_{desde}_to_{hasta}.tif"), "w", **perfil) as dst:
+                dst.write(src.read(bandas))
+
+
+def _ejecucion_completa(ruta_stack, carpeta, anio_hasta, pnn, resguardos):
+    ruta_reclass = analysis_functions.reclasificar_coberturas_mapbiomas(ruta_stack, os.path.join(carpeta, "reclass"))
+    analysis_functions.calcular_transiciones(ruta_reclass, ANIO_INICIAL, os.path.join(carpeta, "trans"), streaming=True)
+    estadisticas = os.path.join(carpeta, "stats")
+    actualizacion_anual.actualizar_resumen_transiciones(
+        actualizacion_anual.inventario_transiciones(os.path.join(carpeta, "trans")), estadisticas)
+    analysis_functions.calcular_cubo_transiciones_por_area(
+        os.path.join(carpeta, "trans"), ANIO_INICIAL + 1, anio_hasta, pnn, resguardos,
+        ruta_salida=os.path.join(estadisticas, actualizacion_anual.ARCHIVO_CUBO_AREAS))
+    actualizacion_anual.actualizar_almacen(os.path.join(estadisticas, almacen_resultados.ARCHIVO_ALMACEN),
+                                           estadisticas)
+
+
+def test_incremental_igual_a_completo(stack_mapbiomas, areas_protegidas, tmp_path):
+    pnn, resguardos = areas_protegidas
+    completo, incremental = str(tmp_path / "completo"), str(tmp_path / "incremental")
+    _ejecucion_completa(stack_mapbiomas, completo, ANIO_FINAL, pnn, resguardos)
+
+    # Años anteriores procesados completos; el último llega como archivo aparte
+    crudos = os.path.join(incremental, "raw")
+    _dividir_stack(stack_mapbiomas, crudos)
+    _ejecucion_completa(os.path.join(crudos, f"Mapbiomas_from_{ANIO_INICIAL}_to_{ANIO_FINAL - 1}.tif"),
+                        incremental, ANIO_FINAL - 1, pnn, resguardos)
+
+    carpetas = [os.path.join(incremental, nombre) for nombre in ("reclass", "trans", "stats")]
+    ruta_almacen = os.path.join(carpetas[2], almacen_resultados.ARCHIVO_ALMACEN)
+    resultado = actualizacion_anual.actualizar_anio_nuevo(crudos, *carpetas, gdf_pnn=pnn, gdf_resguardos=resguardos,
+                                                          ruta_almacen=ruta_almacen)
+    assert resultado["transiciones"] == [ANIO_FINAL]
+    assert resultado["almacen"] == [ANIO_FINAL]
+
+    # Una segunda ejecución no tiene nada que hacer
+    assert not any(actualizacion_anual.actualizar_anio_nuevo(crudos, *carpetas, gdf_pnn=pnn,
+                                                             gdf_resguardos=resguardos,
+                                                             ruta_almacen=ruta_almacen).values())
+
+    par = f"transicion_{ANIO_FINAL - 1}_to_{ANIO_FINAL}.tif"
+    with rasterio.open(os.path.join(completo, "trans", par)) as a, rasterio.open(os.path.join(carpetas[1], par)) as b:
+        np.testing.assert_array_equal(a.read(), b.read())
+
+    assert filecmp.cmp(os.path.join(completo, "stats", "resumen_transiciones.csv"),
+                       os.path.join(carpetas[2], "resumen_transiciones.csv"), shallow=False)
+
+    cubos = [analysis_functions.cargar_cubo_transiciones_por_area(
+        os.path.join(carpeta, actualizacion_anual.ARCHIVO_CUBO_AREAS)) for carpeta in (os.path.join(completo, "stats"),
+                                                                                      carpetas[2])]
+    for clave in cubos[0]:
+        np.testing.assert_array_equal(cubos[0][clave], cubos[1][clave])
+
+    filas = [almacen_resultados.consultar_areas(os.path.join(carpeta, almacen_resultados.ARCHIVO_ALMACEN),
+                                                dataframe=False)
+             for carpeta in (os.path.join(completo, "stats"), carpetas[2])]
+    assert filas[0] == filas[1]
+
+
+def test_anio_nuevo_en_cog(stack_mapbiomas, tmp_path):
+    # Las salidas COG tienen los mismos píxeles y no dejan archivos intermedios en la carpeta
+    rutas = {}
+    for formato in (None, "cog"):
+        carpeta = str(tmp_path / str(formato))
+        anterior = actualizacion_anual.reclasificar_anio(stack_mapbiomas, BANDAS - 1, ANIO_FINAL - 1, carpeta,
+                                                         formato_salida=formato)
+        actual = actualizacion_anual.reclasificar_anio(stack_mapbiomas, BANDAS, ANIO_FINAL, carpeta,
+                                                       formato_salida=formato)
+        transicion = actualizacion_anual.calcular_transicion_anio((anterior, 1), (actual, 1), ANIO_FINAL, carpeta,
+                                                                  formato_salida=formato)
+        rutas[formato] = [anterior, actual, transicion]
+        assert sorted(os.listdir(carpeta)) == sorted(os.path.basename(ruta) for ruta in rutas[formato])
+
+    for ruta, ruta_cog in zip(rutas[None], rutas["cog"]):
+        with rasterio.open(ruta) as a, rasterio.open(ruta_cog) as b:
+            np.testing.assert_array_equal(a.read(), b.read())
+            assert b.tags(ns="IMAGE_STRUCTURE").get("LAYOUT") == "COG"
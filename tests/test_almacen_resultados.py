@@ -0,0 +1,131 @@
+"""
+Pruebas del almacén SQLite: ida y vuelta con datos sintéticos y con las capas reales de parques y
+resguardos por departamento, que tienen nombres repetidos (varios "La Esperanza", "El Paraíso", ...).
+"""
+import os
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+import almacen_resultados
+import analysis_functions
+
+gpd = pytest.importorskip("geopandas")
+pd = pytest.importorskip("pandas")
+
+CAPAS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "results", "CAPAS_DPTO")
+RUTA_PARQUES = os.path.join(CAPAS, "parques_dpto_4326.gpkg")
+RUTA_RESGUARDOS = os.path.join(CAPAS, "resguardos_dpto_4326.gpkg")
+
+
+def _escribir_transiciones(carpeta, anios, limites, resolucion=0.01, semilla=0):
+    """
+    Rásteres de transición (clases 0-4) que cubren toda la extensión de las capas.
+    """
+    rng = np.random.default_rng(semilla)
+    oeste, sur, este, norte = limites
+    alto, ancho = int(np.ceil((norte - sur) / resolucion)), int(np.ceil((este - oeste) / resolucion))
+    perfil = {"driver": "GTiff", "height": alto, "width": ancho, "count": 1, "dtype": "uint8",
+              "crs": "EPSG:4326", "transform": from_origin(oeste, norte, resolucion, resolucion)}
+    for anio in anios:
+        with rasterio.open(os.path.join(carpeta, f"transicion_{anio - 1}_to_{anio}.tif"), "w", **perfil) as dst:
+            dst.write(rng.integers(0, 5, (alto, ancho), dtype=np.uint8), 1)
+
+
+@pytest.fixture(scope="module")
+def capas():
+    if not os.path.exists(RUTA_PARQUES):
+        pytest.skip("Faltan las capas de results/CAPAS_DPTO")
+    parques = gpd.read_file(RUTA_PARQUES)
+    resguardos = gpd.read_file(RUTA_RESGUARDOS)
+    return parques, resguardos
+
+
+@pytest.fixture(scope="module")
+def cubo(capas, tmp_path_factory):
+    parques, resguardos = capas
+    carpeta = tmp_path_factory.mktemp("transiciones")
+    limites = [min(parques.total_bounds[0], resguardos.total_bounds[0]) - 0.05,
+               min(parques.total_bounds[1], resguardos.total_bounds[1]) - 0.05,
+               max(parques.total_bounds[2], resguardos.total_bounds[2]) + 0.05,
+               max(parques.total_bounds[3], resguardos.total_bounds[3]) + 0.05]
+    _escribir_transiciones(str(carpeta), [2020, 2021], limites)
+    return analysis_functions.calcular_cubo_transiciones_por_area(str(carpeta), 2020, 2021, parques, resguardos)
+
+
+def test_la_capa_tiene_nombres_repetidos(capas):
+    parques, _ = capas
+    assert parques["ap_nombre"].duplicated().any()
+
+
+def test_nombres_repetidos_no_se_pierden(cubo, tmp_path):
+    ruta = str(tmp_path / "resultados.sqlite")
+    filas = almacen_resultados.filas_cubo(cubo)
+    almacen_resultados.agregar_areas(ruta, filas)
+
+    df = almacen_resultados.consultar_areas(ruta)
+    assert len(df) == len(filas)
+
+    # Los totales por año y tipo coinciden con el cubo
+    for posicion, anio in enumerate(cubo["anios"]):
+        for tipo in ("PNN", "Resguardos"):
+            seleccion = np.asarray(cubo["tipos"]) == tipo
+            esperado = np.nansum(cubo["areas_ha"][posicion, seleccion])
+            obtenido = df.loc[(df["Año"] == anio) & (df["Tipo"] == tipo), "Área_ha"].sum()
+            assert obtenido == pytest.approx(esperado)
+
+    # Cada "La Esperanza" conserva sus propias filas
+    nombres = np.asarray(cubo["nombres"])
+    esperanzas = np.flatnonzero((nombres == "La Esperanza") & (np.asarray(cubo["tipos"]) == "PNN"))
+    assert len(esperanzas) > 1
+    filas_esperanza = almacen_resultados.consultar_areas(ruta, anios=2021, tipos="PNN", nombres="La Esperanza")
+    assert filas_esperanza["Id_zona"].nunique() == len(esperanzas)
+
+
+def test_volver_a_guardar_un_anio_borra_las_zonas_anteriores(capas, cubo, tmp_path):
+    ruta = str(tmp_path / "resultados.sqlite")
+    almacen_resultados.agregar_areas(ruta, almacen_resultados.filas_cubo(cubo))
+
+    # Al volver a guardar 2021 con menos parques no quedan filas de los que ya no están
+    parques = np.asarray(cubo["tipos"]) == "PNN"
+    filas_2021 = [fila for fila in almacen_resultados.filas_cubo(cubo)
+                  if fila[0] == 2021 and (fila[1] != "PNN" or fila[2] < 10)]
+    almacen_resultados.agregar_areas(ruta, filas_2021)
+
+    df = almacen_resultados.consultar_areas(ruta, anios=2021, tipos="PNN")
+    assert sorted(df["Id_zona"].unique()) == list(range(10))
+    assert parques.sum() > 10
+    # El otro año no se modifica
+    assert almacen_resultados.consultar_areas(ruta, anios=2020, tipos="PNN")["Id_zona"].nunique() > 10
+
+
+def test_exportar_csv_conserva_las_filas_repetidas(cubo, tmp_path):
+    ruta = str(tmp_path / "resultados.sqlite")
+    filas = almacen_resultados.filas_cubo(cubo)
+    almacen_resultados.agregar_areas(ruta, filas)
+
+    rutas = almacen_resultados.exportar_tablas_csv(ruta, str(tmp_path / "csv"), anios=2021)
+    df = pd.read_csv(rutas[-1])
+    assert list(df.columns) == almacen_resultados.COLUMNAS
+    assert len(df) == sum(fila[0] == 2021 for fila in filas)
+
+
+def test_ida_y_vuelta_con_datos_sinteticos(stack_mapbiomas, departamentos, tmp_path):
+    datos = analysis_functions.procesar_mapbiomas_en_una_pasada(stack_mapbiomas, 2019)
+    resultado = analysis_functions.procesar_mapbiomas_por_departamentos(stack_mapbiomas, 2019, departamentos)
+    filas = almacen_resultados.filas_resumen(datos) + almacen_resultados.filas_departamentos(resultado)
+
+    ruta = str(tmp_path / "resultados.sqlite")
+    almacen_resultados.agregar_areas(ruta, filas)
+    assert sorted(almacen_resultados.consultar_areas(ruta, dataframe=False)) == sorted(filas)
+
+    # Guardar de nuevo no duplica filas
+    almacen_resultados.agregar_areas(ruta, filas)
+    assert len(almacen_resultados.consultar_areas(ruta, dataframe=False)) == len(filas)
+
+    # El resumen regenerado desde el almacén es el mismo CSV
+    esperado = analysis_functions.exportar_resumen_transiciones(datos, str(tmp_path / "original"))
+    obtenido = almacen_resultados.exportar_tablas_csv(ruta, str(tmp_path / "almacen"))[0]
+    pd.testing.assert_frame_equal(pd.read_csv(obtenido), pd.read_csv(esperado))
@@ -0,0 +1,63 @@
+"""
+`calcular_cubo_transiciones_por_area` frente al cálculo directo con una máscara por polígono.
+"""
+import os
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio import features
+
+import analysis_functions
+from conftest import ANIO_INICIAL, BANDAS
+
+
+def _areas_por_mascara(ruta, gdf, clases):
+    """
+    Área de cada clase dentro de cada polígono (centro de píxel), un polígono a la vez.
+    """
+    with rasterio.open(ruta) as src:
+        transicion = src.read(1)
+        areas_fila = analysis_functions.areas_pixel_por_fila_ha(src)
+        geometrias = gdf.to_crs(src.crs).geometry
+        areas = np.zeros((len(gdf), len(clases)))
+        for i, geometria in enumerate(geometrias):
+            mascara = features.geometry_mask([geometria], transicion.shape, src.transform, invert=True)
+            filas = np.nonzero(mascara)[0]
+            for j, clase in enumerate(clases):
+                areas[i, j] = areas_fila[filas[transicion[mascara] == clase]].sum()
+    return areas
+
+
+def test_cubo_igual_a_mascaras_por_poligono(areas_protegidas, etapas_separadas, tmp_path):
+    pnn, resguardos = areas_protegidas
+    anio_final = ANIO_INICIAL + BANDAS - 1
+    # Un año sin ráster de transición al final del rango queda en NaN
+    cubo = analysis_functions.calcular_cubo_transiciones_por_area(
+        etapas_separadas["transiciones"], ANIO_INICIAL + 1, anio_final + 1, pnn, resguardos,
+        ruta_salida=str(tmp_path / "cubo.npz"))
+
+    assert list(cubo["anios"]) == list(range(ANIO_INICIAL + 1, anio_final + 2))
+    assert list(cubo["tipos"]) == ["PNN"] * len(pnn) + ["Resguardos"] * len(resguardos)
+    assert np.isnan(cubo["areas_ha"][-1]).all()
+
+    clases = list(analysis_functions.NOMBRES_TRANSICIONES)
+    for posicion, anio in enumerate(cubo["anios"][:-1]):
+        ruta = os.path.join(etapas_separadas["transiciones"], f"transicion_{anio - 1}_to_{anio}.tif")
+        esperado = np.vstack([_areas_por_mascara(ruta, pnn, clases), _areas_por_mascara(ruta, resguardos, clases)])
+        obtenido = cubo["areas_ha"][posicion]
+        # Las áreas fuera del ráster quedan en NaN; el resto coincide con las máscaras
+        fuera = np.isnan(obtenido).all(axis=1)
+        assert fuera.any() and not fuera.all()
+        np.testing.assert_allclose(obtenido[~fuera], esperado[~fuera])
+        assert (esperado[fuera] == 0).all()
+
+    guardado = analysis_functions.cargar_cubo_transiciones_por_area(str(tmp_path / "cubo.npz"))
+    np.testing.assert_array_equal(guardado["areas_ha"], cubo["areas_ha"])
+
+
+def test_cubo_con_rango_invertido(areas_protegidas, etapas_separadas):
+    pnn, resguardos = areas_protegidas
+    with pytest.raises(ValueError):
+        analysis_functions.calcular_cubo_transiciones_por_area(etapas_separadas["transiciones"], 2022, 2020,
+                                                               pnn, resguardos)
@@ -0,0 +1,65 @@
+"""
+El cubo de teselas .npy reproduce el GeoTIFF de origen: series por píxel, ventanas y recorrido por teselas.
+"""
+import numpy as np
+import pytest
+import rasterio
+from rasterio.windows import Window
+
+import cubo_temporal
+from conftest import ALTO, ANCHO, ANIO_INICIAL, BANDAS
+
+TAMANO_TESELA = 64  # No divide 300 × 260: hay teselas de borde incompletas
+
+
+@pytest.fixture(scope="module")
+def cubo(stack_mapbiomas, tmp_path_factory):
+    # memoria_max_mb pequeño: varias lecturas por franja de teselas
+    return cubo_temporal.construir_cubo(stack_mapbiomas, str(tmp_path_factory.mktemp("cubo")),
+                                        tamano_tesela=TAMANO_TESELA, memoria_max_mb=0.05)
+
+
+@pytest.fixture(scope="module")
+def datos(stack_mapbiomas):
+    with rasterio.open(stack_mapbiomas) as src:
+        return np.moveaxis(src.read(), 0, -1)  # (filas, columnas, años)
+
+
+def test_metadatos(cubo, stack_mapbiomas):
+    assert cubo["anios"] == list(range(ANIO_INICIAL, ANIO_INICIAL + BANDAS))
+    assert (cubo["alto"], cubo["ancho"]) == (ALTO, ANCHO)
+    assert (cubo["filas_teselas"], cubo["cols_teselas"]) == (-(-ALTO // TAMANO_TESELA), -(-ANCHO // TAMANO_TESELA))
+    with rasterio.open(stack_mapbiomas) as src:
+        assert cubo["transform"] == src.transform
+
+
+def test_ventanas_y_teselas_iguales_al_origen(cubo, datos):
+    # Ventana completa, una que cruza varias teselas y una dentro de la última tesela incompleta
+    for ventana in [Window(0, 0, ANCHO, ALTO), Window(50, 30, 100, 150), Window(ANCHO - 5, ALTO - 7, 5, 7)]:
+        filas, cols = ventana.toslices()
+        np.testing.assert_array_equal(cubo_temporal.leer_ventana(cubo, ventana), datos[filas, cols])
+
+    for ventana, tesela in cubo_temporal.iterar_teselas(cubo):
+        filas, cols = ventana.toslices()
+        np.testing.assert_array_equal(tesela, datos[filas, cols])
+
+
+def test_series_por_pixel(cubo, datos):
+    rng = np.random.default_rng(0)
+    for fila, col in zip(rng.integers(0, ALTO, 50), rng.integers(0, ANCHO, 50)):
+        np.testing.assert_array_equal(cubo_temporal.serie_pixel(cubo, fila, col), datos[fila, col])
+        x, y = cubo["transform"] * (col + 0.5, fila + 0.5)
+        np.testing.assert_array_equal(cubo_temporal.serie_en_coordenada(cubo, x, y), datos[fila, col])
+
+    with pytest.raises(IndexError):
+        cubo_temporal.serie_pixel(cubo, ALTO, 0)
+
+
+def test_memmaps_abiertos_acotados(cubo, monkeypatch):
+    monkeypatch.setattr(cubo_temporal, "MAX_MEMMAPS_ABIERTOS", 3)
+    cubo.pop("memmaps", None)
+    for fila_tesela in range(cubo["filas_teselas"]):
+        for col_tesela in range(cubo["cols_teselas"]):
+            cubo_temporal.leer_tesela(cubo, fila_tesela, col_tesela)
+    assert list(cubo["memmaps"]) == [(cubo["filas_teselas"] - 1, col) for col in range(cubo["cols_teselas"] - 3,
+                                                                                        cubo["cols_teselas"])]
@@ -0,0 +1,70 @@
+"""
+Estadísticas por departamento: suman el total nacional, coinciden con el cubo por área y se
+exportan sin dejar archivos a medias.
+"""
+import csv
+import os
+
+import pytest
+
+import analysis_functions
+from conftest import ANIO_INICIAL, BANDAS, MEMORIA_FRANJAS_MB
+
+
+@pytest.fixture(scope="module")
+def resultado_departamentos(stack_mapbiomas, departamentos):
+    return analysis_functions.procesar_mapbiomas_por_departamentos(
+        stack_mapbiomas, ANIO_INICIAL, departamentos, memoria_max_mb=MEMORIA_FRANJAS_MB)
+
+
+def test_departamentos_suman_el_total_nacional(stack_mapbiomas, resultado_departamentos):
+    datos = analysis_functions.procesar_mapbiomas_en_una_pasada(stack_mapbiomas, ANIO_INICIAL)
+
+    nacional = resultado_departamentos["nacional"]
+    for anio, areas in datos.items():
+        for nombre, area in areas.items():
+            assert nacional["transiciones"][anio][nombre] == pytest.approx(area)
+
+    # Los departamentos cubren todo el ráster: su suma es el total nacional
+    for tabla in ("transiciones", "coberturas"):
+        for anio, areas in nacional[tabla].items():
+            for nombre, area in areas.items():
+                suma = sum(depto[tabla][anio][nombre] for depto in resultado_departamentos["departamentos"].values())
+                assert suma == pytest.approx(area)
+
+
+def test_departamentos_iguales_al_cubo_por_area(resultado_departamentos, departamentos, etapas_separadas):
+    cubo = analysis_functions.calcular_cubo_transiciones_por_area(
+        etapas_separadas["transiciones"], ANIO_INICIAL + 1, ANIO_INICIAL + BANDAS - 1, departamentos, departamentos)
+
+    zonas = [(i, nombre) for i, (tipo, nombre) in enumerate(zip(cubo["tipos"], cubo["nombres"])) if tipo == "PNN"]
+    assert len(zonas) == len(departamentos)
+    for posicion, anio in enumerate(cubo["anios"]):
+        for i, nombre in zonas:
+            for clase, area in zip(cubo["clases"], cubo["areas_ha"][posicion, i]):
+                assert resultado_departamentos["departamentos"][nombre]["transiciones"][anio][clase] == \
+                    pytest.approx(area)
+
+
+def test_exportar_estadisticas_departamentos(resultado_departamentos, tmp_path):
+    carpeta = str(tmp_path / "departamentos")
+    ruta_transiciones = os.path.join(carpeta, "transiciones_por_departamento.csv")
+    os.makedirs(carpeta)
+    with open(ruta_transiciones, "w", encoding="utf-8") as f:
+        f.write("tabla anterior")
+
+    rutas = analysis_functions.exportar_estadisticas_departamentos(resultado_departamentos, carpeta)
+
+    # Las tablas se reemplazan completas y no quedan archivos intermedios
+    nombres = list(resultado_departamentos["departamentos"])
+    assert sorted(os.listdir(carpeta)) == sorted(["coberturas_por_departamento.csv",
+                                                  "transiciones_por_departamento.csv"] + nombres)
+    assert rutas[0] == ruta_transiciones and len(rutas) == 2 + len(nombres)
+    with open(ruta_transiciones, newline="", encoding="utf-8") as f:
+        filas = list(csv.DictReader(f))
+    assert len(filas) == (len(nombres) + 1) * (BANDAS - 1)
+    nacional = resultado_departamentos["nacional"]["transiciones"]
+    for fila in filas:
+        if fila["Departamento"] == "Total nacional":
+            for nombre, area in nacional[int(fila["Año"])].items():
+                assert float(fila[nombre]) == pytest.approx(area)
@@ -0,0 +1,91 @@
+"""
+Planificación y mosaico de `exportacion_teselas` sin conexión, con `BackendGeoTIFFLocal`.
+"""
+import os
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+import exportacion_teselas
+
+RESOLUCION = exportacion_teselas.RESOLUCION_MAPBIOMAS_GRADOS
+TAMANO_TESELA = 100  # No divide el ráster: hay teselas de borde más pequeñas
+
+
+@pytest.fixture(scope="module")
+def ruta_origen(stack_mapbiomas, tmp_path_factory):
+    """
+    Copia del stack sintético con el origen alineado a la grilla de MapBiomas.
+    """
+    ruta = str(tmp_path_factory.mktemp("origen") / "origen.tif")
+    with rasterio.open(stack_mapbiomas) as src:
+        perfil = src.profile.copy()
+        perfil["transform"] = from_origin(-269000 * RESOLUCION, 5500 * RESOLUCION, RESOLUCION, RESOLUCION)
+        with rasterio.open(ruta, "w", **perfil) as dst:
+            dst.write(src.read())
+    return ruta
+
+
+def _grilla_y_teselas(ruta):
+    with rasterio.open(ruta) as src:
+        grilla = exportacion_teselas.definir_grilla(src.bounds, RESOLUCION)
+    return grilla, exportacion_teselas.dividir_en_teselas(grilla, TAMANO_TESELA)
+
+
+class BackendConCancelaciones(exportacion_teselas.BackendGeoTIFFLocal):
+    """
+    Backend local que registra las tareas canceladas.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.canceladas = []
+
+    def cancelar(self, tarea):
+        self.canceladas.append(tarea)
+        super().cancelar(tarea)
+
+
+def test_mosaico_igual_al_origen(ruta_origen, tmp_path):
+    grilla, teselas = _grilla_y_teselas(ruta_origen)
+    assert len(teselas) > 4
+
+    with exportacion_teselas.BackendGeoTIFFLocal(ruta_origen) as backend:
+        rutas = exportacion_teselas.exportar_por_teselas(backend, teselas, str(tmp_path / "teselas"),
+                                                         intervalo_sondeo=0.001)
+    assert not os.path.exists(backend.carpeta_temporal)
+    assert sorted(rutas) == [tesela["indice"] for tesela in teselas]
+
+    ruta_mosaico = exportacion_teselas.mosaico_teselas(rutas, grilla, str(tmp_path / "mosaico.tif"))
+    with rasterio.open(ruta_origen) as origen, rasterio.open(ruta_mosaico) as mosaico:
+        assert (mosaico.width, mosaico.height, mosaico.count) == (origen.width, origen.height, origen.count)
+        assert mosaico.transform.almost_equals(origen.transform)
+        np.testing.assert_array_equal(mosaico.read(), origen.read())
+
+
+def test_fallos_recuperados_con_reintentos(ruta_origen, tmp_path):
+    _, teselas = _grilla_y_teselas(ruta_origen)
+    max_reintentos = 2
+
+    with BackendConCancelaciones(ruta_origen, fallos={0: max_reintentos, 3: 1}) as backend:
+        rutas = exportacion_teselas.exportar_por_teselas(backend, teselas, str(tmp_path / "teselas"),
+                                                         max_reintentos=max_reintentos, intervalo_sondeo=0.001)
+    assert sorted(rutas) == [tesela["indice"] for tesela in teselas]
+    assert backend.envios == len(teselas) + max_reintentos + 1
+    assert len(backend.canceladas) == max_reintentos + 1
+
+
+def test_fallos_sin_reintentos_lanzan_error_y_cancelan(ruta_origen, tmp_path):
+    _, teselas = _grilla_y_teselas(ruta_origen)
+    max_reintentos = 1
+
+    with BackendConCancelaciones(ruta_origen, fallos={2: max_reintentos + 1}) as backend:
+        with pytest.raises(RuntimeError, match=r"\[2\]"):
+            exportacion_teselas.exportar_por_teselas(backend, teselas, str(tmp_path / "teselas"),
+                                                     max_reintentos=max_reintentos, intervalo_sondeo=0.001)
+    # Cada intento abandonado de la tesela perdida se canceló; las demás se descargaron
+    assert len(backend.canceladas) == max_reintentos + 1
+    assert sorted(os.listdir(tmp_path / "teselas")) == sorted(
+        f"tesela_{tesela['indice']}.tif" for tesela in teselas if tesela["indice"] != 2)
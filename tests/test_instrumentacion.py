@@ -0,0 +1,105 @@
+"""
+Eventos de `instrumentacion`: campos del JSONL, anidamiento de etapas por año y etapas sin efecto
+mientras la instrumentación está desactivada.
+"""
+import json
+import os
+
+import pytest
+
+import analysis_functions
+import instrumentacion
+from conftest import ALTO, ANCHO, ANIO_INICIAL, BANDAS
+
+CAMPOS = {"evento", "nombre", "id", "padre", "pid", "inicio", "estado", "segundos", "cpu_segundos", "rss_mb",
+          "rss_max_mb", "bytes_leidos", "bytes_escritos", "pixeles", "mpx_s"}
+
+
+@pytest.fixture
+def instrumentacion_activa():
+    yield instrumentacion.activar
+    instrumentacion.desactivar()
+
+
+def _leer_jsonl(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f]
+
+
+@instrumentacion.instrumentar(nombre="proceso_anual")
+def _proceso_anual(anios, pixeles_por_anio, fallar_en=None):
+    for anio in anios:
+        with instrumentacion.etapa("anio", anio=anio):
+            instrumentacion.registrar(pixeles=pixeles_por_anio, bloques=1)
+            instrumentacion.anotar(archivo=f"banda_{anio}.tif")
+            if anio == fallar_en:
+                raise RuntimeError("falla simulada")
+    return len(anios)
+
+
+def test_eventos_jsonl_por_anio(instrumentacion_activa, tmp_path):
+    ruta = str(tmp_path / "metricas" / "eventos.jsonl")
+    instrumentacion_activa(instrumentacion.SumideroJSONL(ruta))
+    assert _proceso_anual([2019, 2020, 2021], 1000) == 3
+    with pytest.raises(RuntimeError):
+        _proceso_anual([2022, 2023], 10, fallar_en=2023)
+
+    eventos = _leer_jsonl(ruta)
+    assert [evento["nombre"] for evento in eventos] == ["anio"] * 3 + ["proceso_anual"] + ["anio"] * 2 + ["proceso_anual"]
+    for evento in eventos:
+        assert CAMPOS <= set(evento)
+        assert evento["evento"] == "etapa" and evento["pid"] == os.getpid()
+        assert evento["segundos"] >= 0 and evento["cpu_segundos"] >= 0
+
+    # Cada año cuelga de su llamada y sus píxeles y contadores se suman a ella
+    anios, proceso = eventos[:3], eventos[3]
+    assert proceso["padre"] is None
+    assert [evento["padre"] for evento in anios] == [proceso["id"]] * 3
+    assert [evento["anio"] for evento in anios] == [2019, 2020, 2021]
+    assert [evento["archivo"] for evento in anios] == ["banda_2019.tif", "banda_2020.tif", "banda_2021.tif"]
+    assert all(evento["pixeles"] == 1000 and evento["bloques"] == 1 for evento in anios)
+    assert proceso["pixeles"] == 3000 and proceso["bloques"] == 3
+    assert len({evento["id"] for evento in eventos}) == len(eventos)
+
+    # Un error se registra en la etapa que falla y en la que la contiene
+    assert [evento["estado"] for evento in eventos[4:]] == ["ok", "error", "error"]
+    assert eventos[5]["error"] == "RuntimeError: falla simulada"
+    assert eventos[4]["padre"] == eventos[5]["padre"] == eventos[6]["id"]
+
+
+def test_eventos_de_calcular_transiciones(instrumentacion_activa, etapas_separadas, tmp_path):
+    sumidero = instrumentacion.SumideroMemoria()
+    instrumentacion_activa(sumidero)
+    analysis_functions.calcular_transiciones(etapas_separadas["reclass"], ANIO_INICIAL, str(tmp_path))
+
+    *pares, llamada = sumidero.eventos
+    assert llamada["nombre"] == "calcular_transiciones" and llamada["padre"] is None
+    assert [evento["par"] for evento in pares] == [f"{anio}_to_{anio + 1}"
+                                                  for anio in range(ANIO_INICIAL, ANIO_INICIAL + BANDAS - 1)]
+    assert all(evento["nombre"] == "transicion" and evento["padre"] == llamada["id"] for evento in pares)
+    assert all(evento["pixeles"] == ALTO * ANCHO for evento in pares)
+    assert llamada["pixeles"] == ALTO * ANCHO * (BANDAS - 1)
+
+
+def test_desactivada_no_emite(tmp_path):
+    sumidero = instrumentacion.SumideroMemoria()
+    instrumentacion.activar(sumidero)
+    instrumentacion.desactivar()
+    assert not instrumentacion.esta_activa()
+
+    # La etapa desactivada es el mismo objeto sin efecto y no mide nada
+    medicion = instrumentacion.etapa("anio", anio=2020)
+    assert medicion is instrumentacion.etapa("otra")
+    assert not isinstance(medicion, instrumentacion.Medicion)
+    with medicion as m:
+        m.registrar(pixeles=10)
+        m.anotar(archivo="x.tif")
+        instrumentacion.registrar(pixeles=10)
+    assert not hasattr(medicion, "pixeles")
+
+    funcion = lambda: 1
+    assert instrumentacion.en_etapa_actual(funcion) is funcion
+    assert _proceso_anual([2019, 2020], 1000) == 2
+    with pytest.raises(RuntimeError):
+        _proceso_anual([2019], 10, fallar_en=2019)
+    assert sumidero.eventos == []
@@ -0,0 +1,68 @@
+"""
+`calcular_matriz_transiciones` frente a una matriz calculada con `np.add.at` sobre el stack completo,
+global y por zona (con polígonos traslapados).
+"""
+import numpy as np
+import pytest
+import rasterio
+from rasterio import features
+
+import analysis_functions
+from conftest import ANIO_INICIAL, MEMORIA_FRANJAS_MB
+
+
+def _matriz(origen, destino, pesos, etiquetas):
+    indices_origen = np.searchsorted(etiquetas, origen)
+    indices_destino = np.searchsorted(etiquetas, destino)
+    matriz = np.zeros((len(etiquetas), len(etiquetas)))
+    np.add.at(matriz, (indices_origen, indices_destino), pesos)
+    return matriz
+
+
+def test_matriz_igual_a_fuerza_bruta(stack_mapbiomas, areas_protegidas):
+    pnn, _ = areas_protegidas
+    resultado = analysis_functions.calcular_matriz_transiciones(stack_mapbiomas, ANIO_INICIAL, gdf_zonas=pnn,
+                                                                memoria_max_mb=MEMORIA_FRANJAS_MB)
+
+    with rasterio.open(stack_mapbiomas) as src:
+        datos = src.read()
+        areas_fila = analysis_functions.areas_pixel_por_fila_ha(src)
+        mascaras = [features.geometry_mask([geometria], datos.shape[1:], src.transform, invert=True)
+                    for geometria in pnn.to_crs(src.crs).geometry]
+    pesos = np.broadcast_to(areas_fila[:, None], datos.shape[1:])
+
+    # Sin clases indicadas, las etiquetas son los códigos observados (uint8: sin "otros")
+    etiquetas = resultado["clases"]
+    assert etiquetas == np.unique(datos).tolist()
+
+    # Hay polígonos traslapados: sus píxeles comunes cuentan en cada zona
+    assert (np.sum(mascaras, axis=0) > 1).any()
+
+    for i in range(datos.shape[0] - 1):
+        clave = f"{ANIO_INICIAL + i}_to_{ANIO_INICIAL + i + 1}"
+        np.testing.assert_allclose(resultado["matrices"][clave],
+                                   _matriz(datos[i].ravel(), datos[i + 1].ravel(), pesos.ravel(), etiquetas))
+        for zona, mascara in enumerate(mascaras):
+            np.testing.assert_allclose(resultado["por_zona"][clave][zona],
+                                       _matriz(datos[i][mascara], datos[i + 1][mascara], pesos[mascara], etiquetas),
+                                       atol=1e-9)
+
+
+def test_matriz_con_clases_indicadas_y_area_fija(stack_mapbiomas):
+    resultado = analysis_functions.calcular_matriz_transiciones(stack_mapbiomas, ANIO_INICIAL, clases=[3, 21],
+                                                                pixel_area_ha=0.09)
+    with rasterio.open(stack_mapbiomas) as src:
+        origen, destino = src.read(1), src.read(2)
+
+    assert resultado["clases"] == [3, 21, "otros"]
+    matriz = resultado["matrices"][f"{ANIO_INICIAL}_to_{ANIO_INICIAL + 1}"]
+    assert matriz[0, 1] == pytest.approx(((origen == 3) & (destino == 21)).sum() * 0.09)
+    otros = ~np.isin(origen, [3, 21]) & ~np.isin(destino, [3, 21])
+    assert matriz[2, 2] == pytest.approx(otros.sum() * 0.09)
+    assert matriz.sum() == pytest.approx(origen.size * 0.09)
+
+
+@pytest.mark.parametrize("clases", [[3, 300], [-1, 3], [3, 3]])
+def test_matriz_rechaza_clases_invalidas(stack_mapbiomas, clases):
+    with pytest.raises(ValueError):
+        analysis_functions.calcular_matriz_transiciones(stack_mapbiomas, ANIO_INICIAL, clases=clases)
@@ -0,0 +1,43 @@
+"""
+Con `workers > 1`, la reclasificación y las transiciones escriben los mismos archivos que la ejecución serial.
+"""
+import os
+
+import numpy as np
+import pytest
+import rasterio
+
+import analysis_functions
+from conftest import ANIO_INICIAL, BANDAS, MEMORIA_FRANJAS_MB
+
+PARES = [f"{anio}_to_{anio + 1}" for anio in range(ANIO_INICIAL, ANIO_INICIAL + BANDAS - 1)]
+
+
+def _leer(ruta):
+    with rasterio.open(ruta) as src:
+        return src.read()
+
+
+def test_reclasificacion_paralela_igual_a_serial(stack_mapbiomas, etapas_separadas, tmp_path):
+    # Bloques de 64 píxeles para repartir varias ventanas entre los procesos
+    ruta_teselada = str(tmp_path / os.path.basename(stack_mapbiomas))
+    with rasterio.open(stack_mapbiomas) as src:
+        perfil = src.profile.copy()
+        perfil.update(blockxsize=64, blockysize=64)
+        with rasterio.open(ruta_teselada, "w", **perfil) as dst:
+            dst.write(src.read())
+
+    ruta = analysis_functions.reclasificar_coberturas_mapbiomas(ruta_teselada, str(tmp_path / "reclass"), workers=2)
+    np.testing.assert_array_equal(_leer(ruta), _leer(etapas_separadas["reclass"]))
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_transiciones_paralelas_iguales_a_serial(etapas_separadas, tmp_path, streaming):
+    carpeta = str(tmp_path / "transiciones")
+    analysis_functions.calcular_transiciones(etapas_separadas["reclass"], ANIO_INICIAL, carpeta, streaming=streaming,
+                                             memoria_max_mb=MEMORIA_FRANJAS_MB, workers=2)
+
+    for par in PARES:
+        nombre = f"transicion_{par}.tif"
+        np.testing.assert_array_equal(_leer(os.path.join(carpeta, nombre)),
+                                      _leer(os.path.join(etapas_separadas["transiciones"], nombre)))
@@ -0,0 +1,62 @@
+"""
+`etiquetar_parches` por franjas (con union-find entre franjas) encuentra los mismos parches que
+`scipy.ndimage.label` sobre el ráster completo.
+"""
+import os
+
+import numpy as np
+import pytest
+import rasterio
+
+import analysis_functions
+import parches
+from conftest import ANIO_INICIAL
+
+ndimage = pytest.importorskip("scipy.ndimage")
+
+
+@pytest.fixture(scope="module")
+def ruta_transicion(etapas_separadas):
+    return os.path.join(etapas_separadas["transiciones"], f"transicion_{ANIO_INICIAL}_to_{ANIO_INICIAL + 1}.tif")
+
+
+@pytest.mark.parametrize("conectividad, formato", [(4, None), (8, None), (8, "cog")])
+def test_parches_por_franjas_iguales_a_ndimage(ruta_transicion, tmp_path, conectividad, formato):
+    ruta_etiquetas = str(tmp_path / "parches.tif")
+    tabla = parches.etiquetar_parches(ruta_transicion, conectividad=conectividad, ruta_etiquetas=ruta_etiquetas,
+                                      memoria_max_mb=0.05, formato_salida=formato)
+    assert os.listdir(tmp_path) == ["parches.tif"]
+
+    with rasterio.open(ruta_transicion) as src:
+        mascara = src.read(1) == 1
+    estructura = ndimage.generate_binary_structure(2, 1 if conectividad == 4 else 2)
+    referencia, n = ndimage.label(mascara, structure=estructura)
+
+    # Hay parches que cruzan varias franjas, así que la unión entre franjas se ejercita
+    assert n > 0
+    assert len(tabla["id"]) == n
+    np.testing.assert_array_equal(np.sort(tabla["pixeles"]), np.sort(np.bincount(referencia.ravel())[1:]))
+
+    # Las etiquetas escritas forman la misma partición que las de referencia
+    with rasterio.open(ruta_etiquetas) as src:
+        etiquetas = src.read(1)
+    np.testing.assert_array_equal(etiquetas > 0, mascara)
+    pares = np.unique(np.stack([etiquetas[mascara], referencia[mascara]]), axis=1)
+    assert pares.shape[1] == n
+
+    # Las áreas de los parches suman el área de la clase
+    assert tabla["area_ha"].sum() == pytest.approx(analysis_functions.area_por_clase_raster(ruta_transicion)[1])
+
+
+def test_union_find_crece_geometricamente():
+    uf = parches._UnionFind(capacidad=4)
+    capacidades = set()
+    for total in range(1, 10001):
+        uf.agregar(total)
+        capacidades.add(len(uf.padre))
+    uf.unir(10000, 3)
+    # El arreglo se copia solo O(log n) veces y las raíces cubren exactamente las etiquetas usadas
+    assert len(capacidades) <= 13
+    raiz = uf.raices()
+    assert len(raiz) == 10001
+    assert raiz[10000] == 3
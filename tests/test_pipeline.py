@@ -0,0 +1,86 @@
+"""
+Ejecución incremental de `pipeline.py` sobre capas y ráster sintéticos: una segunda ejecución omite
+todas las etapas, y al cambiar una entrada o un parámetro solo se rehacen las etapas que dependen de él.
+"""
+import json
+import os
+import shutil
+
+import pytest
+import rasterio
+
+import pipeline
+from conftest import ANIO_INICIAL
+
+gpd = pytest.importorskip("geopandas")
+pytest.importorskip("pyarrow")  # Las capas reproyectadas se guardan en GeoParquet
+
+
+def _tocar(ruta):
+    """
+    Cambia la fecha de modificación de un archivo sin cambiar su contenido.
+    """
+    estado = os.stat(ruta)
+    os.utime(ruta, ns=(estado.st_atime_ns, estado.st_mtime_ns + 10 ** 9))
+
+
+@pytest.fixture
+def ruta_config(stack_mapbiomas, areas_protegidas, tmp_path):
+    from shapely.geometry import box
+
+    with rasterio.open(stack_mapbiomas) as src:
+        limites = box(*src.bounds)
+    pnn, resguardos = areas_protegidas
+    capas = {
+        "dept": gpd.GeoDataFrame({"DeNombre": ["Sintético"]}, geometry=[limites], crs="EPSG:4326"),
+        "reg": gpd.GeoDataFrame({"DeNombre": ["Sintético"]}, geometry=[limites], crs="EPSG:4326"),
+        "resg": resguardos.assign(DeNombre="Sintético"),
+        "runap": pnn.assign(DeNombre="Sintético"),
+    }
+    for nombre, capa in capas.items():
+        ruta = tmp_path / "DATOS" / pipeline.data_preprocessing.CAPAS_GEOESPACIALES[nombre]
+        os.makedirs(ruta.parent, exist_ok=True)
+        capa.to_file(ruta)
+
+    shutil.copy(stack_mapbiomas, tmp_path / os.path.basename(stack_mapbiomas))
+    config = {"datos": "DATOS", "resultados": "results", "departamento": "Sintético",
+              "raster_mapbiomas": os.path.basename(stack_mapbiomas), "anio_inicial": ANIO_INICIAL}
+    ruta = tmp_path / "config.json"
+    ruta.write_text(json.dumps(config), encoding="utf-8")
+    return str(ruta)
+
+
+def test_ejecucion_incremental(ruta_config):
+    config = pipeline.cargar_configuracion(ruta_config)
+    assert pipeline.ejecutar_pipeline(config) == pipeline.ETAPAS
+
+    # Sin cambios, todas las etapas se omiten
+    assert pipeline.ejecutar_pipeline(config) == []
+
+    # Cambiar el ráster rehace la reclasificación y lo que depende de ella
+    _tocar(config["raster_mapbiomas"])
+    assert pipeline.ejecutar_pipeline(config) == ["reclasificacion", "transiciones", "estadisticas"]
+
+    # Cambiar una capa vectorial no rehace las etapas de rásteres, salvo las estadísticas por área
+    _tocar(os.path.join(config["datos"], pipeline.data_preprocessing.CAPAS_GEOESPACIALES["runap"]))
+    assert pipeline.ejecutar_pipeline(config) == ["reproyeccion", "seleccion", "recorte", "estadisticas"]
+
+    # Cambiar un parámetro rehace las etapas que lo usan
+    assert pipeline.ejecutar_pipeline({**config, "exportar_csv": False}) == ["estadisticas"]
+
+    # Una etapa forzada se ejecuta aunque esté al día, y las siguientes ven sus salidas nuevas
+    assert pipeline.ejecutar_pipeline({**config, "exportar_csv": False}, forzar=["transiciones"]) == [
+        "transiciones", "estadisticas"]
+    assert pipeline.ejecutar_pipeline({**config, "exportar_csv": False}) == []
+
+    # --hasta detiene la ejecución en la etapa indicada
+    _tocar(config["raster_mapbiomas"])
+    assert pipeline.ejecutar_pipeline(config, hasta="reclasificacion") == ["reclasificacion"]
+
+
+def test_salida_borrada_se_regenera(ruta_config):
+    config = pipeline.cargar_configuracion(ruta_config)
+    pipeline.ejecutar_pipeline(config)
+
+    os.remove(os.path.join(config["resultados"], "STATS", "resumen_transiciones.csv"))
+    assert pipeline.ejecutar_pipeline(config) == ["estadisticas"]
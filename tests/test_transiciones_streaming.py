@@ -0,0 +1,31 @@
+"""
+`calcular_transiciones(streaming=True)` escribe por franjas los mismos rásteres que la versión en memoria.
+"""
+import os
+
+import numpy as np
+import rasterio
+
+import analysis_functions
+from conftest import ANIO_INICIAL, BANDAS, MEMORIA_FRANJAS_MB
+
+PARES = [f"{anio}_to_{anio + 1}" for anio in range(ANIO_INICIAL, ANIO_INICIAL + BANDAS - 1)]
+
+
+def _leer(ruta):
+    with rasterio.open(ruta) as src:
+        return src.read()
+
+
+def test_streaming_igual_a_memoria(etapas_separadas, tmp_path):
+    carpeta = str(tmp_path / "transiciones")
+    resultado = analysis_functions.calcular_transiciones(etapas_separadas["reclass"], ANIO_INICIAL, carpeta,
+                                                         streaming=True, memoria_max_mb=MEMORIA_FRANJAS_MB)
+
+    assert sorted(resultado) == PARES
+    for par in PARES:
+        # En streaming solo se devuelven metadatos, no los arreglos
+        assert not isinstance(resultado[par], np.ndarray)
+        nombre = f"transicion_{par}.tif"
+        np.testing.assert_array_equal(_leer(os.path.join(carpeta, nombre)),
+                                      _leer(os.path.join(etapas_separadas["transiciones"], nombre)))
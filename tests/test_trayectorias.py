@@ -0,0 +1,47 @@
+"""
+Métricas de `calcular_trayectorias` sobre un stack reclasificado armado a mano.
+"""
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+import analysis_functions
+
+ANIO = 2000
+
+# Serie reclasificada (1 bosque, 2 natural no forestal, 3 antrópico, 0 sin dato) y métricas esperadas:
+# (primera_perdida_bosque, ultimo_cambio, numero_cambios, anios_desde_regeneracion)
+CASOS = [
+    ([1, 1, 1, 1, 1, 1], (0, 0, 0, 255)),            # Bosque estable: centinelas "nunca"
+    ([1, 1, 2, 2, 2, 2], (2002, 2002, 1, 255)),      # Degradación
+    ([1, 1, 1, 3, 1, 1], (2003, 2004, 2, 1)),        # Deforestación y regeneración
+    ([1, 2, 3, 1, 1, 1], (2001, 2003, 3, 2)),        # Degradación → antrópico → regeneración
+    ([0, 1, 0, 3, 3, 1], (0, 2005, 1, 0)),           # Los pasos con clase 0 no son cambios
+    ([3, 1, 3, 1, 3, 1], (2002, 2005, 5, 0)),        # Regeneración y pérdidas alternadas
+]
+
+
+@pytest.fixture
+def ruta_stack(tmp_path):
+    series = np.array([serie for serie, _ in CASOS], dtype=np.uint8)  # (casos, años)
+    # 40 filas que repiten los casos, para que el ráster se recorra en varias franjas
+    bandas = np.tile(series.T[:, None, :], (1, 40, 1))
+    ruta = str(tmp_path / "Mapbiomas_from_2000_to_2005_reclass.tif")
+    with rasterio.open(ruta, "w", driver="GTiff", height=40, width=len(CASOS), count=bandas.shape[0], dtype="uint8",
+                       crs="EPSG:4326", transform=from_origin(-72, 1, 0.00027, 0.00027)) as dst:
+        dst.write(bandas)
+    return ruta
+
+
+@pytest.mark.parametrize("formato_salida", [None, "cog"])
+def test_metricas_de_trayectoria(ruta_stack, tmp_path, formato_salida):
+    rutas = analysis_functions.calcular_trayectorias(ruta_stack, ANIO, str(tmp_path / "trayectorias"),
+                                                     memoria_max_mb=0.0005, formato_salida=formato_salida)
+
+    for posicion, nombre in enumerate(["primera_perdida_bosque", "ultimo_cambio", "numero_cambios",
+                                       "anios_desde_regeneracion"]):
+        with rasterio.open(rutas[nombre]) as src:
+            valores = src.read(1)
+        esperado = np.array([metricas[posicion] for _, metricas in CASOS])
+        np.testing.assert_array_equal(valores, np.broadcast_to(esperado, valores.shape), err_msg=nombre)
@@ -0,0 +1,42 @@
+"""
+`procesar_mapbiomas_en_una_pasada` produce la misma reclasificación, las mismas transiciones y las
+mismas áreas que las etapas separadas.
+"""
+import os
+
+import numpy as np
+import pytest
+import rasterio
+
+import analysis_functions
+from conftest import ANIO_INICIAL, BANDAS, MEMORIA_FRANJAS_MB
+
+PARES = [f"{anio}_to_{anio + 1}" for anio in range(ANIO_INICIAL, ANIO_INICIAL + BANDAS - 1)]
+
+
+def _leer(ruta):
+    with rasterio.open(ruta) as src:
+        return src.read()
+
+
+def test_una_pasada_igual_a_etapas_separadas(stack_mapbiomas, etapas_separadas, tmp_path):
+    datos = analysis_functions.procesar_mapbiomas_en_una_pasada(
+        stack_mapbiomas, ANIO_INICIAL, carpeta_reclass=str(tmp_path / "reclass"),
+        carpeta_transiciones=str(tmp_path / "transiciones"), carpeta_estadisticas=str(tmp_path / "stats"),
+        memoria_max_mb=MEMORIA_FRANJAS_MB)
+
+    np.testing.assert_array_equal(
+        _leer(os.path.join(tmp_path, "reclass", os.path.basename(etapas_separadas["reclass"]))),
+        _leer(etapas_separadas["reclass"]))
+    assert os.path.exists(os.path.join(tmp_path, "stats", "resumen_transiciones.csv"))
+
+    rutas = [os.path.join(etapas_separadas["transiciones"], f"transicion_{par}.tif") for par in PARES]
+    areas = analysis_functions.areas_por_clase_rasters(rutas, workers=2)
+    assert sorted(datos) == [int(par.split("_to_")[1]) for par in PARES]
+    for par, ruta in zip(PARES, rutas):
+        np.testing.assert_array_equal(_leer(os.path.join(tmp_path, "transiciones", f"transicion_{par}.tif")),
+                                      _leer(ruta))
+        anio = int(par.split("_to_")[1])
+        for clase, nombre in analysis_functions.NOMBRES_TRANSICIONES.items():
+            assert datos[anio][nombre] == pytest.approx(areas[ruta][clase])
+